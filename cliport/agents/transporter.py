@@ -8,6 +8,7 @@ from pytorch_lightning import LightningModule
 from cliport.tasks import cameras
 from cliport.utils import utils
 from cliport.models.core.attention import Attention
+from cliport.models.core.lang_goals import LangGoals, set_lang_goal_vocabulary
 from cliport.models.core.transport import Transport
 from cliport.models.streams.two_stream_attention import TwoStreamAttention
 from cliport.models.streams.two_stream_transport import TwoStreamTransport
@@ -44,8 +45,17 @@ class TransporterAgent(LightningModule):
 
         self.val_repeats = cfg['train']['val_repeats']
         self.save_steps = cfg['train']['save_steps']
+        self.aug_batched = 'augment' in cfg['dataset'] and cfg['dataset']['augment'].get('batched', False)
 
         self._build_model()
+
+        # CLIP models encode the goals of the vocabulary once and look them up
+        # by the ids in the batches. Validation batches only pass their ids if
+        # the validation dataset has the same vocabulary.
+        self.lang_goals = list(getattr(self.train_ds, 'lang_goals', []))
+        if self.lang_goals:
+            set_lang_goal_vocabulary(self, self.train_ds.get_lang_goal_tokens())
+        self.val_lang_goal_ids = list(getattr(self.test_ds, 'lang_goals', [])) == self.lang_goals
         ##
         # reduce the number of parameters here
         ##
@@ -212,12 +222,26 @@ class TransporterAgent(LightningModule):
         self.transport.iters += 1
         return err, loss
 
+    def perturb_batch(self, frame, goal):
+        """Warp images and goals with the transforms sampled by the dataset.
+
+        Only used with `dataset.augment.batched`, where the dataset emits
+        unwarped images and the whole batch is augmented on device at once.
+        """
+        if self.aug_batched:
+            frame['img'] = utils.batch_apply_perturbation(frame['img'], frame['perturb_params'])
+            if goal is not None and 'img' in goal:
+                goal['img'] = utils.batch_apply_perturbation(goal['img'], frame['perturb_params'])
+        return frame, goal
+
     def training_step(self, batch, batch_idx):
 
         self.attention.train()
         self.transport.train()
 
-        frame, _ = batch
+        frame, _ = self.perturb_batch(*batch)
+        if 'lang_goal' in frame:
+            frame['lang_goal'] = LangGoals.from_batch(frame)
         self.start_time = time.time()
 
         # Get training losses.
@@ -264,6 +288,8 @@ class TransporterAgent(LightningModule):
         assert self.val_repeats >= 1
         for i in range(self.val_repeats):
             frame, _ = batch
+            if 'lang_goal' in frame:
+                frame['lang_goal'] = LangGoals.from_batch(frame, ids=self.val_lang_goal_ids)
             l0, err0 = self.attn_training_step(frame, backprop=False, compute_err=True)
             loss0 += l0
             if isinstance(self.transport, Attention):
@@ -349,8 +375,7 @@ class TransporterAgent(LightningModule):
 
         # Pixels to end effector poses.
         hmap = img[:, :, 3]
-        p0_xyz = utils.pix_to_xyz(p0_pix, hmap, self.bounds, self.pix_size)
-        p1_xyz = utils.pix_to_xyz(p1_pix, hmap, self.bounds, self.pix_size)
+        p0_xyz, p1_xyz = utils.pix_to_xyz_batch([p0_pix, p1_pix], hmap, self.bounds, self.pix_size)
         p0_xyzw = utils.eulerXYZ_to_quatXYZW((0, 0, -p0_theta))
         p1_xyzw = utils.eulerXYZ_to_quatXYZW((0, 0, -p1_theta))
 
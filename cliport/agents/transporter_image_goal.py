@@ -69,7 +69,7 @@ class ImageGoalTransporterAgent(OriginalTransporterAgent):
     def training_step(self, batch, batch_idx):
         self.attention.train()
         self.transport.train()
-        frame, goal = batch
+        frame, goal = self.perturb_batch(*batch)
 
         # Get training losses.
         step = self.total_steps + 1
@@ -148,8 +148,7 @@ class ImageGoalTransporterAgent(OriginalTransporterAgent):
 
         # Pixels to end effector poses.
         hmap = img[:, :, 3]
-        p0_xyz = utils.pix_to_xyz(p0_pix, hmap, self.bounds, self.pix_size)
-        p1_xyz = utils.pix_to_xyz(p1_pix, hmap, self.bounds, self.pix_size)
+        p0_xyz, p1_xyz = utils.pix_to_xyz_batch([p0_pix, p1_pix], hmap, self.bounds, self.pix_size)
         p0_xyzw = utils.eulerXYZ_to_quatXYZW((0, 0, -p0_theta))
         p1_xyzw = utils.eulerXYZ_to_quatXYZW((0, 0, -p1_theta))
 
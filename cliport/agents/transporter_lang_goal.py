@@ -109,8 +109,7 @@ class TwoStreamClipLingUNetTransporterAgent(TransporterAgent):
 
         # Pixels to end effector poses.
         hmap = img[:, :, 3]
-        p0_xyz = utils.pix_to_xyz(p0_pix, hmap, self.bounds, self.pix_size)
-        p1_xyz = utils.pix_to_xyz(p1_pix, hmap, self.bounds, self.pix_size)
+        p0_xyz, p1_xyz = utils.pix_to_xyz_batch([p0_pix, p1_pix], hmap, self.bounds, self.pix_size)
         p0_xyzw = utils.eulerXYZ_to_quatXYZW((0, 0, -p0_theta))
         p1_xyzw = utils.eulerXYZ_to_quatXYZW((0, 0, -p1_theta))
 
@@ -150,8 +149,7 @@ class TwoStreamClipLingUNetTransporterAgent(TransporterAgent):
 
         # Pixels to end effector poses.
         hmap = img[:, :, 3]
-        p0_xyz = utils.pix_to_xyz(p0_pix, hmap, self.bounds, self.pix_size)
-        p1_xyz = utils.pix_to_xyz(p1_pix, hmap, self.bounds, self.pix_size)
+        p0_xyz, p1_xyz = utils.pix_to_xyz_batch([p0_pix, p1_pix], hmap, self.bounds, self.pix_size)
         p0_xyzw = utils.eulerXYZ_to_quatXYZW((0, 0, -p0_theta))
         p1_xyzw = utils.eulerXYZ_to_quatXYZW((0, 0, -p1_theta))
 
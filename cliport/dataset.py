@@ -1,15 +1,21 @@
 """Image dataset."""
 
 import os
+import json
+import hashlib
 import pickle
 import warnings
 
 import numpy as np
-from torch.utils.data import Dataset
+import torch
+import torch.distributed as dist
+from torch.utils.data import Dataset, IterableDataset, Sampler, get_worker_info
 
 from cliport import tasks
 from cliport.tasks import cameras
 from cliport.utils import utils
+from cliport.utils import image_codecs
+from cliport.utils.episode_cache import make_episode_cache
 import traceback
 
 # See transporter.py, regression.py, dummy.py, task.py, etc.
@@ -21,6 +27,320 @@ BOUNDS = np.array([[0.25, 0.75], [-0.5, 0.5], [0, 0.28]])
 TASK_NAMES = (tasks.names).keys()
 TASK_NAMES = sorted(TASK_NAMES)[::-1]
 
+# Fields stored for every episode, one pickle per field.
+EPISODE_FIELDS = ('color', 'depth', 'action', 'reward', 'info')
+INDEX_FNAME = 'index.json'
+SHARDS_FNAME = 'shards.json'
+MANIFEST_FNAME = 'manifest.json'
+
+# Episode storage formats. 'pickle' writes one pickle per field. 'mmap' writes
+# color and depth of all steps into a single fixed-layout .npy file under
+# `images/` that is memory-mapped on load, and pickles only action, reward, info.
+DATASET_FORMATS = ('pickle', 'mmap')
+MMAP_FIELDS = ('images', 'action', 'reward', 'info')
+
+# Every field an episode may have on disk. `heightmaps` holds the fused color
+# and height maps of each step (see `RavensDataset.get_image`) and is written in
+# both formats when `dataset.heightmaps` is set.
+STORED_FIELDS = ('color', 'depth', 'images', 'heightmaps', 'action', 'reward', 'info')
+NPY_FIELDS = ('images', 'heightmaps')
+
+# 'episode' samples an episode per item and a random step in it. 'step' samples
+# every (episode, step) pair once per epoch, see `get_sample_steps`.
+SAMPLING_MODES = ('episode', 'step')
+
+# Image codecs of the color and depth pickles, see `cliport.utils.image_codecs`.
+DEFAULT_CODECS = {'color': 'raw', 'depth': 'raw'}
+
+# Steps fused at once when precomputing heightmaps, see `get_heightmaps`.
+HEIGHTMAP_BATCH_SIZE = 8
+
+# Language goal of steps without one.
+DEFAULT_LANG_GOAL = "task completed."
+
+
+def field_fname(field, fname):
+    """Filename of an episode field, `fname` being the `{id:06d}-{seed}.pkl` name."""
+    if field in NPY_FIELDS:
+        return fname.replace('.pkl', '.npy')
+    return fname
+
+
+def get_images_dtype(color, depth):
+    """Record dtype holding color and depth of all cameras for a single step."""
+    return np.dtype([('color', np.uint8, color.shape[1:]),
+                     ('depth', np.float32, depth.shape[1:])])
+
+
+def get_heightmaps_dtype(cmap, hmap):
+    """Record dtype holding the fused color and height maps of a single step."""
+    return np.dtype([('cmap', np.uint8, cmap.shape[1:]),
+                     ('hmap', np.float32, hmap.shape[1:])])
+
+
+def get_lang_goals(info):
+    """Distinct language goals of the steps of an episode, in order."""
+    return list(dict.fromkeys([i['lang_goal'] for i in info if i and 'lang_goal' in i]))
+
+
+def get_sample_steps(index, episodes):
+    """Flatten episodes into the (episode_id, step) pairs that can be sampled.
+
+    The last step of an episode only holds the final observation and is used
+    as goal, so an episode of n steps has n - 1 samples.
+    """
+    steps = []
+    for episode_id in episodes:
+        entry = index.get(episode_id)
+        if entry is None:
+            continue
+        steps += [(int(episode_id), i) for i in range(max(entry['n_steps'] - 1, 1))]
+    return steps
+
+
+def file_sha256(path, chunk_size=1024 ** 2):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def load_manifest(path):
+    """Manifest written by pack_dataset.py to `{path}/manifest.json`, or None.
+
+    The manifest of a dataset directory holds the episode index entries with
+    checksums of every field. The manifest of a data directory holds the
+    episode, step and byte counts of every `{task}-{mode}` dataset in it.
+    """
+    manifest_path = os.path.join(path, MANIFEST_FNAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def write_manifest(path, checksums=True):
+    """Write the manifest of a dataset directory from its episode index."""
+    index = EpisodeIndex(path)
+    episodes = {}
+    for episode_id, entry in sorted(index.episodes.items()):
+        entry = dict(entry)
+        if checksums:
+            entry['sha256'] = {field: file_sha256(os.path.join(path, field, field_fname(field, entry['fname'])))
+                               for field in entry['fields']}
+        episodes[str(episode_id)] = entry
+
+    manifest = {
+        'n_episodes': len(index),
+        'n_steps': sum([entry['n_steps'] for entry in index.episodes.values()]),
+        'nbytes': sum([sum(entry['nbytes'].values()) for entry in index.episodes.values()]),
+        'max_seed': index.max_seed,
+        'episodes': episodes,
+    }
+    with open(os.path.join(path, MANIFEST_FNAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def verify_manifest(path):
+    """Return the (episode_id, field) pairs whose files are missing or do not match the manifest."""
+    manifest = load_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(f"No {MANIFEST_FNAME} in {path}")
+    errors = []
+    for episode_id, entry in manifest['episodes'].items():
+        for field, sha256 in entry.get('sha256', {}).items():
+            field_path = os.path.join(path, field, field_fname(field, entry['fname']))
+            if not os.path.exists(field_path) or file_sha256(field_path) != sha256:
+                errors.append((int(episode_id), field))
+    return errors
+
+
+def check_manifest(path, n_episodes, verify=False):
+    """Compare a dataset directory with the manifest written by pack_dataset.py, if any.
+
+    Warns if the number of episodes differs. With verify, also checks the
+    checksum of every file and raises a ValueError listing the bad ones.
+    """
+    manifest = load_manifest(path)
+    if manifest is None:
+        return
+    if manifest['n_episodes'] != n_episodes:
+        warnings.warn(f"{path} has {n_episodes} episodes but its manifest lists "
+                      f"{manifest['n_episodes']}. Run pack_dataset.py again.")
+    if verify:
+        errors = verify_manifest(path)
+        if errors:
+            raise ValueError(f"{len(errors)} files in {path} are missing or do not match the manifest: "
+                             f"{', '.join([f'{field}/{episode_id}' for episode_id, field in errors[:10]])}. "
+                             f"Run pack_dataset.py again.")
+
+
+def load_dataset_indices(root_path, tasks, mode):
+    """Episode indexes of the `{task}-{mode}` datasets in root_path.
+
+    Raises a ValueError listing all datasets without episodes.
+    """
+    indices = {task: EpisodeIndex(os.path.join(root_path, f'{task}-{mode}')) for task in tasks}
+    missing = [f'{task}-{mode}' for task in tasks if len(indices[task]) == 0]
+    if missing:
+        raise ValueError(f"{len(missing)} of {len(tasks)} datasets in {root_path} have 0 episodes: "
+                         f"{', '.join(missing)}. Generate them or remove them from the list in dataset.py")
+    return indices
+
+
+class EpochPermutationSampler(Sampler):
+    """Deterministic shuffling, a fixed permutation of the dataset per epoch.
+
+    Datasets with `sample_weights` (step sampling with `dataset.task_weights`)
+    are instead permuted as a multiset in which every sample appears n * weight
+    times, rounded up or down at random, so that an epoch holds the weighted
+    proportions exactly instead of drawing with replacement. The epoch is set
+    by the trainer through `set_epoch`.
+
+    Under distributed training every rank draws the same permutation and keeps
+    every num_replicas-th index from its rank on, like `DistributedSampler`, so
+    the trainer must not replace it (`use_distributed_sampler=False`). The
+    permutation is padded with its first indices to split evenly. Rank and
+    world size default to those of the initialized process group.
+    """
+
+    def __init__(self, dataset, seed=0, num_replicas=None, rank=None):
+        self.dataset = dataset
+        self.seed = seed
+        self.epoch = 0
+        self.num_replicas = num_replicas
+        self.rank = rank
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def get_rank(self):
+        rank, num_replicas = get_rank()
+        return (rank if self.rank is None else self.rank,
+                num_replicas if self.num_replicas is None else self.num_replicas)
+
+    def __len__(self):
+        _, num_replicas = self.get_rank()
+        return -(-len(self.dataset) // num_replicas)
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        n = len(self.dataset)
+        weights = getattr(self.dataset, 'sample_weights', None)
+        if weights is not None:
+            expected = n * np.asarray(weights, dtype=np.float64) / np.sum(weights)
+            counts = np.int64(np.floor(expected))
+            remainder = expected - counts
+            n_extra = n - int(np.sum(counts))
+            if n_extra > 0:
+                counts[rng.choice(n, size=n_extra, replace=False, p=remainder / np.sum(remainder))] += 1
+            indices = rng.permutation(np.repeat(np.arange(n), counts))
+        else:
+            indices = rng.permutation(n)
+
+        rank, num_replicas = self.get_rank()
+        if num_replicas > 1:
+            indices = np.resize(indices, len(self) * num_replicas)[rank::num_replicas]
+        return iter(indices.tolist())
+
+
+class EpisodeIndex:
+    """On-disk index of the episodes stored in a dataset directory.
+
+    Maps episode id -> seed, filename, step count and per-field byte sizes, so
+    that episodes can be located without listing the field directories. The
+    index is written to `{path}/index.json` and updated on every `add`. Datasets
+    written before the index existed are scanned once and the index is saved.
+
+    `version` is the modification time of the index file, which changes whenever
+    episodes are written. The episode cache keys entries on it instead of
+    checking every file it serves.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self.episodes = {}
+        self.version = None
+
+        index_path = os.path.join(self._path, INDEX_FNAME)
+        if os.path.exists(index_path):
+            with open(index_path, 'r') as f:
+                episodes = json.load(f)['episodes']
+            self.episodes = {int(episode_id): entry for episode_id, entry in episodes.items()}
+            self.version = str(os.stat(index_path).st_mtime_ns)
+        elif os.path.exists(os.path.join(self._path, 'action')):
+            self.rebuild()
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def __contains__(self, episode_id):
+        return int(episode_id) in self.episodes
+
+    def get(self, episode_id):
+        return self.episodes.get(int(episode_id))
+
+    @property
+    def max_seed(self):
+        return max([entry['seed'] for entry in self.episodes.values()], default=-1)
+
+    def add(self, episode_id, seed, fname, n_steps, fmt='pickle', lang_goals=None):
+        """Record an episode whose fields have been written to disk."""
+        nbytes = {}
+        for field in STORED_FIELDS:
+            field_path = os.path.join(self._path, field, field_fname(field, fname))
+            if os.path.exists(field_path):
+                nbytes[field] = os.path.getsize(field_path)
+        self.episodes[int(episode_id)] = {
+            'seed': int(seed),
+            'fname': fname,
+            'n_steps': int(n_steps),
+            'format': fmt,
+            'fields': list(nbytes.keys()),
+            'nbytes': nbytes,
+        }
+        if lang_goals is not None:
+            self.episodes[int(episode_id)]['lang_goals'] = list(lang_goals)
+
+    def get_lang_goals(self, episode_id):
+        """Language goals of an episode, read from its info once for older indexes."""
+        entry = self.episodes[int(episode_id)]
+        if 'lang_goals' not in entry:
+            with open(os.path.join(self._path, 'info', entry['fname']), 'rb') as f:
+                entry['lang_goals'] = get_lang_goals(pickle.load(f))
+        return entry['lang_goals']
+
+    def rebuild(self):
+        """Scan the `action` directory once to index a legacy dataset."""
+        self.episodes = {}
+        action_path = os.path.join(self._path, 'action')
+        for fname in sorted(os.listdir(action_path)):
+            if '.pkl' in fname:
+                episode_id = int(fname[:fname.find('-')])
+                seed = int(fname[(fname.find('-') + 1):-4])
+                with open(os.path.join(action_path, fname), 'rb') as f:
+                    n_steps = len(pickle.load(f))
+                images_path = os.path.join(self._path, 'images', field_fname('images', fname))
+                fmt = 'mmap' if os.path.exists(images_path) else 'pickle'
+                self.add(episode_id, seed, fname, n_steps, fmt)
+                self.get_lang_goals(episode_id)
+
+        try:
+            self.save()
+        except OSError:
+            print(f"Could not write episode index to {self._path}. Using in-memory index.")
+
+    def save(self):
+        """Atomically write the index to disk."""
+        index_path = os.path.join(self._path, INDEX_FNAME)
+        tmp_path = f'{index_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'episodes': {str(k): v for k, v in sorted(self.episodes.items())}}, f)
+        os.replace(tmp_path, index_path)
+        self.version = str(os.stat(index_path).st_mtime_ns)
+
 
 class RavensDataset(Dataset):
     """A simple image dataset class."""
@@ -31,6 +351,12 @@ class RavensDataset(Dataset):
 
         self.cfg = cfg
         self.sample_set = []
+        self.sample_steps = []
+        self.sample_weights = None
+        self.lang_goals = []
+        self.lang_goal_ids = {}
+        self.lang_goal_tokens = None
+        self._unknown_lang_goal_tokens = {}
         self.max_seed = -1
         self.n_episodes = 0
         self.images = self.cfg['dataset']['images']
@@ -38,27 +364,22 @@ class RavensDataset(Dataset):
         self.n_demos = n_demos
         self.augment = augment
 
-        self.aug_theta_sigma = self.cfg['dataset']['augment']['theta_sigma'] if 'augment' in self.cfg['dataset'] else 60  # legacy code issue: theta_sigma was newly added
-        self.pix_size = 0.003125
-        self.in_shape = (320, 160, 6)
-        self.cam_config = cameras.RealSenseD415.CONFIG
-        self.bounds = np.array([[0.25, 0.75], [-0.5, 0.5], [0, 0.28]])
+        self.parse_cfg()
 
         # Track existing dataset if it exists.
-        color_path = os.path.join(self._path, 'action')
-        if os.path.exists(color_path):
-            for fname in sorted(os.listdir(color_path)):
-                if '.pkl' in fname:
-                    seed = int(fname[(fname.find('-') + 1):-4])
-                    self.n_episodes += 1
-                    self.max_seed = max(self.max_seed, seed)
+        self._index = EpisodeIndex(self._path)
+        self.n_episodes = len(self._index)
+        self.max_seed = self._index.max_seed
 
-        self._cache = {}
+        self._cache = self.make_cache() if self.cache else None
 
         if self.n_demos > 0:
             self.images = self.cfg['dataset']['images']
             self.cache = self.cfg['dataset']['cache']
 
+            # Validate against the manifest written by pack_dataset.py.
+            check_manifest(self._path, self.n_episodes, verify=self.verify)
+
             # Check if there sufficient demos in the dataset
             if self.n_demos > self.n_episodes:
                 # raise Exception(f"Requested training on {self.n_demos} demos, but only {self.n_episodes} demos exist in the dataset path: {self._path}.")
@@ -69,6 +390,34 @@ class RavensDataset(Dataset):
             self.set(episodes)
 
 
+    def parse_cfg(self):
+        """Read the `dataset` options of self.cfg shared by all dataset types.
+
+        Raises:
+          ValueError: on an invalid format, or codecs the format cannot store.
+        """
+        self.aug_theta_sigma = self.cfg['dataset']['augment']['theta_sigma'] if 'augment' in self.cfg['dataset'] else 60  # legacy code issue: theta_sigma was newly added
+        self.aug_batched = 'augment' in self.cfg['dataset'] and self.cfg['dataset']['augment'].get('batched', False)
+        self.sampling = self.cfg['dataset']['sampling'] if 'sampling' in self.cfg['dataset'] else 'episode'
+        self.task_weights = self.cfg['dataset']['task_weights'] if 'task_weights' in self.cfg['dataset'] else None
+        self.verify = self.cfg['dataset']['verify'] if 'verify' in self.cfg['dataset'] else False
+        self.format = self.cfg['dataset']['format'] if 'format' in self.cfg['dataset'] else 'pickle'
+        if self.format not in DATASET_FORMATS:
+            raise ValueError(f"Invalid dataset format: {self.format}. Valid options: {DATASET_FORMATS}")
+        self.save_heightmaps = self.cfg['dataset']['heightmaps'] if 'heightmaps' in self.cfg['dataset'] else False
+        self.save_raw_images = self.cfg['dataset']['raw_images'] if 'raw_images' in self.cfg['dataset'] else True
+        self.codecs = dict(DEFAULT_CODECS)
+        if 'codecs' in self.cfg['dataset']:
+            self.codecs.update(self.cfg['dataset']['codecs'])
+        image_codecs.check_codec(self.codecs['color'], np.uint8)
+        image_codecs.check_codec(self.codecs['depth'], np.float32)
+        if self.format == 'mmap' and self.codecs != DEFAULT_CODECS:
+            raise ValueError(f"The mmap format stores raw images, got codecs {self.codecs}. Use the pickle format.")
+        self.pix_size = 0.003125
+        self.in_shape = (320, 160, 6)
+        self.cam_config = cameras.RealSenseD415.CONFIG
+        self.bounds = np.array([[0.25, 0.75], [-0.5, 0.5], [0, 0.28]])
+
     def add(self, seed, episode):
         """Add an episode to the dataset.
 
@@ -87,68 +436,219 @@ class RavensDataset(Dataset):
         color = np.uint8(color)
         depth = np.float32(depth)
 
+        if not self.save_raw_images and not self.save_heightmaps:
+            raise ValueError("Dataset must store raw images, heightmaps, or both.")
+
+        fname = f'{self.n_episodes:06d}-{seed}.pkl'  # -{len(episode):06d}
+
         def dump(data, field):
             field_path = os.path.join(self._path, field)
             if not os.path.exists(field_path):
                 os.makedirs(field_path)
-            fname = f'{self.n_episodes:06d}-{seed}.pkl'  # -{len(episode):06d}
+            if field in NPY_FIELDS:
+                np.save(os.path.join(field_path, field_fname(field, fname)), data)
+                return
             with open(os.path.join(field_path, fname), 'wb') as f:
                 pickle.dump(data, f)
 
-        dump(color, 'color')
-        dump(depth, 'depth')
+        if self.save_raw_images and self.format == 'mmap':
+            images = np.empty(len(episode), dtype=get_images_dtype(color, depth))
+            images['color'] = color
+            images['depth'] = depth
+            dump(images, 'images')
+        elif self.save_raw_images:
+            dump(image_codecs.encode(color, self.codecs['color']), 'color')
+            dump(image_codecs.encode(depth, self.codecs['depth']), 'depth')
+        if self.save_heightmaps:
+            dump(self.get_heightmaps(color, depth), 'heightmaps')
         dump(action, 'action')
         dump(reward, 'reward')
         dump(info, 'info')
 
+        self._index.add(self.n_episodes, seed, fname, len(episode), self.format, get_lang_goals(info))
+        self._index.save()
+
         self.n_episodes += 1
         self.max_seed = max(self.max_seed, seed)
 
+    def get_heightmaps(self, color, depth):
+        """Fuse the RGB-D images of every step into color and height maps."""
+        cmaps, hmaps = [], []
+        for i in range(0, len(color), HEIGHTMAP_BATCH_SIZE):
+            obs = {'color': np.uint8(color[i:i + HEIGHTMAP_BATCH_SIZE]),
+                   'depth': np.float32(depth[i:i + HEIGHTMAP_BATCH_SIZE])}
+            cmap, hmap = utils.get_fused_heightmap_batch(obs, self.cam_config, self.bounds, self.pix_size)
+            cmaps.append(cmap.numpy())
+            hmaps.append(hmap.numpy())
+        cmaps, hmaps = np.concatenate(cmaps), np.concatenate(hmaps)
+
+        heightmaps = np.empty(len(cmaps), dtype=get_heightmaps_dtype(cmaps, hmaps))
+        heightmaps['cmap'] = cmaps
+        heightmaps['hmap'] = hmaps
+        return heightmaps
+
+    def precompute_heightmaps(self, drop_raw_images=False):
+        """Offline pass that adds heightmaps to episodes stored without them.
+
+        Args:
+          drop_raw_images: delete the raw color and depth images once the
+            heightmaps are written, for training-only datasets.
+        """
+        for episode_id, entry in sorted(self._index.episodes.items()):
+            fname = entry['fname']
+            if 'heightmaps' not in entry.get('fields', ()):
+                print(f"Computing heightmaps for {episode_id:06d} in {self._path}")
+                episode, _ = self.load(episode_id, images=True, cache=False)
+                color = [obs['color'] for obs, _, _, _ in episode]
+                depth = [obs['depth'] for obs, _, _, _ in episode]
+                heightmaps = self.get_heightmaps(color, depth)
+
+                field_path = os.path.join(self._path, 'heightmaps')
+                if not os.path.exists(field_path):
+                    os.makedirs(field_path)
+                np.save(os.path.join(field_path, field_fname('heightmaps', fname)), heightmaps)
+
+            if drop_raw_images:
+                for field in ('color', 'depth', 'images'):
+                    field_path = os.path.join(self._path, field, field_fname(field, fname))
+                    if os.path.exists(field_path):
+                        os.remove(field_path)
+
+            self._index.add(episode_id, entry['seed'], fname, entry['n_steps'], entry.get('format', 'pickle'),
+                            self._index.get_lang_goals(episode_id))
+        self._index.save()
+
     def set(self, episodes):
         """Limit random samples to specific fixed set."""
+        if self.sampling not in SAMPLING_MODES:
+            raise ValueError(f"Invalid sampling mode: {self.sampling}. Valid options: {SAMPLING_MODES}")
         self.sample_set = episodes
+        if self.sampling == 'step':
+            self.sample_steps = get_sample_steps(self._index, episodes)
+        self.set_lang_goals({self._index: episodes})
+
+    def set_lang_goals(self, index_episodes):
+        """Vocabulary of the distinct language goals of the sampled episodes.
+
+        Args:
+          index_episodes: {EpisodeIndex: episode ids} of the sampled episodes.
+        """
+        lang_goals = set()
+        for index, episodes in index_episodes.items():
+            n_indexed = sum(['lang_goals' in entry for entry in index.episodes.values()])
+            for episode_id in episodes:
+                if episode_id in index:
+                    lang_goals.update(index.get_lang_goals(episode_id))
+            if sum(['lang_goals' in entry for entry in index.episodes.values()]) > n_indexed:
+                try:
+                    index.save()
+                except OSError:
+                    pass
+        self.set_vocabulary(lang_goals)
+
+    def set_vocabulary(self, lang_goals):
+        """Set the language goals that samples refer to by id.
+
+        Samples carry the id of their goal in the vocabulary as `lang_goal_id`
+        (-1 if it is not in it) and its CLIP tokens as `lang_goal_tokens`, so
+        that goals are tokenized once per dataset and models can look up their
+        encodings by id, see `cliport.models.core.lang_goals`. Datasets that
+        feed the same model should share a vocabulary.
+        """
+        from cliport.models.core.clip import tokenize
+        self.lang_goals = sorted(set(lang_goals) | {DEFAULT_LANG_GOAL})
+        self.lang_goal_ids = {lang_goal: i for i, lang_goal in enumerate(self.lang_goals)}
+        self.lang_goal_tokens = tokenize(self.lang_goals).numpy()
+        self._unknown_lang_goal_tokens = {}
+
+    def get_lang_goal_tokens(self):
+        """CLIP tokens of the vocabulary, one row per goal id."""
+        return self.lang_goal_tokens
+
+    def add_lang_goal(self, sample, info):
+        """Add the language goal of a step to its sample, with its id and CLIP tokens."""
+        if 'lang_goal' not in info:
+            warnings.warn(f"No language goal. Defaulting to '{DEFAULT_LANG_GOAL}'")
+
+        if info and 'lang_goal' in info:
+            sample['lang_goal'] = info['lang_goal']
+        else:
+            sample['lang_goal'] = DEFAULT_LANG_GOAL
+
+        lang_goal_id = self.lang_goal_ids.get(sample['lang_goal'], -1)
+        if lang_goal_id >= 0:
+            tokens = self.lang_goal_tokens[lang_goal_id]
+        else:
+            if sample['lang_goal'] not in self._unknown_lang_goal_tokens:
+                from cliport.models.core.clip import tokenize
+                self._unknown_lang_goal_tokens[sample['lang_goal']] = tokenize(sample['lang_goal']).numpy()[0]
+            tokens = self._unknown_lang_goal_tokens[sample['lang_goal']]
+        sample['lang_goal_id'] = lang_goal_id
+        sample['lang_goal_tokens'] = tokens.copy()
+
+    def make_cache(self):
+        """Episode cache shared by all datasets and dataloader workers on this machine."""
+        cache_size_gb = self.cfg['dataset']['cache_size_gb'] if 'cache_size_gb' in self.cfg['dataset'] else 8
+        return make_episode_cache(cache_size_gb * 1024 ** 3)
 
     def load(self, episode_id, images=True, cache=False):
-        # TODO(lirui): consider loading into memory
+        cache = cache and self._cache is not None
+
         def load_field(episode_id, field, fname):
 
+            path = os.path.join(self._path, field)
+            source_path = os.path.join(path, field_fname(field, fname) if field in NPY_FIELDS else fname)
+
             # Check if sample is in cache.
             if cache:
-                if episode_id in self._cache:
-                    if field in self._cache[episode_id]:
-                        return self._cache[episode_id][field]
-                else:
-                    self._cache[episode_id] = {}
+                data = self._cache.get(source_path, self._index.version)
+                if data is not None:
+                    return data
 
             # Load sample from files.
-            path = os.path.join(self._path, field)
-            data = pickle.load(open(os.path.join(path, fname), 'rb'))
+            if field in NPY_FIELDS:
+                # Memory-mapped, steps are only read from disk when accessed.
+                data = np.load(source_path, mmap_mode='r')
+            else:
+                data = pickle.load(open(source_path, 'rb'))
             if cache:
-                self._cache[episode_id][field] = data
+                self._cache.put(source_path, data, self._index.version)
             return data
 
         # Get filename and random seed used to initialize episode.
-        seed = None
-        path = os.path.join(self._path, 'action')
-        for fname in sorted(os.listdir(path)):
-            if f'{episode_id:06d}' in fname:
-                seed = int(fname[(fname.find('-') + 1):-4])
-
-                # Load data.
-                color = load_field(episode_id, 'color', fname)
-                depth = load_field(episode_id, 'depth', fname)
-                action = load_field(episode_id, 'action', fname)
-                reward = load_field(episode_id, 'reward', fname)
-                info = load_field(episode_id, 'info', fname)
-
-                # Reconstruct episode.
-                episode = []
-                for i in range(len(action)):
-                    obs = {'color': color[i], 'depth': depth[i]} if images else {}
-                    episode.append((obs, action[i], reward[i], info[i]))
-                return episode, seed
-            
-        print(f'{episode_id:06d} not in ', path)
+        entry = self._index.get(episode_id)
+        if entry is None:
+            print(f'{episode_id:06d} not in ', os.path.join(self._path, INDEX_FNAME))
+            return None
+        fname, seed = entry['fname'], entry['seed']
+
+        # Load data. Precomputed heightmaps are used in place of the raw images.
+        fields = entry.get('fields', MMAP_FIELDS if entry.get('format') == 'mmap' else EPISODE_FIELDS)
+        cmap, hmap, color, depth = None, None, None, None
+        if images and 'heightmaps' in fields:
+            heightmaps = load_field(episode_id, 'heightmaps', fname)
+            cmap, hmap = heightmaps['cmap'], heightmaps['hmap']
+        elif images and 'images' in fields:
+            raw_images = load_field(episode_id, 'images', fname)
+            color, depth = raw_images['color'], raw_images['depth']
+        elif images:
+            # Either raw arrays or `EncodedImages`, which decode a step on access.
+            color = load_field(episode_id, 'color', fname)
+            depth = load_field(episode_id, 'depth', fname)
+        action = load_field(episode_id, 'action', fname)
+        reward = load_field(episode_id, 'reward', fname)
+        info = load_field(episode_id, 'info', fname)
+
+        # Reconstruct episode.
+        episode = []
+        for i in range(len(action)):
+            obs = {}
+            if cmap is not None:
+                obs = {'cmap': cmap[i], 'hmap': hmap[i]}
+            elif color is not None:
+                obs = {'color': color[i], 'depth': depth[i]}
+            episode.append((obs, action[i], reward[i], info[i]))
+        return episode, seed
 
     def get_image(self, obs, cam_config=None):
         """Stack color and height images image."""
@@ -159,12 +659,16 @@ class RavensDataset(Dataset):
         #   input_image = np.concatenate((input_image, goal_image), axis=2)
         #   assert input_image.shape[2] == 12, input_image.shape
 
-        if cam_config is None:
-            cam_config = self.cam_config
+        # Use color and height maps precomputed at collection time.
+        if cam_config is None and 'hmap' in obs:
+            cmap, hmap = obs['cmap'], obs['hmap']
+        else:
+            if cam_config is None:
+                cam_config = self.cam_config
 
-        # Get color and height maps from RGB-D images.
-        cmap, hmap = utils.get_fused_heightmap(
-            obs, cam_config, self.bounds, self.pix_size)
+            # Get color and height maps from RGB-D images.
+            cmap, hmap = utils.get_fused_heightmap(
+                obs, cam_config, self.bounds, self.pix_size)
         img = np.concatenate((cmap,
                               hmap[Ellipsis, None],
                               hmap[Ellipsis, None],
@@ -172,6 +676,17 @@ class RavensDataset(Dataset):
         assert img.shape == self.in_shape, img.shape
         return img
 
+    def get_image_batch(self, obs, cam_config=None):
+        """Batched `get_image` for BxVxHxW[xC] color and depth, e.g. of vectorized
+        environments. Returns a BxHxWx6 float32 tensor."""
+        if cam_config is None:
+            cam_config = self.cam_config
+        cmap, hmap = utils.get_fused_heightmap_batch(obs, cam_config, self.bounds, self.pix_size)
+        hmap = hmap[Ellipsis, None]
+        img = torch.cat((cmap.float(), hmap, hmap, hmap), dim=3)
+        assert img.shape[1:] == self.in_shape, img.shape
+        return img
+
     def process_sample(self, datum, augment=True):
         # Get training labels from data sample.
         (obs, act, _, info) = datum
@@ -187,16 +702,21 @@ class RavensDataset(Dataset):
         if act:
             p0_xyz, p0_xyzw = act['pose0']
             p1_xyz, p1_xyzw = act['pose1'] 
-            p0 = utils.xyz_to_pix(p0_xyz, self.bounds, self.pix_size) 
+            p0, p1 = [tuple(pix) for pix in utils.xyz_to_pix_batch([p0_xyz, p1_xyz], self.bounds, self.pix_size)]
             p0_theta = -np.float32(utils.quatXYZW_to_eulerXYZ(p0_xyzw)[2])
-            p1 = utils.xyz_to_pix(p1_xyz, self.bounds, self.pix_size)
             p1_theta = -np.float32(utils.quatXYZW_to_eulerXYZ(p1_xyzw)[2])
             p1_theta = p1_theta - p0_theta
             p0_theta = 0
 
         # Data augmentation.
-        if augment:
+        if augment and self.aug_batched:
+            # Only sample the transform and move the labels. Images are warped
+            # after collation, see TransporterAgent.perturb_batch.
+            perturb_params, _, (p0, p1) = utils.sample_perturb_params(
+                [p0, p1], img.shape[:2], theta_sigma=self.aug_theta_sigma)
+        elif augment:
             img, _, (p0, p1), perturb_params = utils.perturb(img, [p0, p1], theta_sigma=self.aug_theta_sigma)
+        if augment:
             # print("augment:", self.cfg['train']['data_augmentation'])
             if self.cfg['train']['data_augmentation']:
                 # visualize original color, depth and augmented color and depth
@@ -239,13 +759,7 @@ class RavensDataset(Dataset):
         }
 
         # Add language goal if available.
-        if 'lang_goal' not in info:
-            warnings.warn("No language goal. Defaulting to 'task completed.'")
-
-        if info and 'lang_goal' in info:
-            sample['lang_goal'] = info['lang_goal']
-        else:
-            sample['lang_goal'] = "task completed."
+        self.add_lang_goal(sample, info)
 
         return sample
 
@@ -262,7 +776,7 @@ class RavensDataset(Dataset):
 
         # Data augmentation with specific params.
         # try:
-        if perturb_params is not None and len(perturb_params) > 1:
+        if perturb_params is not None and len(perturb_params) > 1 and not self.aug_batched:
             img = utils.apply_perturbation(img, perturb_params)
  
         sample = {
@@ -273,18 +787,14 @@ class RavensDataset(Dataset):
         }
 
         # Add language goal if available.
-        if 'lang_goal' not in info:
-            warnings.warn("No language goal. Defaulting to 'task completed.'")
         # print("goal",p0,p1,p0_theta,p1_theta,perturb_params)
-
-        if info and 'lang_goal' in info:
-            sample['lang_goal'] = info['lang_goal']
-        else:
-            sample['lang_goal'] = "task completed."
+        self.add_lang_goal(sample, info)
 
         return sample
 
     def __len__(self):
+        if self.sampling == 'step':
+            return len(self.sample_steps)
         return len(self.sample_set)
 
     def __getitem__(self, idx):
@@ -293,7 +803,10 @@ class RavensDataset(Dataset):
         #     episode_id = np.random.choice(self.sample_set)
         # else:
         #     episode_id = np.random.choice(range(self.n_episodes))
-        episode_id = self.sample_set[idx]
+        if self.sampling == 'step':
+            episode_id, i = self.sample_steps[idx]
+        else:
+            episode_id, i = self.sample_set[idx], None
         res = self.load(episode_id, self.images, self.cache)
         if res is None:
             print("in get item", episode_id,   self._path)
@@ -306,7 +819,8 @@ class RavensDataset(Dataset):
         is_sequential_task = '-seq' in self._path.split("/")[-1]
 
         # Return random observation action pair (and goal) from episode.
-        i = np.random.choice(range(len(episode)-1))
+        if i is None:
+            i = np.random.choice(range(len(episode)-1))
         g = i+1 if is_sequential_task else -1
         sample, goal = episode[i], episode[g]
 
@@ -335,6 +849,12 @@ class RavensMultiTaskDataset(RavensDataset):
 
         self.cfg = cfg
         self.sample_set = {}
+        self.sample_steps = []
+        self.sample_weights = None
+        self.lang_goals = []
+        self.lang_goal_ids = {}
+        self.lang_goal_tokens = None
+        self._unknown_lang_goal_tokens = {}
         self.max_seed = -1
         self.n_episodes = 0
         self.images = self.cfg['dataset']['images']
@@ -342,40 +862,53 @@ class RavensMultiTaskDataset(RavensDataset):
         self.n_demos = n_demos
         self.augment = augment
 
-        self.aug_theta_sigma = self.cfg['dataset']['augment']['theta_sigma'] if 'augment' in self.cfg['dataset'] else 60  # legacy code issue: theta_sigma was newly added
-        self.pix_size = 0.003125
-        self.in_shape = (320, 160, 6)
-        self.cam_config = cameras.RealSenseD415.CONFIG
-        self.bounds = np.array([[0.25, 0.75], [-0.5, 0.5], [0, 0.28]])
+        self.parse_cfg()
 
-        self.n_episodes = {}
+        # Fails on all empty datasets at once.
+        self._indices = load_dataset_indices(self.root_path, self.tasks, mode)
+        self.n_episodes = {task: len(index) for task, index in self._indices.items()}
         episodes = {}
 
         for task in self.tasks:
-            task_path = os.path.join(self.root_path, f'{task}-{mode}')
-            action_path = os.path.join(task_path, 'action')
-            n_episodes = 0
-            if os.path.exists(action_path):
-                for fname in sorted(os.listdir(action_path)):
-                    if '.pkl' in fname:
-                        n_episodes += 1
-            self.n_episodes[task] = n_episodes
-
-            if n_episodes == 0:
-                raise Exception(f"{task}-{mode} has 0 episodes. Remove it from the list in dataset.py")
+            if self.n_demos > 0:
+                check_manifest(os.path.join(self.root_path, f'{task}-{mode}'), self.n_episodes[task],
+                               verify=self.verify)
+            n_episodes = self.n_episodes[task]
 
             # Select random episode depending on the size of the dataset.
             episodes[task] = np.random.choice(range(self.n_demos), min(self.n_demos, n_episodes), False)
 
+        self._cache = self.make_cache() if self.cache else None
+
         if self.n_demos > 0:
             self.images = self.cfg['dataset']['images']
-            self.cache = False # TODO(mohit): fix caching for multi-task dataset
             self.set(episodes)
 
         self._path = None
         self._task = None
 
+    def set(self, episodes):
+        """Limit random samples to specific fixed set of episodes per task."""
+        if self.sampling not in SAMPLING_MODES:
+            raise ValueError(f"Invalid sampling mode: {self.sampling}. Valid options: {SAMPLING_MODES}")
+        self.sample_set = episodes
+        if self.sampling == 'step':
+            self.sample_steps, sample_weights = [], []
+            for task in self.tasks:
+                steps = get_sample_steps(self._indices[task], episodes[task])
+                self.sample_steps += [(task, episode_id, i) for episode_id, i in steps]
+
+                # Each task gets its weight in total, split across its steps.
+                if self.task_weights is not None and len(steps) > 0:
+                    sample_weights += [self.task_weights.get(task, 1.) / len(steps)] * len(steps)
+            if self.task_weights is not None:
+                self.sample_weights = np.float64(sample_weights) / np.sum(sample_weights)
+        self.set_lang_goals({self._indices[task]: episodes[task] for task in self.tasks})
+
     def __len__(self):
+        if self.sampling == 'step':
+            return len(self.sample_steps)
+
         # Average number of episodes across all tasks
         total_episodes = 0
         for _, episode_ids in self.sample_set.items():
@@ -384,15 +917,20 @@ class RavensMultiTaskDataset(RavensDataset):
         return avg_episodes
 
     def __getitem__(self, idx):
-        # Choose random task.
-        self._task = self.tasks[idx % len(self.tasks)] # np.random.choice(self.tasks)
-        self._path = os.path.join(self.root_path, f'{self._task}')
-
-        # Choose random episode.
-        if len(self.sample_set[self._task]) > 0:
-            episode_id = np.random.choice(self.sample_set[self._task])
+        i = None
+        if self.sampling == 'step':
+            self._task, episode_id, i = self.sample_steps[idx]
+            self._path = os.path.join(self.root_path, f'{self._task}')
         else:
-            episode_id = np.random.choice(range(self.n_episodes[self._task]))
+            # Choose random task.
+            self._task = self.tasks[idx % len(self.tasks)] # np.random.choice(self.tasks)
+            self._path = os.path.join(self.root_path, f'{self._task}')
+
+            # Choose random episode.
+            if len(self.sample_set[self._task]) > 0:
+                episode_id = np.random.choice(self.sample_set[self._task])
+            else:
+                episode_id = np.random.choice(range(self.n_episodes[self._task]))
 
         res = self.load(episode_id, self.images, self.cache)
         if res is None:
@@ -408,7 +946,8 @@ class RavensMultiTaskDataset(RavensDataset):
 
         # Return observation action pair (and goal) from episode.
         if len(episode) > 1:
-            i = np.random.choice(range(len(episode)-1))
+            if i is None:
+                i = np.random.choice(range(len(episode)-1))
             g = i+1 if is_sequential_task else -1
             sample, goal = episode[i], episode[g]
         else:
@@ -439,6 +978,7 @@ class RavensMultiTaskDataset(RavensDataset):
         #     self._task = np.random.choice(all_tasks, p=sampling_probs)
 
         self._path = os.path.join(self.root_path, f'{self._task}-{self.mode}')
+        self._index = self._indices[self._task]
         return super().load(episode_id, images, cache)
 
     def get_curr_task(self):
@@ -874,6 +1414,12 @@ class RavenMultiTaskDatasetBalance(RavensMultiTaskDataset):
 
         self.cfg = cfg
         self.sample_set = {}
+        self.sample_steps = []
+        self.sample_weights = None
+        self.lang_goals = []
+        self.lang_goal_ids = {}
+        self.lang_goal_tokens = None
+        self._unknown_lang_goal_tokens = {}
         self.max_seed = -1
         self.n_episodes = 0
         self.images = self.cfg['dataset']['images']
@@ -881,27 +1427,18 @@ class RavenMultiTaskDatasetBalance(RavensMultiTaskDataset):
         self.n_demos = n_demos
         self.augment = augment
 
-        self.aug_theta_sigma = self.cfg['dataset']['augment']['theta_sigma'] if 'augment' in self.cfg['dataset'] else 60  # legacy code issue: theta_sigma was newly added
-        self.pix_size = 0.003125
-        self.in_shape = (320, 160, 6)
-        self.cam_config = cameras.RealSenseD415.CONFIG
-        self.bounds = np.array([[0.25, 0.75], [-0.5, 0.5], [0, 0.28]])
+        self.parse_cfg()
 
-        self.n_episodes = {}
+        # Fails on all empty datasets at once.
+        self._indices = load_dataset_indices(self.root_path, self.tasks, mode)
+        self.n_episodes = {task: len(index) for task, index in self._indices.items()}
         episodes = {}
 
         for task in self.tasks:
-            task_path = os.path.join(self.root_path, f'{task}-{mode}')
-            action_path = os.path.join(task_path, 'action')
-            n_episodes = 0
-            if os.path.exists(action_path):
-                for fname in sorted(os.listdir(action_path)):
-                    if '.pkl' in fname:
-                        n_episodes += 1
-            self.n_episodes[task] = n_episodes
-
-            if n_episodes == 0:
-                raise Exception(f"{task}-{mode} has 0 episodes. Remove it from the list in dataset.py")
+            if self.n_demos > 0:
+                check_manifest(os.path.join(self.root_path, f'{task}-{mode}'), self.n_episodes[task],
+                               verify=self.verify)
+            n_episodes = self.n_episodes[task]
 
             # Select random episode depending on the size of the dataset.
             if task in self.ORIGINAL_NAMES and self.mode == 'train':
@@ -910,9 +1447,10 @@ class RavenMultiTaskDatasetBalance(RavensMultiTaskDataset):
             else:       
                 episodes[task] = np.random.choice(range(n_episodes), min(self.n_demos, n_episodes), False)
 
+        self._cache = self.make_cache() if self.cache else None
+
         if self.n_demos > 0:
             self.images = self.cfg['dataset']['images']
-            self.cache = False 
             self.set(episodes)
 
         self._path = None
@@ -969,4 +1507,183 @@ class RavenMultiTaskDatasetBalance(RavensMultiTaskDataset):
     'towers-of-hanoi-seq-seen-colors',
     'towers-of-hanoi-seq-unseen-colors',
     'towers-of-hanoi-seq-full',
-    ]
\ No newline at end of file
+    ]
+
+
+def get_group_tasks(group, mode):
+    """Tasks of a group in `RavensMultiTaskDataset.MULTI_TASKS`, or of an explicit list of tasks."""
+    if isinstance(group, str) and group in RavensMultiTaskDataset.MULTI_TASKS:
+        return list(RavensMultiTaskDataset.MULTI_TASKS[group][mode])
+    if isinstance(group, str):
+        raise ValueError(f"Unknown task group: {group}")
+    return list(dict.fromkeys(group))
+
+
+def write_shards(data_dir, tasks, mode, out_path, cfg, n_demos=0, shard_size_mb=1024):
+    """Pack the episodes of many tasks into large sequential shard files.
+
+    Episodes of all tasks are interleaved in proportion to the number of
+    episodes of each task, so every shard has the same task mixing ratios.
+    A shard is a sequence of pickled records {'task', 'episode_id', 'seed',
+    'episode'} and is read back with `RavensStreamDataset`.
+
+    Args:
+      data_dir: directory with the `{task}-{mode}` datasets.
+      tasks: list of task names.
+      mode: 'train', 'val' or 'test'.
+      out_path: directory to write the shards and `shards.json` to.
+      cfg: dataset config, as for `RavensDataset`.
+      n_demos: number of episodes per task, all episodes if 0.
+      shard_size_mb: start a new shard once a shard is larger than this.
+    """
+    cfg = {'dataset': {**cfg['dataset'], 'cache': False}}
+    datasets, order = {}, []
+    for task in tasks:
+        datasets[task] = RavensDataset(os.path.join(data_dir, f'{task}-{mode}'), cfg, n_demos=0, augment=False)
+        episode_ids = sorted(datasets[task]._index.episodes.keys())
+        if n_demos > 0:
+            episode_ids = episode_ids[:n_demos]
+        if len(episode_ids) == 0:
+            raise ValueError(f"{task}-{mode} has 0 episodes in {data_dir}")
+
+        # Spread the episodes of each task evenly over the whole sequence.
+        order += [((k + 0.5) / len(episode_ids), task, episode_id) for k, episode_id in enumerate(episode_ids)]
+    order.sort()
+
+    os.makedirs(out_path, exist_ok=True)
+    shards, f, shard, lang_goals = [], None, None, set()
+    for _, task, episode_id in order:
+        if f is None:
+            shard = {'fname': f'shard-{len(shards):05d}.pkl', 'n_episodes': 0, 'n_samples': 0, 'tasks': {}}
+            f = open(os.path.join(out_path, shard['fname']), 'wb')
+
+        episode, seed = datasets[task].load(episode_id, images=True, cache=False)
+        episode = [({k: np.array(v) for k, v in obs.items()}, act, reward, info)
+                   for obs, act, reward, info in episode]
+        pickle.dump({'task': task, 'episode_id': int(episode_id), 'seed': seed, 'episode': episode},
+                    f, protocol=pickle.HIGHEST_PROTOCOL)
+        shard['n_episodes'] += 1
+        shard['n_samples'] += max(len(episode) - 1, 1)
+        shard['tasks'][task] = shard['tasks'].get(task, 0) + 1
+        lang_goals.update(get_lang_goals([info for _, _, _, info in episode]))
+
+        if f.tell() > shard_size_mb * 1024 ** 2:
+            shard['nbytes'] = f.tell()
+            f.close()
+            shards.append(shard)
+            f = None
+    if f is not None:
+        shard['nbytes'] = f.tell()
+        f.close()
+        shards.append(shard)
+
+    task_counts = {}
+    for _, task, _ in order:
+        task_counts[task] = task_counts.get(task, 0) + 1
+    with open(os.path.join(out_path, SHARDS_FNAME), 'w') as f:
+        json.dump({'mode': mode, 'tasks': task_counts, 'lang_goals': sorted(lang_goals), 'shards': shards}, f, indent=2)
+    return shards
+
+
+def get_rank():
+    """Rank and world size of distributed training, (0, 1) if not distributed."""
+    if dist.is_available() and dist.is_initialized():
+        return dist.get_rank(), dist.get_world_size()
+    return 0, 1
+
+
+class RavensStreamDataset(RavensDataset, IterableDataset):
+    """Streams samples of many tasks from shard files written by `write_shards`.
+
+    Shards are split across dataloader workers (and distributed ranks), read
+    sequentially, and every step of every episode is passed through a shuffle
+    buffer of `dataset.stream.shuffle_buffer` samples. Memory is bounded by the
+    buffer and the task mixing ratios are those of the shards.
+
+    `num_workers` must match the dataloader, so that the length is the number
+    of samples in the shards that the workers of this rank read.
+    """
+
+    def __init__(self, path, cfg, augment=False, num_workers=1):
+        self._path = path
+        self.cfg = cfg
+        self.images = True
+        self.cache = False
+        self.augment = augment
+        self.num_workers = max(num_workers, 1)
+
+        self.parse_cfg()
+        self.sampling = 'stream'
+        self.shuffle_buffer = self.cfg['dataset']['stream']['shuffle_buffer'] if 'stream' in self.cfg['dataset'] else 256
+
+        shards_path = os.path.join(self._path, SHARDS_FNAME)
+        if not os.path.exists(shards_path):
+            raise FileNotFoundError(f"No shards in {self._path}. Write them with dataset.write_shards first.")
+        with open(shards_path, 'r') as f:
+            self.shards = json.load(f)
+        self.tasks = list(self.shards['tasks'].keys())
+        self.n_episodes = self.shards['tasks']
+        self.n_samples = sum([shard['n_samples'] for shard in self.shards['shards']])
+        self.set_vocabulary(self.shards.get('lang_goals', []))
+
+    def __len__(self):
+        # Every worker of every rank reads its own shards, see get_worker_shards.
+        rank, world_size = get_rank()
+        n_consumers = self.num_workers * world_size
+        consumers = range(rank * self.num_workers, (rank + 1) * self.num_workers)
+        return sum([shard['n_samples'] for i, shard in enumerate(self.shards['shards'])
+                    if i % n_consumers in consumers])
+
+    def add(self, seed, episode):
+        raise Exception("Adding episodes not supported with streaming dataset")
+
+    def get_worker_shards(self):
+        """Shards read by this worker, in random order, and the worker's random generator."""
+        worker_info = get_worker_info()
+        worker_id, n_workers = (0, 1) if worker_info is None else (worker_info.id, worker_info.num_workers)
+        rank, world_size = get_rank()
+        worker_id += rank * n_workers
+        n_workers *= world_size
+
+        # The worker seed changes every epoch.
+        seed = np.random.randint(2 ** 31) if worker_info is None else worker_info.seed
+        rng = np.random.default_rng(seed)
+        shards = [os.path.join(self._path, shard['fname']) for shard in self.shards['shards']]
+        shards = shards[worker_id::n_workers]
+        if len(shards) == 0:
+            warnings.warn(f"Worker {worker_id} of {n_workers} has no shards. Write more, smaller shards.")
+        return [shards[i] for i in rng.permutation(len(shards))], rng
+
+    def read_shard(self, shard_path):
+        with open(shard_path, 'rb') as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def __iter__(self):
+        shards, rng = self.get_worker_shards()
+        buffer = []
+        for shard_path in shards:
+            for record in self.read_shard(shard_path):
+                episode = record['episode']
+
+                # Is the task sequential like stack-block-pyramid-seq?
+                is_sequential_task = '-seq' in record['task']
+                for i in range(max(len(episode) - 1, 1)):
+                    g = i+1 if is_sequential_task else -1
+                    buffer.append((episode[i], episode[g]))
+                    if len(buffer) >= self.shuffle_buffer:
+                        j = rng.integers(len(buffer))
+                        buffer[j], buffer[-1] = buffer[-1], buffer[j]
+                        yield self.process(*buffer.pop())
+
+        rng.shuffle(buffer)
+        for sample, goal in buffer:
+            yield self.process(sample, goal)
+
+    def process(self, sample, goal):
+        sample = self.process_sample(sample, augment=self.augment)
+        goal = self.process_goal(goal, perturb_params=sample['perturb_params'])
+        return sample, goal
@@ -19,7 +19,11 @@ def main(cfg):
         disp=cfg['disp'],
         shared_memory=cfg['shared_memory'],
         hz=480,
-        record_cfg=cfg['record']
+        record_cfg=cfg['record'],
+        occupancy_map=cfg['occupancy_map'],
+        orthographic_oracle=cfg['orthographic_oracle'],
+        fast_reset=cfg['fast_reset'],
+        file_caching=cfg['file_caching']
     )
     cfg['task'] = cfg['task'].replace("_", "-")
     task = tasks.names[cfg['task']]()
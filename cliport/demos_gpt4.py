@@ -198,6 +198,7 @@ def main(cfg):
             print("Syntax Failure")
             continue
 
+        env = None
         try:
             env = Environment(
                 cfg['assets_root'],
@@ -290,7 +291,7 @@ def main(cfg):
                 reset_success_cnt += 1
                 env_success_cnt += total_reward > 0.99
 
-            p.disconnect()
+            env.close()
 
         except:
             to_print = highlight(f"{str(traceback.format_exc())}", PythonLexer(), TerminalFormatter())
@@ -298,7 +299,8 @@ def main(cfg):
 
             print("========================================================")
             print("Exception:", to_print)
-            p.disconnect()
+            if env is not None:
+                env.close()
 
         print("=========================================================")
         print(f"SYNTAX_PASS_RATE: {(SYNTAX_PASS_RATE / (trial_i+1)) * 100:.1f}% RUNTIME_PASS_RATE: {(RUNTIME_PASS_RATE / (trial_i+1)) * 100:.1f}% ENV_PASS_RATE: {(ENV_PASS_RATE / (trial_i+1)) * 100:.1f}%")
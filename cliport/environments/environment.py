@@ -1,8 +1,8 @@
 """Environment class."""
 
+import collections.abc
 import os
 import tempfile
-import time
 import cv2
 import imageio
 
@@ -11,8 +11,11 @@ import numpy as np
 from cliport.tasks import cameras
 from cliport.utils import pybullet_utils
 from cliport.utils import utils
+from cliport.utils.occupancy import OccupancyMap
+from cliport.utils import urdf_cache
 import string
 import pybullet as p
+from pybullet_utils import bullet_client
 import tempfile
 import random
 import sys
@@ -24,6 +27,14 @@ UR5_URDF_PATH = 'ur5/ur5.urdf'
 UR5_WORKSPACE_URDF_PATH = 'ur5/workspace.urdf'
 PLANE_URDF_PATH = 'plane/plane.urdf'
 
+# Camera height (m) of the orthographic top-down view.
+ORTHO_CAMERA_HEIGHT = 3.
+
+# Simulation step budgets and the speed (m/s) below which objects are static.
+SETTLE_SECONDS = 5.  # of simulated time
+MOVEJ_STEPS = 10000
+STATIC_VELOCITY = 5e-3
+
 
 class Environment(gym.Env):
     """OpenAI Gym-style environment class."""
@@ -34,7 +45,18 @@ class Environment(gym.Env):
                  disp=False,
                  shared_memory=False,
                  hz=240,
-                 record_cfg=None):
+                 record_cfg=None,
+                 occupancy_map=False,
+                 orthographic_oracle=False,
+                 fast_reset=False,
+                 file_caching=False,
+                 render_obs=True,
+                 lazy_obs=False,
+                 obs_cams=None,
+                 settle_steps=None,
+                 movej_steps=MOVEJ_STEPS,
+                 static_velocity=STATIC_VELOCITY,
+                 static_angular_velocity=None):
         """Creates OpenAI Gym-style environment with PyBullet.
 
         Args:
@@ -44,6 +66,31 @@ class Environment(gym.Env):
           disp: show environment with PyBullet's built-in display viewer.
           shared_memory: run with shared memory.
           hz: PyBullet physics simulation step speed. Set to 480 for deformables.
+          occupancy_map: track object footprints in an occupancy map, so that
+            `Task.get_random_pose` renders once per reset instead of once per
+            object. Footprints of objects added after the first render are
+            their bounding boxes, so sampled poses differ from the default.
+          orthographic_oracle: render the oracle heightmaps of
+            `Task.get_true_image` with one orthographic camera at heightmap
+            resolution instead of reconstructing them from a point cloud.
+            Edge cells differ, so sampled poses differ from the default.
+          fast_reset: load the robot and workspace once, snapshot them with
+            `saveState`, and on later resets only remove the task bodies and
+            restore the snapshot instead of resetting the simulation.
+          file_caching: let PyBullet cache parsed meshes across loads. Filled
+            templates are named after their content, so this is safe as long
+            as asset files are not rewritten while the environment runs.
+          render_obs: render camera observations in step and reset. If False,
+            observations are empty, e.g. for reward-only rollouts.
+          lazy_obs: return a `LazyObservation` that renders the cameras when
+            its images are first read, instead of rendering on every step.
+          obs_cams: indices of the agent cameras to observe, default all.
+          settle_steps: max simulation steps to let objects settle after an
+            action, default SETTLE_SECONDS of simulated time.
+          movej_steps: max simulation steps of a single movej.
+          static_velocity: objects slower than this (m/s) are static.
+          static_angular_velocity: if set, objects must also rotate slower
+            than this (rad/s) to be static.
 
         Raises:
           RuntimeError: if pybullet cannot load fileIOPlugin.
@@ -54,19 +101,30 @@ class Environment(gym.Env):
 
         self.homej = np.array([-1, -0.5, 0.5, -0.5, -0.5, 0]) * np.pi
         self.agent_cams = cameras.RealSenseD415.CONFIG
+        self.obs_cams = (self.agent_cams if obs_cams is None
+                         else [self.agent_cams[i] for i in obs_cams])
+        self.render_obs = render_obs
+        self.lazy_obs = lazy_obs
+        self.obs_version = 0
         self.record_cfg = record_cfg
+        self.blender_render = bool(record_cfg) and bool(record_cfg.get('blender_render', False))
         self.save_video = False
         self.step_counter = 0
+        self.sim_steps = 0
+        self.settle_steps = int(SETTLE_SECONDS * hz) if settle_steps is None else settle_steps
+        self.movej_steps = movej_steps
+        self.static_velocity = static_velocity
+        self.static_angular_velocity = static_angular_velocity
 
         self.assets_root = assets_root
 
         color_tuple = [
             gym.spaces.Box(0, 255, config['image_size'] + (3,), dtype=np.uint8)
-            for config in self.agent_cams
+            for config in self.obs_cams
         ]
         depth_tuple = [
             gym.spaces.Box(0.0, 20.0, config['image_size'], dtype=np.float32)
-            for config in self.agent_cams
+            for config in self.obs_cams
         ]
         self.observation_space = gym.spaces.Dict({
             'color': gym.spaces.Tuple(color_tuple),
@@ -78,6 +136,15 @@ class Environment(gym.Env):
             shape=(3,),
             dtype=np.float32)
         self.bounds = np.array([[0.25, 0.75], [-0.5, 0.5], [0, 0.3]])
+        self.occupancy = OccupancyMap(self.bounds, self.pix_size) if occupancy_map else None
+        self.orthographic_oracle = orthographic_oracle
+
+        # Snapshot of the robot and workspace for fast resets.
+        self.fast_reset = fast_reset
+        self.scene_state = None
+        self.scene_ee = None
+        self.scene_bodies = set()
+        self.scene_constraints = set()
 
         self.action_space = gym.spaces.Dict({
             'pose0':
@@ -90,33 +157,36 @@ class Environment(gym.Env):
                      gym.spaces.Box(-1.0, 1.0, shape=(4,), dtype=np.float32)))
         })
 
-        # Start PyBullet.
+        # Start PyBullet. Each environment owns its own physics client, so
+        # several environments can live in one process.
         disp_option = p.DIRECT
         if disp:
             disp_option = p.GUI
             if shared_memory:
                 disp_option = p.SHARED_MEMORY
-        client = p.connect(disp_option)
-        file_io = p.loadPlugin('fileIOPlugin', physicsClientId=client)
+        self.p = bullet_client.BulletClient(connection_mode=disp_option)
+        # GUI servers render with OpenGL, DIRECT clients with TinyRenderer, which
+        # encode the depth buffer differently, see render_orthographic.
+        self.opengl_renderer = disp_option != p.DIRECT
+        file_io = self.p.loadPlugin('fileIOPlugin')
         if file_io < 0:
             raise RuntimeError('pybullet: cannot load FileIO!')
         if file_io >= 0:
-            p.executePluginCommand(
+            self.p.executePluginCommand(
                 file_io,
                 textArgument=assets_root,
-                intArgs=[p.AddFileIOAction],
-                physicsClientId=client)
+                intArgs=[p.AddFileIOAction])
 
-        p.configureDebugVisualizer(p.COV_ENABLE_GUI, 0)
-        p.setPhysicsEngineParameter(enableFileCaching=0)
-        p.setAdditionalSearchPath(assets_root)
-        p.setAdditionalSearchPath(tempfile.gettempdir())
-        p.setTimeStep(1. / hz)
+        self.p.configureDebugVisualizer(self.p.COV_ENABLE_GUI, 0)
+        self.p.setPhysicsEngineParameter(enableFileCaching=int(file_caching))
+        self.p.setAdditionalSearchPath(assets_root)
+        self.p.setAdditionalSearchPath(tempfile.gettempdir())
+        self.p.setTimeStep(1. / hz)
 
         # If using --disp, move default camera closer to the scene.
         if disp:
-            target = p.getDebugVisualizerCamera()[11]
-            p.resetDebugVisualizerCamera(
+            target = self.p.getDebugVisualizerCamera()[11]
+            self.p.resetDebugVisualizerCamera(
                 cameraDistance=1.1,
                 cameraYaw=90,
                 cameraPitch=-25,
@@ -129,18 +199,35 @@ class Environment(gym.Env):
         if hasattr(self, 'video_writer'):
             self.video_writer.close()
 
+    def close(self):
+        """Disconnects the physics client of this environment.
+
+        Going through the client also forgets its id, so that collecting this
+        environment later does not disconnect a new client that reuses the id.
+        """
+        try:
+            self.p.disconnect()
+        except p.error:
+            pass
+
     @property
     def is_static(self):
         """Return true if objects are no longer moving."""
-        v = [np.linalg.norm(p.getBaseVelocity(i)[0])
-             for i in self.obj_ids['rigid']]
-        return all(np.array(v) < 5e-3)
+        if not self.obj_ids['rigid']:
+            return True
+        # (N, 2, 3) linear and angular velocities of all rigid objects.
+        v = np.float64([self.p.getBaseVelocity(i) for i in self.obj_ids['rigid']])
+        speed = np.linalg.norm(v, axis=2)
+        if np.any(speed[:, 0] >= self.static_velocity):
+            return False
+        return (self.static_angular_velocity is None
+                or bool(np.all(speed[:, 1] < self.static_angular_velocity)))
 
     def fill_dummy_template(self, template):
         """check if there are empty templates that haven't been fulfilled yet. if so. fill in dummy numbers """
         full_template_path = os.path.join(self.assets_root, template)
-        with open(full_template_path, 'r') as file:
-            fdata = file.read()
+        template_cache = urdf_cache.get_template_cache()
+        fdata = template_cache.read(full_template_path)
 
         fill = False
         for field in ['DIMH', 'DIMR', 'DIMX', 'DIMY', 'DIMZ', 'DIM']:
@@ -160,16 +247,8 @@ class Environment(gym.Env):
                 fill = True
 
         if fill:
-            alphabet = string.ascii_lowercase + string.digits
-            rname = ''.join(random.choices(alphabet, k=16))
-            tmpdir = tempfile.gettempdir()
-            template_filename = os.path.split(template)[-1]
-            fname = os.path.join(tmpdir, f'{template_filename}.{rname}')
-            with open(fname, 'w') as file:
-                file.write(fdata)
             # print("fill-in dummys")
-
-            return fname
+            return template_cache.write(full_template_path, fdata)
         else:
             return template
 
@@ -192,7 +271,7 @@ class Environment(gym.Env):
             pose = (pose, (0,0,0,1))
 
         obj_id = pybullet_utils.load_urdf(
-            p,
+            self.p,
             os.path.join(self.assets_root, urdf),
             pose[0],
             pose[1],
@@ -200,14 +279,16 @@ class Environment(gym.Env):
 
         if not obj_id is None:
             self.obj_ids[category].append(obj_id)
+            if self.occupancy is not None and self.occupancy.seeded:
+                self.occupancy.add(obj_id, pose, self.p.getAABB(obj_id))
 
         if color is not None:
             if type(color) is str:
                 color = utils.COLORS[color]
             color = color + [1.]
-            p.changeVisualShape(obj_id, -1, rgbaColor=color)
+            self.p.changeVisualShape(obj_id, -1, rgbaColor=color)
 
-        if  hasattr(self, 'record_cfg') and 'blender_render' in self.record_cfg and self.record_cfg['blender_render']:
+        if self.blender_render:
             # print("urdf:", os.path.join(self.assets_root, urdf))
             # if color is None:
             #     color = (0.5,0.5,0.5,1) # by default
@@ -218,7 +299,7 @@ class Environment(gym.Env):
         return obj_id
 
     def set_color(self, obj_id, color):
-        p.changeVisualShape(obj_id, -1, rgbaColor=color + [1])
+        self.p.changeVisualShape(obj_id, -1, rgbaColor=color + [1])
 
     def set_object_color(self, *args, **kwargs):
         return self.set_color(*args, **kwargs)
@@ -236,26 +317,49 @@ class Environment(gym.Env):
         if not self.task:
             raise ValueError('environment task must be set. Call set_task or pass '
                              'the task arg in the environment constructor.')
+        had_deformables = bool(self.obj_ids['deformable'])
         self.obj_ids = {'fixed': [], 'rigid': [], 'deformable': []}
-        p.resetSimulation(p.RESET_USE_DEFORMABLE_WORLD)
-        p.setGravity(0, 0, -9.8)
+        if self.occupancy is not None:
+            self.occupancy.reset()
 
         # Temporarily disable rendering to load scene faster.
-        p.configureDebugVisualizer(p.COV_ENABLE_RENDERING, 0)
+        self.p.configureDebugVisualizer(self.p.COV_ENABLE_RENDERING, 0)
+
+        # Reuse the robot and workspace of the previous episode if possible.
+        # Deformables are only removed by resetting the simulation.
+        if (self.fast_reset and self.scene_state is not None and not had_deformables
+                and self.scene_ee is self.task.ee and not self.blender_render):
+            self.restore_scene()
+        else:
+            self.load_scene()
+
+        # Reset task.
+        self.task.reset(self)
+
+        # Re-enable rendering.
+        self.p.configureDebugVisualizer(self.p.COV_ENABLE_RENDERING, 1)
 
-        plane = pybullet_utils.load_urdf(p, os.path.join(self.assets_root, PLANE_URDF_PATH),
+        obs, _, _, _ = self.step()
+        return obs
+
+    def load_scene(self):
+        """Resets the simulation and loads the robot and workspace."""
+        self.p.resetSimulation(self.p.RESET_USE_DEFORMABLE_WORLD)
+        self.p.setGravity(0, 0, -9.8)
+
+        plane = pybullet_utils.load_urdf(self.p, os.path.join(self.assets_root, PLANE_URDF_PATH),
                                  [0, 0, -0.001])
         workspace = pybullet_utils.load_urdf(
-            p, os.path.join(self.assets_root, UR5_WORKSPACE_URDF_PATH), [0.5, 0, 0])
+            self.p, os.path.join(self.assets_root, UR5_WORKSPACE_URDF_PATH), [0.5, 0, 0])
 
         # Load UR5 robot arm equipped with suction end effector.
         # TODO(andyzeng): add back parallel-jaw grippers.
         self.ur5 = pybullet_utils.load_urdf(
-            p, os.path.join(self.assets_root, UR5_URDF_PATH))
-        self.ee = self.task.ee(self.assets_root, self.ur5, 9, self.obj_ids)
+            self.p, os.path.join(self.assets_root, UR5_URDF_PATH))
+        self.ee = self.task.ee(self.assets_root, self.ur5, 9, self.obj_ids, pybullet_client=self.p)
         self.ee_tip = 10  # Link ID of suction cup.
 
-        if  hasattr(self, 'record_cfg') and 'blender_render' in self.record_cfg and self.record_cfg['blender_render']:
+        if self.blender_render:
             from misc.pyBulletSimRecorder import PyBulletRecorder
             self.blender_recorder = PyBulletRecorder()
 
@@ -269,25 +373,48 @@ class Environment(gym.Env):
 
 
         # Get revolute joint indices of robot (skip fixed joints).
-        n_joints = p.getNumJoints(self.ur5)
-        joints = [p.getJointInfo(self.ur5, i) for i in range(n_joints)]
-        self.joints = [j[0] for j in joints if j[2] == p.JOINT_REVOLUTE]
+        n_joints = self.p.getNumJoints(self.ur5)
+        joints = [self.p.getJointInfo(self.ur5, i) for i in range(n_joints)]
+        self.joints = [j[0] for j in joints if j[2] == self.p.JOINT_REVOLUTE]
 
         # Move robot to home joint configuration.
         for i in range(len(self.joints)):
-            p.resetJointState(self.ur5, self.joints[i], self.homej[i])
+            self.p.resetJointState(self.ur5, self.joints[i], self.homej[i])
 
         # Reset end effector.
         self.ee.release()
 
-        # Reset task.
-        self.task.reset(self)
-
-        # Re-enable rendering.
-        p.configureDebugVisualizer(p.COV_ENABLE_RENDERING, 1)
+        # Snapshot the scene, so that later resets only restore it.
+        if self.fast_reset:
+            self.scene_bodies = {self.p.getBodyUniqueId(i) for i in range(self.p.getNumBodies())}
+            self.scene_constraints = {self.p.getConstraintUniqueId(i)
+                                      for i in range(self.p.getNumConstraints())}
+            self.scene_state = self.p.saveState()
+            self.scene_ee = self.task.ee
 
-        obs, _, _, _ = self.step()
-        return obs
+    def restore_scene(self):
+        """Removes the task bodies and restores the robot to its loaded state."""
+        self.ee.release()
+        constraints = [self.p.getConstraintUniqueId(i) for i in range(self.p.getNumConstraints())]
+        for constraint_id in constraints:
+            if constraint_id not in self.scene_constraints:
+                self.p.removeConstraint(constraint_id)
+        bodies = [self.p.getBodyUniqueId(i) for i in range(self.p.getNumBodies())]
+        for body_id in bodies:
+            if body_id not in self.scene_bodies:
+                self.p.removeBody(body_id)
+
+        # Restores poses and velocities of the robot and gripper. Motor targets
+        # are not part of the state, so hold the arm at its home configuration.
+        self.p.restoreState(self.scene_state)
+        self.p.setJointMotorControlArray(
+            bodyIndex=self.ur5,
+            jointIndices=self.joints,
+            controlMode=self.p.POSITION_CONTROL,
+            targetPositions=self.homej,
+            positionGains=np.ones(len(self.joints)))
+        if hasattr(self.ee, 'obj_ids'):
+            self.ee.obj_ids = self.obj_ids
 
     def step(self, action=None):
         """Execute action with specified primitive.
@@ -298,25 +425,21 @@ class Environment(gym.Env):
         Returns:
           (obs, reward, done, info) tuple containing MDP step data.
         """
+        start_steps = self.sim_steps
         if action is not None:
             timeout = self.task.primitive(self.movej, self.movep, self.ee, action['pose0'], action['pose1'])
 
             # Exit early if action times out. We still return an observation
             # so that we don't break the Gym API contract.
             if timeout:
-                obs = {'color': (), 'depth': ()}
-                for config in self.agent_cams:
-                    color, depth, _ = self.render_camera(config)
-                    obs['color'] += (color,)
-                    obs['depth'] += (depth,)
-                return obs, 0.0, True, self.info
-
-        start_time = time.time()
-        # Step simulator asynchronously until objects settle.
-        while not self.is_static:
-            self.step_simulation()
-            if time.time() - start_time > 5: # timeout
+                return self._get_obs(), 0.0, True, self.info
+
+        # Step simulator until objects settle, within a step budget so that
+        # rollouts do not depend on machine load.
+        for _ in range(self.settle_steps):
+            if self.is_static:
                 break
+            self.step_simulation()
 
         # Get task rewards.
         reward, info = self.task.reward() if action is not None else (0, {})
@@ -324,14 +447,16 @@ class Environment(gym.Env):
 
         # Add ground truth robot state into info.
         info.update(self.info)
+        info['sim_steps'] = self.sim_steps - start_steps
 
         obs = self._get_obs()
 
         return obs, reward, done, info
 
     def step_simulation(self):
-        p.stepSimulation()
+        self.p.stepSimulation()
         self.step_counter += 1
+        self.sim_steps += 1
 
         if self.save_video and self.step_counter % 5 == 0:
             self.add_video_frame()
@@ -352,30 +477,30 @@ class Environment(gym.Env):
         # OpenGL camera settings.
         lookdir = np.float32([0, 0, 1]).reshape(3, 1)
         updir = np.float32([0, -1, 0]).reshape(3, 1)
-        rotation = p.getMatrixFromQuaternion(config['rotation'])
+        rotation = self.p.getMatrixFromQuaternion(config['rotation'])
         rotm = np.float32(rotation).reshape(3, 3)
         lookdir = (rotm @ lookdir).reshape(-1)
         updir = (rotm @ updir).reshape(-1)
         lookat = config['position'] + lookdir
         focal_len = config['intrinsics'][0]
         znear, zfar = config['zrange']
-        viewm = p.computeViewMatrix(config['position'], lookat, updir)
+        viewm = self.p.computeViewMatrix(config['position'], lookat, updir)
         fovh = (image_size[0] / 2) / focal_len
         fovh = 180 * np.arctan(fovh) * 2 / np.pi
 
         # Notes: 1) FOV is vertical FOV 2) aspect must be float
         aspect_ratio = image_size[1] / image_size[0]
-        projm = p.computeProjectionMatrixFOV(fovh, aspect_ratio, znear, zfar)
+        projm = self.p.computeProjectionMatrixFOV(fovh, aspect_ratio, znear, zfar)
 
         # Render with OpenGL camera settings.
-        _, _, color, depth, segm = p.getCameraImage(
+        _, _, color, depth, segm = self.p.getCameraImage(
             width=image_size[1],
             height=image_size[0],
             viewMatrix=viewm,
             projectionMatrix=projm,
             shadow=shadow,
-            flags=p.ER_SEGMENTATION_MASK_OBJECT_AND_LINKINDEX,
-            renderer=p.ER_BULLET_HARDWARE_OPENGL)
+            flags=self.p.ER_SEGMENTATION_MASK_OBJECT_AND_LINKINDEX,
+            renderer=self.p.ER_BULLET_HARDWARE_OPENGL)
 
         # Get color image.
         color_image_size = (image_size[0], image_size[1], 4)
@@ -399,6 +524,62 @@ class Environment(gym.Env):
 
         return color, depth, segm
 
+    def render_orthographic(self, bounds, pixel_size, shadow=1):
+        """Render an orthographic top-down RGB-D image of the workspace.
+
+        The image has heightmap resolution: pixel (u, v) is the center of the
+        heightmap cell (u, v) of `utils.get_heightmap` with the same bounds and
+        pixel size, so no reprojection is needed.
+
+        Returns:
+          color: HxWx3 uint8 color image.
+          height: HxW float array of the world z of the top surface.
+          segm: HxW uint8 segmentation image.
+        """
+        width = int(np.round((bounds[0, 1] - bounds[0, 0]) / pixel_size))
+        height = int(np.round((bounds[1, 1] - bounds[1, 0]) / pixel_size))
+        half_width, half_height = width * pixel_size / 2, height * pixel_size / 2
+        center = (bounds[0, 0] + half_width, bounds[1, 0] + half_height)
+        # Like the near-orthographic oracle camera, clip everything above the
+        # bounds (e.g. the robot arm) so that it does not hide the workspace.
+        znear = ORTHO_CAMERA_HEIGHT - bounds[2, 1]
+        zfar = ORTHO_CAMERA_HEIGHT - bounds[2, 0] + 1.
+
+        # Looking down with -y up, so rows follow +y and columns follow -x.
+        eye = (center[0], center[1], ORTHO_CAMERA_HEIGHT)
+        viewm = self.p.computeViewMatrix(eye, (center[0], center[1], 0), (0, -1, 0))
+
+        # Orthographic projection (column-major). Depth maps linearly to the
+        # OpenGL z-buffer: d = 0 at znear and d = 1 at zfar. TinyRenderer instead
+        # reads znear and zfar from the depth row as if it were perspective and
+        # encodes the z-buffer perspectively, so give it the perspective row.
+        if self.opengl_renderer:
+            depth_row = (-2 / (zfar - znear), -(zfar + znear) / (zfar - znear))
+        else:
+            depth_row = (-(zfar + znear) / (zfar - znear), -2 * zfar * znear / (zfar - znear))
+        projm = (1 / half_width, 0, 0, 0,
+                 0, 1 / half_height, 0, 0,
+                 0, 0, depth_row[0], 0,
+                 0, 0, depth_row[1], 1)
+
+        _, _, color, depth, segm = self.p.getCameraImage(
+            width=width,
+            height=height,
+            viewMatrix=viewm,
+            projectionMatrix=projm,
+            shadow=shadow,
+            flags=self.p.ER_SEGMENTATION_MASK_OBJECT_AND_LINKINDEX,
+            renderer=self.p.ER_BULLET_HARDWARE_OPENGL)
+
+        color = np.array(color, dtype=np.uint8).reshape((height, width, 4))[:, ::-1, :3]
+        zbuffer = np.array(depth).reshape((height, width))[:, ::-1]
+        if self.opengl_renderer:
+            depth = znear + zbuffer * (zfar - znear)
+        else:
+            depth = (2. * znear * zfar) / (zfar + znear - (2. * zbuffer - 1.) * (zfar - znear))
+        segm = np.uint8(segm).reshape((height, width))[:, ::-1]
+        return color, ORTHO_CAMERA_HEIGHT - depth, segm
+
     @property
     def info(self):
         """Environment info variable with object poses, dimensions, and colors."""
@@ -412,8 +593,8 @@ class Environment(gym.Env):
         info = {}  # object id : (position, rotation, dimensions)
         for obj_ids in self.obj_ids.values():
             for obj_id in obj_ids:
-                pos, rot = p.getBasePositionAndOrientation(obj_id)
-                dim = p.getVisualShapeData(obj_id)[0][3]
+                pos, rot = self.p.getBasePositionAndOrientation(obj_id)
+                dim = self.p.getVisualShapeData(obj_id)[0][3]
                 info[obj_id] = (pos, rot, dim)
 
         info['lang_goal'] = self.get_lang_goal()
@@ -421,6 +602,7 @@ class Environment(gym.Env):
 
     def set_task(self, task):
         task.set_assets_root(self.assets_root)
+        task.set_pybullet_client(self.p)
         self.task = task
 
     def get_task_name(self):
@@ -436,15 +618,11 @@ class Environment(gym.Env):
     # Robot Movement Functions
     # ---------------------------------------------------------------------------
 
-    def movej(self, targj, speed=0.01, timeout=5):
-        """Move UR5 to target joint configuration."""
-        if self.save_video:
-            timeout = timeout * 30 # 50?
-
-        t0 = time.time()
-        while (time.time() - t0) < timeout:
-            currj = [p.getJointState(self.ur5, i)[0] for i in self.joints]
-            currj = np.array(currj)
+    def movej(self, targj, speed=0.01, max_steps=None):
+        """Move UR5 to target joint configuration within max_steps simulation steps."""
+        max_steps = self.movej_steps if max_steps is None else max_steps
+        for _ in range(max_steps):
+            currj = np.array([state[0] for state in self.p.getJointStates(self.ur5, self.joints)])
             diffj = targj - currj
             if all(np.abs(diffj) < 1e-2):
                 return False
@@ -454,16 +632,15 @@ class Environment(gym.Env):
             v = diffj / norm if norm > 0 else 0
             stepj = currj + v * speed
             gains = np.ones(len(self.joints))
-            p.setJointMotorControlArray(
+            self.p.setJointMotorControlArray(
                 bodyIndex=self.ur5,
                 jointIndices=self.joints,
-                controlMode=p.POSITION_CONTROL,
+                controlMode=self.p.POSITION_CONTROL,
                 targetPositions=stepj,
                 positionGains=gains)
-            self.step_counter += 1
             self.step_simulation()
 
-        print(f'Warning: movej exceeded {timeout} second timeout. Skipping.')
+        print(f'Warning: movej exceeded {max_steps} simulation steps. Skipping.')
         return True
 
     def start_rec(self, video_filename):
@@ -483,14 +660,14 @@ class Environment(gym.Env):
                                                fps=self.record_cfg['fps'],
                                                format='FFMPEG',
                                                codec='h264',)
-        p.setRealTimeSimulation(False)
+        self.p.setRealTimeSimulation(False)
         self.save_video = True
 
     def end_rec(self):
         if hasattr(self, 'video_writer'):
             self.video_writer.close()
 
-        p.setRealTimeSimulation(True)
+        self.p.setRealTimeSimulation(True)
         self.save_video = False
 
     def add_video_frame(self):
@@ -565,7 +742,7 @@ class Environment(gym.Env):
 
     def solve_ik(self, pose):
         """Calculate joint configuration with inverse kinematics."""
-        joints = p.calculateInverseKinematics(
+        joints = self.p.calculateInverseKinematics(
             bodyUniqueId=self.ur5,
             endEffectorLinkIndex=self.ee_tip,
             targetPosition=pose[0],
@@ -580,22 +757,31 @@ class Environment(gym.Env):
         joints[2:] = (joints[2:] + np.pi) % (2 * np.pi) - np.pi
         return joints
 
-    def _get_obs(self):
-        # Get RGB-D camera image observations.
+    def render_cameras(self, configs):
+        """Render the RGB-D images of the given cameras."""
         obs = {'color': (), 'depth': ()}
-        for config in self.agent_cams:
+        for config in configs:
             color, depth, _ = self.render_camera(config)
             obs['color'] += (color,)
             obs['depth'] += (depth,)
 
         return obs
 
+    def _get_obs(self):
+        # Get RGB-D camera image observations.
+        self.obs_version += 1
+        if not self.render_obs:
+            return {'color': (), 'depth': ()}
+        if self.lazy_obs:
+            return LazyObservation(self, self.obs_cams)
+        return self.render_cameras(self.obs_cams)
+
     def get_object_pose(self, obj_id):
-        return p.getBasePositionAndOrientation(obj_id)
+        return self.p.getBasePositionAndOrientation(obj_id)
 
     def get_object_size(self, obj_id):
         """ approximate object's size using AABB """
-        aabb_min, aabb_max = p.getAABB(obj_id)
+        aabb_min, aabb_max = self.p.getAABB(obj_id)
 
         size_x = aabb_max[0] - aabb_min[0]
         size_y = aabb_max[1] - aabb_min[1]
@@ -604,6 +790,47 @@ class Environment(gym.Env):
 
 
 
+class LazyObservation(collections.abc.Mapping):
+    """RGB-D observation whose cameras are rendered when first read.
+
+    Reading 'color' or 'depth' renders all cameras, `camera(i)` renders only
+    camera i. Images must be read before the environment steps again, since
+    they are rendered from the current simulation state. Pickling renders the
+    remaining cameras and stores a plain dict.
+    """
+
+    def __init__(self, env, configs):
+        self.env = env
+        self.configs = configs
+        self.version = env.obs_version
+        self.images = [None] * len(configs)
+
+    def camera(self, i):
+        """(color, depth) of camera i, rendered on first access."""
+        if self.images[i] is None:
+            if self.env.obs_version != self.version:
+                raise RuntimeError('Observation is stale: the environment '
+                                   'stepped before its images were read.')
+            color, depth, _ = self.env.render_camera(self.configs[i])
+            self.images[i] = (color, depth)
+        return self.images[i]
+
+    def __getitem__(self, key):
+        if key not in ('color', 'depth'):
+            raise KeyError(key)
+        index = 0 if key == 'color' else 1
+        return tuple(self.camera(i)[index] for i in range(len(self.configs)))
+
+    def __iter__(self):
+        return iter(('color', 'depth'))
+
+    def __len__(self):
+        return 2
+
+    def __reduce__(self):
+        return (dict, (dict(self.items()),))
+
+
 class EnvironmentNoRotationsWithHeightmap(Environment):
     """Environment that disables any rotations and always passes [0, 0, 0, 1]."""
 
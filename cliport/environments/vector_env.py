@@ -0,0 +1,172 @@
+"""Vectorized environment running several Environments in subprocesses."""
+
+import multiprocessing
+import random
+import traceback
+
+import numpy as np
+from cliport import tasks
+from cliport.environments.environment import Environment
+
+
+def _worker(remote, parent_remote, env_kwargs, task_name, mode):
+    """Owns one Environment and its oracle, and serves commands from remote.
+
+    Replies are ('ok', result), or ('error', traceback) if the command raised.
+    """
+    parent_remote.close()
+    env = None
+    try:
+        env = Environment(**env_kwargs)
+        task = tasks.names[task_name]()
+        task.mode = mode
+        env.set_task(task)
+        agent = task.oracle(env)
+    except Exception:  # pylint: disable=broad-except
+        # Report the failure on the first command, instead of leaving the
+        # parent waiting for a reply.
+        env_error = traceback.format_exc()
+    else:
+        env_error = None
+    obs, info = None, None
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == 'close':
+                break
+            try:
+                if env_error is not None:
+                    raise RuntimeError(f'Environment failed to start:\n{env_error}')
+                if cmd == 'reset':
+                    # Seed like demos.py, so that episodes match single env runs.
+                    np.random.seed(data)
+                    random.seed(data)
+                    env.seed(data)
+                    env.set_task(task)
+                    obs = env.reset()
+                    info = env.info
+                    result = (obs, info)
+                elif cmd == 'step':
+                    obs, reward, done, info = env.step(data)
+                    result = (obs, reward, done, info)
+                elif cmd == 'oracle_act':
+                    result = agent.act(obs, info)
+                elif cmd == 'call':
+                    name, args, kwargs = data
+                    result = getattr(env, name)(*args, **kwargs)
+                else:
+                    raise ValueError(f'Unknown command: {cmd}')
+            except Exception:  # pylint: disable=broad-except
+                remote.send(('error', traceback.format_exc()))
+            else:
+                remote.send(('ok', result))
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        if env is not None:
+            env.close()
+        remote.close()
+
+
+def stack_obs(obs):
+    """Stacks a list of observations into one with a leading env axis.
+
+    Args:
+      obs: list of {'color': (H, W, 3) per camera, 'depth': (H, W) per camera}.
+
+    Returns:
+      {'color': (N, H, W, 3) per camera, 'depth': (N, H, W) per camera}.
+    """
+    return {key: tuple(np.stack(images) for images in zip(*[o[key] for o in obs]))
+            for key in obs[0]}
+
+
+class VectorEnv:
+    """Runs N environments of the same task in worker subprocesses.
+
+    Each worker owns an `Environment`, so it has its own PyBullet client, and
+    the oracle of its task. Commands are sent to all workers before any reply
+    is read, so the environments step concurrently.
+    """
+
+    def __init__(self, n_envs, task_name, mode='train', start_method='spawn', **env_kwargs):
+        """Starts the workers.
+
+        Args:
+          n_envs: number of environments.
+          task_name: name of the task in `tasks.names`.
+          mode: task mode, one of train, val or test.
+          start_method: multiprocessing start method. `spawn` keeps the
+            workers free of the PyBullet and CUDA state of the parent.
+          **env_kwargs: arguments of `Environment`, e.g. assets_root and hz.
+        """
+        ctx = multiprocessing.get_context(start_method)
+        self.remotes, work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for remote, work_remote in zip(self.remotes, work_remotes):
+            process = ctx.Process(target=_worker,
+                                  args=(work_remote, remote, env_kwargs, task_name, mode),
+                                  daemon=True)
+            process.start()
+            work_remote.close()
+            self.processes.append(process)
+        self.closed = False
+
+    def __len__(self):
+        return len(self.remotes)
+
+    def _send(self, cmd, data, indices=None):
+        indices = range(len(self)) if indices is None else indices
+        for i, d in zip(indices, data):
+            self.remotes[i].send((cmd, d))
+        # Read every reply before raising, so that no reply is left in a pipe.
+        replies = [self.remotes[i].recv() for i in indices]
+        for i, (status, result) in zip(indices, replies):
+            if status == 'error':
+                raise RuntimeError(f'Environment {i} failed on {cmd}:\n{result}')
+        return [result for _, result in replies]
+
+    def reset(self, seeds, indices=None):
+        """Resets the environments with the given seeds.
+
+        Returns:
+          (obs, infos): observations stacked over environments, and the list of
+          their info dicts.
+        """
+        obs, infos = zip(*self._send('reset', seeds, indices))
+        return stack_obs(obs), list(infos)
+
+    def step(self, actions, indices=None):
+        """Steps each environment with its action (None to only settle).
+
+        Returns:
+          (obs, rewards, dones, infos) with obs stacked over environments.
+        """
+        obs, rewards, dones, infos = zip(*self._send('step', actions, indices))
+        return stack_obs(obs), np.float32(rewards), np.bool_(dones), list(infos)
+
+    def oracle_act(self, indices=None):
+        """Actions of the task oracles for the current state of each environment."""
+        indices = range(len(self)) if indices is None else indices
+        return self._send('oracle_act', [None] * len(indices), indices)
+
+    def call(self, name, *args, indices=None, **kwargs):
+        """Calls an `Environment` method in each environment and returns the results."""
+        indices = range(len(self)) if indices is None else indices
+        return self._send('call', [(name, args, kwargs)] * len(indices), indices)
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            try:
+                remote.send(('close', None))
+            except (BrokenPipeError, EOFError):
+                pass  # The worker already exited.
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def __del__(self):
+        if hasattr(self, 'closed'):
+            self.close()
@@ -25,7 +25,8 @@ def main(vcfg):
         disp=vcfg['disp'],
         shared_memory=vcfg['shared_memory'],
         hz=480,
-        record_cfg=vcfg['record']
+        record_cfg=vcfg['record'],
+        fast_reset=vcfg['fast_reset']
     )
 
     # Choose eval mode and task.
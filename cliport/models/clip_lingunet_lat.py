@@ -5,7 +5,8 @@ import torch.nn.functional as F
 import cliport.utils.utils as utils
 from cliport.models.resnet import IdentityBlock, ConvBlock
 from cliport.models.core.unet import Up
-from cliport.models.core.clip import build_model, load_clip, tokenize
+from cliport.models.core.clip import build_model, load_clip
+from cliport.models.core.lang_goals import CLIPTextCache
 
 from cliport.models.core import fusion
 from cliport.models.core.fusion import FusionConvLat
@@ -26,6 +27,7 @@ class CLIPLingUNetLat(nn.Module):
         self.bilinear = True
         self.up_factor = 2 if self.bilinear else 1
         self.preprocess = preprocess
+        self.text_cache = CLIPTextCache()
 
         self._load_clip()
         self._build_decoder()
@@ -97,10 +99,9 @@ class CLIPLingUNetLat(nn.Module):
         return img_encoding, img_im
 
     def encode_text(self, x):
-        with torch.no_grad():
-            tokens = tokenize(x).to(self.device)
-            text_feat, text_emb = self.clip_rn50.encode_text_with_embeddings(tokens)
-
+        # The CLIP text encoder is frozen, so each goal is encoded once and
+        # looked up by its vocabulary id or string, see CLIPTextCache.
+        text_feat, text_emb, tokens = self.text_cache.encode(self.clip_rn50, x)
         text_mask = torch.where(tokens==0, tokens, 1)  # [1, max_token_len]
         return text_feat, text_emb, text_mask
 
@@ -0,0 +1,111 @@
+"""Language goals of a batch and cached CLIP encodings of them."""
+
+from collections import OrderedDict
+
+import torch
+
+from cliport.models.core.clip import tokenize
+
+# Max number of goals outside the vocabulary whose CLIP encodings are kept.
+TEXT_CACHE_SIZE = 4096
+
+# Goals per CLIP text encoder pass when encoding a vocabulary.
+VOCAB_BATCH_SIZE = 256
+
+
+class LangGoals(list):
+    """Language goal strings of a batch, with their vocabulary ids and CLIP tokens.
+
+    It is a list of the strings, so models that tokenize the strings themselves
+    (BERT, MDETR) take it as is. CLIP models look up the encodings of the goals
+    by id, see `CLIPTextCache`.
+    """
+
+    def __init__(self, texts, ids=None, tokens=None):
+        super().__init__([texts] if isinstance(texts, str) else texts)
+        self.ids = ids
+        self.tokens = tokens
+
+    @classmethod
+    def from_batch(cls, frame, ids=True):
+        """Goals of a collated batch of dataset samples. Set ids=False if the ids
+        are not those of the vocabulary the models were given."""
+        return cls(frame['lang_goal'],
+                   frame.get('lang_goal_id') if ids else None,
+                   frame.get('lang_goal_tokens'))
+
+
+class CLIPTextCache:
+    """Frozen CLIP text encodings (features, word embeddings, tokens) of language goals.
+
+    The goals of the dataset vocabulary, see `set_vocabulary`, are encoded in
+    a few batches the first time they are used on a device, and looked up by
+    their id. Other goals, e.g. at evaluation, are encoded once per distinct
+    string and kept in an LRU of TEXT_CACHE_SIZE goals.
+    """
+
+    def __init__(self, max_size=TEXT_CACHE_SIZE):
+        self.max_size = max_size
+        self.vocab_tokens = None
+        self.vocab = {}  # device -> (text_feat, text_emb, tokens) of every vocabulary goal
+        self.texts = OrderedDict()  # (device, lang goal) -> (text_feat, text_emb, tokens)
+
+    def set_vocabulary(self, tokens):
+        """Set the CLIP tokens of the vocabulary, one row per goal id."""
+        self.vocab_tokens = torch.as_tensor(tokens, dtype=torch.long)
+        self.vocab = {}
+
+    def encode(self, clip_model, l):
+        """Encodings of a goal string, a list of goals or `LangGoals`, batched along dim 0."""
+        device = clip_model.token_embedding.weight.device
+        ids = getattr(l, 'ids', None)
+        if ids is not None and self.vocab_tokens is not None:
+            ids = torch.as_tensor(ids, dtype=torch.long).to(device)
+            if len(ids) > 0 and int(ids.min()) >= 0:
+                text_feat, text_emb, tokens = self._encode_vocab(clip_model, device)
+                return text_feat[ids], text_emb[ids], tokens[ids]
+        return self._encode_texts(clip_model, l, device)
+
+    def _encode_vocab(self, clip_model, device):
+        if device not in self.vocab:
+            tokens = self.vocab_tokens.to(device)
+            encodings = []
+            with torch.no_grad():
+                for i in range(0, len(tokens), VOCAB_BATCH_SIZE):
+                    encodings.append(clip_model.encode_text_with_embeddings(tokens[i:i + VOCAB_BATCH_SIZE]))
+            text_feat, text_emb = [torch.cat(encoding) for encoding in zip(*encodings)]
+            self.vocab[device] = (text_feat, text_emb, tokens)
+        return self.vocab[device]
+
+    def _encode_texts(self, clip_model, l, device):
+        texts = [l] if isinstance(l, str) else list(l)
+        first = {}
+        for i, text in enumerate(texts):
+            if (device, text) not in self.texts:
+                first.setdefault(text, i)
+        if first:
+            # Use the tokens of the batch if the dataset attached them.
+            batch_tokens = getattr(l, 'tokens', None)
+            if batch_tokens is not None:
+                tokens = torch.as_tensor(batch_tokens)[list(first.values())].to(device)
+            else:
+                tokens = tokenize(list(first.keys())).to(device)
+            with torch.no_grad():
+                text_feat, text_emb = clip_model.encode_text_with_embeddings(tokens)
+            for i, text in enumerate(first):
+                self.texts[(device, text)] = (text_feat[i], text_emb[i], tokens[i])
+
+        encodings = []
+        for text in texts:
+            self.texts.move_to_end((device, text))
+            encodings.append(self.texts[(device, text)])
+        while len(self.texts) > self.max_size:
+            self.texts.popitem(last=False)
+        return [torch.stack(encoding) for encoding in zip(*encodings)]
+
+
+def set_lang_goal_vocabulary(module, tokens):
+    """Give every CLIP text cache in module the CLIP tokens of a dataset vocabulary."""
+    for submodule in module.modules():
+        if isinstance(getattr(submodule, 'text_cache', None), CLIPTextCache):
+            submodule.text_cache.set_vocabulary(tokens)
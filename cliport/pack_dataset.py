@@ -0,0 +1,106 @@
+"""Dataset packing script.
+
+Converts `{data_dir}/{task}-{mode}` pickle datasets into the faster formats
+(episode index, mmap, compressed images, precomputed heightmaps, shards) and
+writes manifests with episode counts, seeds, step counts, byte sizes and
+checksums, e.g.:
+
+  python cliport/pack_dataset.py task=multi-all out_dir=data_packed dataset.format=mmap
+  python cliport/pack_dataset.py task=[align-rope,rainbow-stack] modes=[train] shards.write=True shards.name=mix
+"""
+
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import hydra
+import numpy as np
+from omegaconf import OmegaConf
+
+from cliport.dataset import RavensDataset, RavensMultiTaskDataset, get_group_tasks, \
+    write_manifest, write_shards, MANIFEST_FNAME
+
+
+def pack(data_dir, out_dir, task, mode, cfg):
+    """Convert a single `{task}-{mode}` dataset and write its manifest."""
+    src_path = os.path.join(data_dir, f'{task}-{mode}')
+    out_path = os.path.join(out_dir, f'{task}-{mode}')
+    src = RavensDataset(src_path, {'dataset': {'images': True, 'cache': False}}, n_demos=0, augment=False)
+    episode_ids = sorted(src._index.episodes.keys())
+    if cfg['n'] > 0:
+        episode_ids = episode_ids[:cfg['n']]
+    if len(episode_ids) == 0:
+        raise ValueError(f"{src_path} has 0 episodes")
+
+    if os.path.abspath(src_path) == os.path.abspath(out_path):
+        # In place: the index was built above, only add heightmaps.
+        if cfg['dataset']['format'] != 'pickle' or set(cfg['dataset']['codecs'].values()) != {'raw'}:
+            raise ValueError("Converting the format or codecs of a dataset requires out_dir != data_dir")
+        if cfg['n'] > 0:
+            raise ValueError(f"Packing the first n={cfg['n']} episodes requires out_dir != data_dir, "
+                             f"datasets are not truncated in place")
+        if cfg['dataset']['heightmaps']:
+            src.precompute_heightmaps(drop_raw_images=not cfg['dataset']['raw_images'])
+    else:
+        # Resumes from the episodes already converted.
+        dst = RavensDataset(out_path, cfg, n_demos=0, augment=False)
+        for episode_id in episode_ids[dst.n_episodes:]:
+            episode, seed = src.load(episode_id, images=True, cache=False)
+            if len(episode) > 0 and 'color' not in episode[0][0]:
+                raise ValueError(f"{src_path} has no raw images to convert")
+            episode = [({'color': np.asarray(obs['color']), 'depth': np.asarray(obs['depth'])}, act, reward, info)
+                       for obs, act, reward, info in episode]
+            dst.add(seed, episode)
+
+    manifest = write_manifest(out_path, checksums=cfg['checksums'])
+    print(f"Packed {out_path}: {manifest['n_episodes']} episodes, {manifest['n_steps']} steps, "
+          f"{manifest['nbytes'] / 1024 ** 3:.2f} GB")
+    return f'{task}-{mode}', {key: manifest[key] for key in ('n_episodes', 'n_steps', 'nbytes', 'max_seed')}
+
+
+@hydra.main(config_path='./cfg', config_name='pack', version_base="1.2")
+def main(cfg):
+    cfg = OmegaConf.to_container(cfg, resolve=True)
+    data_dir, out_dir = cfg['data_dir'], cfg['out_dir']
+    group = cfg['task']
+    if isinstance(group, str) and group not in RavensMultiTaskDataset.MULTI_TASKS:
+        group = [group]
+    tasks = {mode: get_group_tasks(group, mode) for mode in cfg['modes']}
+
+    # Fail early on all missing datasets instead of one at a time.
+    missing = [f'{task}-{mode}' for mode in cfg['modes'] for task in tasks[mode]
+               if not os.path.exists(os.path.join(data_dir, f'{task}-{mode}'))]
+    if missing:
+        raise ValueError(f"{len(missing)} datasets not found in {data_dir}: {', '.join(missing)}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [(task, mode) for mode in cfg['modes'] for task in tasks[mode]]
+    with ProcessPoolExecutor(max_workers=cfg['n_workers']) as executor:
+        futures = [executor.submit(pack, data_dir, out_dir, task, mode, cfg) for task, mode in jobs]
+        results = dict([future.result() for future in futures])
+
+    # Summary of all datasets in out_dir. The datasets read their own index.
+    manifest_path = os.path.join(out_dir, MANIFEST_FNAME)
+    manifest = {'datasets': {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    manifest['datasets'].update(results)
+    manifest['datasets'] = dict(sorted(manifest['datasets'].items()))
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote {manifest_path}")
+
+    if cfg['shards']['write']:
+        name = cfg['shards']['name'] if cfg['shards']['name'] else cfg['task']
+        if not isinstance(name, str):
+            raise ValueError("Set shards.name when packing a list of tasks into shards")
+        for mode in cfg['modes']:
+            shards_path = os.path.join(out_dir, 'shards', f'{name}-{mode}')
+            shards = write_shards(out_dir, tasks[mode], mode, shards_path, cfg,
+                                  n_demos=cfg['n'], shard_size_mb=cfg['shards']['size_mb'])
+            print(f"Wrote {len(shards)} shards to {shards_path}")
+
+
+if __name__ == '__main__':
+    main()
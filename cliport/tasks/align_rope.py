@@ -67,4 +67,4 @@ class AlignRope(Task):
 
         # wait for the scene to settle down
         for i in range(480):
-            p.stepSimulation()
\ No newline at end of file
+            self.p.stepSimulation()
\ No newline at end of file
@@ -43,7 +43,7 @@ class BlockInsertionEasy(BlockInsertionTranslation):
         """Add L-shaped block in fixed position."""
         # size = (0.1, 0.1, 0.04)
         urdf = 'insertion/ell.urdf'
-        pose = ((0.5, 0, 0.02), p.getQuaternionFromEuler((0, 0, np.pi / 2)))
+        pose = ((0.5, 0, 0.02), self.p.getQuaternionFromEuler((0, 0, np.pi / 2)))
         return env.add_object(urdf, pose)
 
 class BlockInsertionSixDof(BlockInsertion):
@@ -15,8 +15,9 @@ SUCTION_HEAD_URDF = 'ur5/suction/suction-head.urdf'
 class Gripper:
     """Base gripper class."""
 
-    def __init__(self, assets_root):
+    def __init__(self, assets_root, pybullet_client=p):
         self.assets_root = assets_root
+        self.p = pybullet_client
         self.activated = False
 
     def step(self):
@@ -34,25 +35,25 @@ class Gripper:
 class Spatula(Gripper):
     """Simulate simple spatula for pushing."""
 
-    def __init__(self, assets_root=None, robot=None, ee=None, obj_ids=None):
+    def __init__(self, assets_root=None, robot=None, ee=None, obj_ids=None, pybullet_client=p):
         """Creates spatula and 'attaches' it to the robot."""
         if assets_root is None:
             return
-        super().__init__(assets_root)
+        super().__init__(assets_root, pybullet_client)
 
         # Load spatula model.
-        pose = ((0.487, 0.109, 0.438), p.getQuaternionFromEuler((np.pi, 0, 0)))
+        pose = ((0.487, 0.109, 0.438), self.p.getQuaternionFromEuler((np.pi, 0, 0)))
         self.base_urdf_path = os.path.join(self.assets_root, SPATULA_BASE_URDF)
 
         base = pybullet_utils.load_urdf(
-            p, self.base_urdf_path, pose[0], pose[1])
+            self.p, self.base_urdf_path, pose[0], pose[1])
         self.base = base
-        p.createConstraint(
+        self.p.createConstraint(
             parentBodyUniqueId=robot,
             parentLinkIndex=ee,
             childBodyUniqueId=base,
             childLinkIndex=-1,
-            jointType=p.JOINT_FIXED,
+            jointType=self.p.JOINT_FIXED,
             jointAxis=(0, 0, 0),
             parentFramePosition=(0, 0, 0),
             childFramePosition=(0, 0, 0.01))
@@ -61,7 +62,7 @@ class Spatula(Gripper):
 class Suction(Gripper):
     """Simulate simple suction dynamics."""
 
-    def __init__(self, assets_root, robot, ee, obj_ids):
+    def __init__(self, assets_root, robot, ee, obj_ids, pybullet_client=p):
         """Creates suction and 'attaches' it to the robot.
     
         Has special cases when dealing with rigid vs deformables. For rigid,
@@ -85,42 +86,44 @@ class Suction(Gripper):
           robot: int representing PyBullet ID of robot.
           ee: int representing PyBullet ID of end effector link.
           obj_ids: list of PyBullet IDs of all suctionable objects in the env.
+          pybullet_client: PyBullet client of the env, defaults to the pybullet
+            module (the first connected client).
         """
-        super().__init__(assets_root)
+        super().__init__(assets_root, pybullet_client)
 
         # Load suction gripper base model (visual only).
-        pose = ((0.487, 0.109, 0.438), p.getQuaternionFromEuler((np.pi, 0, 0)))
+        pose = ((0.487, 0.109, 0.438), self.p.getQuaternionFromEuler((np.pi, 0, 0)))
         self.base_urdf_path = os.path.join(self.assets_root, SUCTION_BASE_URDF)
 
         base = pybullet_utils.load_urdf(
-            p, self.base_urdf_path, pose[0], pose[1])
+            self.p, self.base_urdf_path, pose[0], pose[1])
         self.base = base
-        p.createConstraint(
+        self.p.createConstraint(
             parentBodyUniqueId=robot,
             parentLinkIndex=ee,
             childBodyUniqueId=base,
             childLinkIndex=-1,
-            jointType=p.JOINT_FIXED,
+            jointType=self.p.JOINT_FIXED,
             jointAxis=(0, 0, 0),
             parentFramePosition=(0, 0, 0),
             childFramePosition=(0, 0, 0.01))
 
         # Load suction tip model (visual and collision) with compliance.
         # urdf = 'assets/ur5/suction/suction-head.urdf'
-        pose = ((0.487, 0.109, 0.347), p.getQuaternionFromEuler((np.pi, 0, 0)))
+        pose = ((0.487, 0.109, 0.347), self.p.getQuaternionFromEuler((np.pi, 0, 0)))
         self.urdf_path = os.path.join(self.assets_root, SUCTION_HEAD_URDF)
         self.body = pybullet_utils.load_urdf(
-            p, self.urdf_path, pose[0], pose[1])
-        constraint_id = p.createConstraint(
+            self.p, self.urdf_path, pose[0], pose[1])
+        constraint_id = self.p.createConstraint(
             parentBodyUniqueId=robot,
             parentLinkIndex=ee,
             childBodyUniqueId=self.body,
             childLinkIndex=-1,
-            jointType=p.JOINT_FIXED,
+            jointType=self.p.JOINT_FIXED,
             jointAxis=(0, 0, 0),
             parentFramePosition=(0, 0, 0),
             childFramePosition=(0, 0, -0.08))
-        p.changeConstraint(constraint_id, maxForce=100)
+        self.p.changeConstraint(constraint_id, maxForce=100)
 
         # Reference to object IDs in environment for simulating suction.
         self.obj_ids = obj_ids
@@ -155,7 +158,7 @@ class Suction(Gripper):
         # del def_ids
 
         if not self.activated:
-            points = p.getContactPoints(bodyA=self.body, linkIndexA=0)
+            points = self.p.getContactPoints(bodyA=self.body, linkIndexA=0)
             # print(points)
             if points:
 
@@ -163,18 +166,18 @@ class Suction(Gripper):
                 for point in points:
                     obj_id, contact_link = point[2], point[4]
                 if obj_id in self.obj_ids['rigid']:
-                    body_pose = p.getLinkState(self.body, 0)
-                    obj_pose = p.getBasePositionAndOrientation(obj_id)
-                    world_to_body = p.invertTransform(body_pose[0], body_pose[1])
-                    obj_to_body = p.multiplyTransforms(world_to_body[0],
+                    body_pose = self.p.getLinkState(self.body, 0)
+                    obj_pose = self.p.getBasePositionAndOrientation(obj_id)
+                    world_to_body = self.p.invertTransform(body_pose[0], body_pose[1])
+                    obj_to_body = self.p.multiplyTransforms(world_to_body[0],
                                                        world_to_body[1],
                                                        obj_pose[0], obj_pose[1])
-                    self.contact_constraint = p.createConstraint(
+                    self.contact_constraint = self.p.createConstraint(
                         parentBodyUniqueId=self.body,
                         parentLinkIndex=0,
                         childBodyUniqueId=obj_id,
                         childLinkIndex=contact_link,
-                        jointType=p.JOINT_FIXED,
+                        jointType=self.p.JOINT_FIXED,
                         jointAxis=(0, 0, 0),
                         parentFramePosition=obj_to_body[0],
                         parentFrameOrientation=obj_to_body[1],
@@ -200,7 +203,7 @@ class Suction(Gripper):
             # Release gripped rigid object (if any).
             if self.contact_constraint is not None:
                 try:
-                    p.removeConstraint(self.contact_constraint)
+                    self.p.removeConstraint(self.contact_constraint)
                     self.contact_constraint = None
                 except:  # pylint: disable=bare-except
                     pass
@@ -210,7 +213,7 @@ class Suction(Gripper):
             # Release gripped deformable object (if any).
             if self.def_grip_anchors:
                 for anchor_id in self.def_grip_anchors:
-                    p.removeConstraint(anchor_id)
+                    self.p.removeConstraint(anchor_id)
                 self.def_grip_anchors = []
                 self.def_grip_item = None
                 self.def_min_vetex = None
@@ -221,14 +224,14 @@ class Suction(Gripper):
         body, link = self.body, 0
         if self.activated and self.contact_constraint is not None:
             try:
-                info = p.getConstraintInfo(self.contact_constraint)
+                info = self.p.getConstraintInfo(self.contact_constraint)
                 body, link = info[2], info[3]
             except:  # pylint: disable=bare-except
                 self.contact_constraint = None
                 pass
 
         # Get all contact points between the suction and a rigid body.
-        points = p.getContactPoints(bodyA=body, linkIndexA=link)
+        points = self.p.getContactPoints(bodyA=body, linkIndexA=link)
         # print(points)
         # exit()
         if self.activated:
@@ -245,5 +248,5 @@ class Suction(Gripper):
 
         suctioned_object = None
         if self.contact_constraint is not None:
-            suctioned_object = p.getConstraintInfo(self.contact_constraint)[2]
+            suctioned_object = self.p.getConstraintInfo(self.contact_constraint)[2]
         return suctioned_object is not None
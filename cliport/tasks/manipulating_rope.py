@@ -48,4 +48,4 @@ class ManipulatingRope(Task):
                 rotations=False, metric='pose', params=None, step_max_reward=1., lang_goal=self.lang_template)
 
         for i in range(480):
-            p.stepSimulation()
+            self.p.stepSimulation()
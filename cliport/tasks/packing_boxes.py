@@ -71,11 +71,11 @@ class PackingBoxes(Task):
         true_poses = []
 
         for object_id in object_ids:
-            true_pose = p.getBasePositionAndOrientation(object_id)
-            object_size = p.getVisualShapeData(object_id)[0][3]
+            true_pose = self.p.getBasePositionAndOrientation(object_id)
+            object_size = self.p.getVisualShapeData(object_id)[0][3]
             object_volumes.append(np.prod(np.array(object_size) * 100))
             pose = self.get_random_pose(env, object_size)
-            p.resetBasePositionAndOrientation(object_id, pose[0], pose[1])
+            self.p.resetBasePositionAndOrientation(object_id, pose[0], pose[1])
             true_poses.append(true_pose)
 
         self.add_goal(objs=object_ids, matches=np.eye(len(object_ids)), targ_poses=true_poses, replace=False,
@@ -69,17 +69,17 @@ class PackingBoxesPairs(Task):
 
             object_ids.append(box_id)
             icolor = np.random.choice(range(len(pack_colors)), 1).squeeze()
-            p.changeVisualShape(box_id, -1, rgbaColor=pack_colors[icolor] + [1])
+            self.p.changeVisualShape(box_id, -1, rgbaColor=pack_colors[icolor] + [1])
 
         # Randomly select object in box and save ground truth pose.
         object_volumes = []
         true_poses = []
         for object_id in object_ids:
-            true_pose = p.getBasePositionAndOrientation(object_id)
-            object_size = p.getVisualShapeData(object_id)[0][3]
+            true_pose = self.p.getBasePositionAndOrientation(object_id)
+            object_size = self.p.getVisualShapeData(object_id)[0][3]
             object_volumes.append(np.prod(np.array(object_size) * 100))
             pose = self.get_random_pose(env, object_size)
-            p.resetBasePositionAndOrientation(object_id, pose[0], pose[1])
+            self.p.resetBasePositionAndOrientation(object_id, pose[0], pose[1])
             true_poses.append(true_pose)
 
         # Add distractor objects
@@ -98,7 +98,7 @@ class PackingBoxesPairs(Task):
 
             icolor = np.random.choice(range(len(distractor_colors)), 1).squeeze()
             if box_id:
-                p.changeVisualShape(box_id, -1, rgbaColor=distractor_colors[icolor] + [1])
+                self.p.changeVisualShape(box_id, -1, rgbaColor=distractor_colors[icolor] + [1])
 
         # Some scenes might contain just one relevant block that fits in the box.
         if len(relevant_color_names) > 1:
@@ -89,9 +89,9 @@ instruction at each timestep."""
                     box_id = env.add_object(urdf, ps)
                     object_ids.append((box_id, (0, None)))
 
-                    texture_id = p.loadTexture(texture_file)
-                    p.changeVisualShape(box_id, -1, textureUniqueId=texture_id)
-                    p.changeVisualShape(box_id, -1, rgbaColor=[1, 1, 1, 1])
+                    texture_id = self.p.loadTexture(texture_file)
+                    self.p.changeVisualShape(box_id, -1, textureUniqueId=texture_id)
+                    self.p.changeVisualShape(box_id, -1, rgbaColor=[1, 1, 1, 1])
 
                     object_descs.append(object_name)
 
@@ -103,7 +103,7 @@ instruction at each timestep."""
         self.set_goals(object_descs, object_ids, repeat_category, zone_pose, zone_size)
 
         for i in range(480):
-            p.stepSimulation()
+            self.p.stepSimulation()
 
     def choose_objects(self, object_names, k):
         repeat_category = None
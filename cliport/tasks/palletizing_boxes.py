@@ -67,9 +67,9 @@ class PalletizingBoxes(Task):
             rpixel = top[int(np.floor(np.random.random() * len(top)))]  # y, x
             box_id = int(object_mask[rpixel[0], rpixel[1]])
             if box_id in boxes:
-                position, rotation = p.getBasePositionAndOrientation(box_id)
+                position, rotation = self.p.getBasePositionAndOrientation(box_id)
                 rposition = np.float32(position) + np.float32([0, -10, 0])
-                p.resetBasePositionAndOrientation(box_id, rposition, rotation)
+                self.p.resetBasePositionAndOrientation(box_id, rposition, rotation)
                 self.steps.append(box_id)
                 targets.append((position, rotation))
                 boxes.remove(box_id)
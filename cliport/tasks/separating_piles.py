@@ -35,9 +35,9 @@ relevant to the task, another as a distractor."""
             zone2_pose = self.get_random_pose(env, zone_size)
 
         zone1_obj_id = env.add_object('zone/zone.urdf', zone1_pose, 'fixed')
-        p.changeVisualShape(zone1_obj_id, -1, rgbaColor=zone1_color + [1])
+        self.p.changeVisualShape(zone1_obj_id, -1, rgbaColor=zone1_color + [1])
         zone2_obj_id = env.add_object('zone/zone.urdf', zone2_pose, 'fixed')
-        p.changeVisualShape(zone2_obj_id, -1, rgbaColor=zone2_color + [1])
+        self.p.changeVisualShape(zone2_obj_id, -1, rgbaColor=zone2_color + [1])
 
         # Choose zone
         zone_target_idx = random.randint(0, 1)
@@ -12,12 +12,21 @@ from cliport.tasks import cameras
 from cliport.tasks import primitives
 from cliport.tasks.grippers import Suction
 from cliport.utils import utils
+from cliport.utils import poses
+from cliport.utils import urdf_cache
 from cliport.tasks import primitives
 from cliport.tasks.grippers import Spatula
 import pybullet as p
 from typing import Tuple, List
 import re
 
+# Object points shared across tasks and episodes, keyed by object geometry.
+_OBJECT_POINTS = {}
+
+# Meshes loaded by `get_target_sample_surface_points`, keyed by file path.
+_MESHES = {}
+
+
 class Task():
     """Base Task class."""
 
@@ -44,6 +53,7 @@ class Task():
         self.goals = []
         self.lang_goals = []
         self.obj_points_cache = {}
+        self.zone_points_cache = {}
 
         self.task_completed_desc = "task completed."
         self.progress = 0
@@ -54,6 +64,9 @@ class Task():
         self.assets_root = None
         self.homogeneous = False
 
+        # Physics client of the environment, set by `Environment.set_task`.
+        self.p = p
+
     def reset(self, env):
         if not self.assets_root:
             raise ValueError('assets_root must be set for task, '
@@ -63,6 +76,7 @@ class Task():
         self.progress = 0  # Task progression metric in range [0, 1].
         self._rewards = 0  # Cumulative returned rewards.
         self.obj_points_cache = {}
+        self.zone_points_cache = {}
 
     def additional_reset(self):
         # Additional changes to make the environment adaptable
@@ -101,48 +115,38 @@ class Task():
                 if len(targ) == 3 and (type(targs[j][0]) is float or type(targs[j][0]) is np.float32):
                     targs[j] = (targs[j], (0,0,0,1))
 
+            # Current object poses, used for matching and picking below.
+            for i in range(len(objs)):
+                if type(objs[i]) is int:
+                    objs[i] = (objs[i], (False, None))
+            obj_poses = [self.p.getBasePositionAndOrientation(object_id) for object_id, _ in objs]
+            symmetries = [symmetry for _, (symmetry, _) in objs]
+
             # Match objects to targets without replacement.
             if not replace:
 
                 # Modify a copy of the match matrix.
                 matches = matches.copy()
 
-                # Ignore already matched objects.
-                for i in range(len(objs)):
-                    if type(objs[i]) is int:
-                        objs[i] = (objs[i], (False, None))
-
-                    object_id, (symmetry, _) = objs[i]
-                    pose = p.getBasePositionAndOrientation(object_id)
-                    targets_i = np.argwhere(matches[i, :]).reshape(-1)
-                    for j in targets_i:
-                        if self.is_match(pose, targs[j], symmetry):
-                            matches[i, :] = 0
-                            matches[:, j] = 0
+                # Ignore already matched objects. Only objects matching one of
+                # their targets can clear matches, in order.
+                is_match = self.is_match_batch(obj_poses, targs, symmetries) & (matches != 0)
+                for i in np.flatnonzero(np.any(is_match, axis=1)):
+                    matched = np.flatnonzero(is_match[i] & (matches[i, :] != 0))
+                    if len(matched) > 0:
+                        matches[i, :] = 0
+                        matches[:, matched] = 0
 
             # Get objects to be picked (prioritize farthest from nearest neighbor).
-            nn_dists = []
-            nn_targets = []
-            for i in range(len(objs)):
-                if type(objs[i]) is int:
-                    objs[i] = (objs[i], (False, None))
-
-                object_id, (symmetry, _) = objs[i]
-                xyz, _ = p.getBasePositionAndOrientation(object_id)
-                targets_i = np.argwhere(matches[i, :]).reshape(-1)
-                if len(targets_i) > 0:
-
-                    targets_xyz = np.float32([targs[j][0] for j in targets_i])
-                    dists = np.linalg.norm(
-                        targets_xyz - np.float32(xyz).reshape(1, 3), axis=1)
-                    nn = np.argmin(dists)
-                    nn_dists.append(dists[nn])
-                    nn_targets.append(targets_i[nn])
-
-                # Handle ignored objects.
-                else:
-                    nn_dists.append(0)
-                    nn_targets.append(-1)
+            # Objects without targets left are ignored.
+            objs_xyz = np.float32([xyz for xyz, _ in obj_poses])
+            targets_xyz = np.float32(poses.as_poses(targs)[0])
+            dists = np.linalg.norm(targets_xyz[None, :, :] - objs_xyz[:, None, :], axis=2)
+            dists[np.asarray(matches) == 0] = np.inf
+            nn_targets = np.argmin(dists, axis=1)
+            nn_dists = dists[np.arange(len(objs)), nn_targets]
+            ignored = np.isinf(nn_dists)
+            nn_dists[ignored], nn_targets[ignored] = 0, -1
             order = np.argsort(nn_dists)[::-1]
 
             # Filter out matched objects.
@@ -151,11 +155,13 @@ class Task():
             pick_mask = None
             for pick_i in order:
                 pick_mask = np.uint8(obj_mask == objs[pick_i][0])
+                if not pick_mask.any():
+                    continue
 
                 # Erode to avoid picking on edges.
                 pick_mask = cv2.erode(pick_mask, np.ones((3, 3), np.uint8))
 
-                if np.sum(pick_mask) > 0:
+                if pick_mask.any():
                     break
 
             # Trigger task reset if no object is visible.
@@ -175,7 +181,7 @@ class Task():
 
             # Get placing pose.
             targ_pose = targs[nn_targets[pick_i]]
-            obj_pose = p.getBasePositionAndOrientation(objs[pick_i][0])
+            obj_pose = obj_poses[pick_i]
             if not self.sixdof:
                 obj_euler = utils.quatXYZW_to_eulerXYZ(obj_pose[1])
                 obj_quat = utils.eulerXYZ_to_quatXYZW((0, 0, obj_euler[2]))
@@ -219,46 +225,18 @@ class Task():
         step_reward = 0
 
         if metric == 'pose':
+            obj_poses = [self.p.getBasePositionAndOrientation(object_id) for object_id, _ in objs]
+            symmetries = [symmetry for _, (symmetry, _) in objs]
+            is_match = self.is_match_batch(obj_poses, targs, symmetries) & (np.asarray(matches) != 0)
             for i in range(len(objs)):
-                object_id, (symmetry, _) = objs[i]
-                pose = p.getBasePositionAndOrientation(object_id)
-                targets_i = np.argwhere(matches[i, :])
-                if len(targets_i) > 0:
-                    targets_i = targets_i.reshape(-1)
-                    for j in targets_i:
-                        target_pose = targs[j]
-                        if self.is_match(pose, target_pose, symmetry):
-                            step_reward += max_reward / len(objs)
-                            print(f"object {i} match with target {j} rew: {step_reward:.3f}")
-                            break
+                if np.any(is_match[i]):
+                    j = np.argmax(is_match[i])
+                    step_reward += max_reward / len(objs)
+                    print(f"object {i} match with target {j} rew: {step_reward:.3f}")
 
         # Evaluate by measuring object intersection with zone.
         elif metric == 'zone':
-            zone_pts, total_pts = 0, 0
-            zones = params
-
-            if len(self.obj_points_cache) == 0 or objs[0][0] not in self.obj_points_cache:
-                for obj_id, _ in objs:
-                    self.obj_points_cache[obj_id] = self.get_box_object_points(obj_id)
-
-            for zone_idx, (zone_pose, zone_size) in enumerate(zones):
-                # Count valid points in zone.
-                for (obj_id, _) in objs:
-                    pts = self.obj_points_cache[obj_id]
-                    obj_pose = p.getBasePositionAndOrientation(obj_id)
-                    world_to_zone = utils.invert(zone_pose)
-                    obj_to_zone = utils.multiply(world_to_zone, obj_pose)
-                    pts = np.float32(utils.apply(obj_to_zone, pts))
-
-                    if len(zone_size) > 1:
-                        valid_pts = np.logical_and.reduce([
-                            pts[0, :] > -zone_size[0] / 2, pts[0, :] < zone_size[0] / 2,
-                            pts[1, :] > -zone_size[1] / 2, pts[1, :] < zone_size[1] / 2,
-                            pts[2, :] < self.zone_bounds[2, 1]])
-
-                    zone_pts += np.sum(np.float32(valid_pts))
-                    total_pts += pts.shape[1]
-
+            zone_pts, total_pts = self.count_zone_points(objs, params)
             if total_pts > 0:
                 step_reward = max_reward * (zone_pts / total_pts)
 
@@ -292,28 +270,94 @@ class Task():
         """Check if pose0 and pose1 match within a threshold.
         pose0 and pose1 should both be tuples of (translation, rotation).
         Return true if the pose translation and orientation errors are below certain thresholds"""
-        if len(pose1) == 3 and (not hasattr(pose1[0], '__len__')):
-            # add default orientation if missing
-            pose1 = (pose1, (0,0,0,1))
-        # print(len(pose1) == 3, not hasattr(pose1[0], '__len__'))
-        # print(pose1, pose0)
+        return bool(self.is_match_batch([pose0], [pose1], [symmetry])[0, 0])
+
+    def is_match_batch(self, poses0, poses1, symmetries):
+        """Batched `is_match` of every pose in poses0 with every pose in poses1.
+        poses1 may hold translations only, which get the default orientation.
+        symmetries are those of the objects at poses0.
+        Return an (N0, N1) boolean matrix."""
+        pos0, quat0 = poses.as_poses(poses0)
+        pos1, quat1 = poses.as_poses(poses1)
+
         # Get translational error.
-        diff_pos = np.float32(pose0[0][:2]) - np.float32(pose1[0][:2])
-        dist_pos = np.linalg.norm(diff_pos)
+        diff_pos = np.float32(pos0[:, None, :2]) - np.float32(pos1[None, :, :2])
+        dist_pos = np.linalg.norm(diff_pos, axis=2)
 
         # Get rotational error around z-axis (account for symmetries).
-        diff_rot = 0
-        if symmetry > 0:
-            rot0 = np.array(utils.quatXYZW_to_eulerXYZ(pose0[1]))[2]
-            rot1 = np.array(utils.quatXYZW_to_eulerXYZ(pose1[1]))[2]
-            diff_rot = np.abs(rot0 - rot1) % symmetry
-            if diff_rot > (symmetry / 2):
-                diff_rot = symmetry - diff_rot
-
-        return (dist_pos < self.pos_eps) and (diff_rot < self.rot_eps)
+        rot0 = poses.quat_to_yaw(quat0)[:, None]
+        rot1 = poses.quat_to_yaw(quat1)[None, :]
+        symmetries = np.array(symmetries, dtype=np.float64).reshape(-1, 1)
+        diff_rot = poses.yaw_distance(rot0, rot1, symmetries)
+
+        return (dist_pos < self.pos_eps) & (diff_rot < self.rot_eps)
+
+    def get_zone_points(self, objs):
+        """Cached points of all objects of a zone goal, stacked into one array.
+        Return 3xP float32 points in the object frames, and the (P,) index in
+        objs of the object of every point."""
+        obj_ids = tuple(obj_id for obj_id, _ in objs)
+        if obj_ids not in self.zone_points_cache:
+            if len(self.obj_points_cache) == 0 or obj_ids[0] not in self.obj_points_cache:
+                for obj_id in obj_ids:
+                    self.obj_points_cache[obj_id] = self.get_box_object_points(obj_id)
+            obj_pts = [np.float32(self.obj_points_cache[obj_id]).reshape(3, -1) for obj_id in obj_ids]
+            index = np.repeat(np.arange(len(obj_pts)), [pts.shape[1] for pts in obj_pts])
+            self.zone_points_cache[obj_ids] = (np.concatenate(obj_pts, axis=1), index)
+        return self.zone_points_cache[obj_ids]
+
+    def count_zone_points(self, objs, zones):
+        """Count the object points inside each of the zones [(zone_pose, zone_size)].
+        Return the points in zones summed over zones, and the number of points
+        times the number of zones."""
+        pts, index = self.get_zone_points(objs)
+        obj_pos, obj_rot = poses.as_poses([self.p.getBasePositionAndOrientation(obj_id) for obj_id, _ in objs])
+        zone_pos, zone_rot = poses.invert(*poses.as_poses([zone_pose for zone_pose, _ in zones]))
+
+        # Transform the points of every object into every zone frame (Z x P).
+        pos, rot = poses.multiply(zone_pos[:, None], zone_rot[:, None], obj_pos[None], obj_rot[None])
+        rotation = np.float32(poses.quat_to_matrix(rot))[:, index]
+        translation = np.float32(pos)[:, index]
+        x, y, z = [rotation[Ellipsis, i, 0] * pts[0] + rotation[Ellipsis, i, 1] * pts[1] +
+                   rotation[Ellipsis, i, 2] * pts[2] + translation[Ellipsis, i] for i in range(3)]
+
+        half_size = np.float32([(zone_size[0] / 2, zone_size[1] / 2) for _, zone_size in zones])
+        valid_pts = np.logical_and.reduce([
+            x > -half_size[:, :1], x < half_size[:, :1],
+            y > -half_size[:, 1:], y < half_size[:, 1:],
+            z < np.float32(self.zone_bounds[2, 1])])
+        return np.sum(np.float32(valid_pts)), valid_pts.size
+
+    def count_zone_points_reference(self, objs, zones):
+        """Loop implementation of `count_zone_points`, kept for tests."""
+        zone_pts, total_pts = 0, 0
+        if len(self.obj_points_cache) == 0 or objs[0][0] not in self.obj_points_cache:
+            for obj_id, _ in objs:
+                self.obj_points_cache[obj_id] = self.get_box_object_points(obj_id)
+
+        for zone_idx, (zone_pose, zone_size) in enumerate(zones):
+            # Count valid points in zone.
+            for (obj_id, _) in objs:
+                pts = self.obj_points_cache[obj_id]
+                obj_pose = self.p.getBasePositionAndOrientation(obj_id)
+                world_to_zone = utils.invert(zone_pose)
+                obj_to_zone = utils.multiply(world_to_zone, obj_pose)
+                pts = np.float32(utils.apply(obj_to_zone, pts))
+
+                if len(zone_size) > 1:
+                    valid_pts = np.logical_and.reduce([
+                        pts[0, :] > -zone_size[0] / 2, pts[0, :] < zone_size[0] / 2,
+                        pts[1, :] > -zone_size[1] / 2, pts[1, :] < zone_size[1] / 2,
+                        pts[2, :] < self.zone_bounds[2, 1]])
+
+                zone_pts += np.sum(np.float32(valid_pts))
+                total_pts += pts.shape[1]
+        return zone_pts, total_pts
 
     def get_true_image(self, env):
         """Get RGB-D orthographic heightmaps and segmentation masks."""
+        if getattr(env, 'orthographic_oracle', False):
+            return self.get_true_image_orthographic(env)
 
         # Capture near-orthographic RGB-D images and segmentation masks.
         color, depth, segm = env.render_camera(self.oracle_cams[0])
@@ -331,6 +375,20 @@ class Task():
         mask = np.int32(cmaps)[0, Ellipsis, 3:].squeeze()
         return cmap, hmap, mask
 
+    def get_true_image_orthographic(self, env):
+        """`get_true_image` from a single orthographic render at heightmap resolution."""
+
+        # Render orthographic RGB-D images and segmentation masks at heightmap resolution.
+        color, height, segm = env.render_orthographic(self.bounds, self.pix_size)
+
+        # Keep the top surfaces within bounds, like the heightmap reconstruction.
+        # The workspace surface lies at the lower bound and counts as empty.
+        valid = (height > self.bounds[2, 0] + 1e-5) & (height < self.bounds[2, 1])
+        cmap = np.uint8(color * valid[Ellipsis, None])
+        hmap = np.float32((height - self.bounds[2, 0]) * valid)
+        mask = np.int32(segm) * valid
+        return cmap, hmap, mask
+
     def get_random_pose(self, env, obj_size=0.1, **kwargs) -> (List, List):
         """
         Get random collision-free object pose within workspace bounds.
@@ -341,25 +399,30 @@ class Task():
         max_size = np.sqrt(obj_size[0] ** 2 + obj_size[1] ** 2)
         erode_size = int(np.round(max_size / self.pix_size))
 
-        _, hmap, obj_mask = self.get_true_image(env)
+        if getattr(env, 'occupancy', None) is not None:
+            free = self.get_free_space(env, erode_size)
+            hmap = None
+        else:
+            _, hmap, obj_mask = self.get_true_image(env)
 
-        # Randomly sample an object pose within free-space pixels.
-        free = np.ones(obj_mask.shape, dtype=np.uint8)
-        for obj_ids in env.obj_ids.values():
-            for obj_id in obj_ids:
-                free[obj_mask == obj_id] = 0
-        free[0, :], free[:, 0], free[-1, :], free[:, -1] = 0, 0, 0, 0
-        free = cv2.erode(free, np.ones((erode_size, erode_size), np.uint8))
+            # Randomly sample an object pose within free-space pixels.
+            free = np.ones(obj_mask.shape, dtype=np.uint8)
+            for obj_ids in env.obj_ids.values():
+                for obj_id in obj_ids:
+                    free[obj_mask == obj_id] = 0
+            free[0, :], free[:, 0], free[-1, :], free[:, -1] = 0, 0, 0, 0
+            free = cv2.erode(free, np.ones((erode_size, erode_size), np.uint8))
 
         # if np.sum(free) == 0:
         #     return None, None
 
         if np.sum(free) == 0:
             # avoid returning None
-            pix = (obj_mask.shape[0] // 2, obj_mask.shape[1] // 2)
+            pix = (free.shape[0] // 2, free.shape[1] // 2)
         else:
             pix = utils.sample_distribution(np.float32(free))
-        pos = utils.pix_to_xyz(pix, hmap, self.bounds, self.pix_size)
+        # Only x and y are used below.
+        pos = utils.pix_to_xyz(pix, hmap, self.bounds, self.pix_size, skip_height=hmap is None)
 
         if len(obj_size) == 2:
             print("Should have z dimension in obj_size as well.")
@@ -370,6 +433,21 @@ class Task():
         rot = utils.eulerXYZ_to_quatXYZW((0, 0, theta))
         return pos, rot
 
+    def get_free_space(self, env, erode_size):
+        """Eroded free-space mask from the occupancy map of env.
+
+        The map is seeded with the oracle render the first time it is used
+        after a reset, then kept in sync with the objects of env.
+        """
+        object_poses = {obj_id: self.p.getBasePositionAndOrientation(obj_id)
+                        for obj_ids in env.obj_ids.values() for obj_id in obj_ids}
+        if not env.occupancy.seeded:
+            _, _, obj_mask = self.get_true_image(env)
+            env.occupancy.seed(obj_mask, object_poses)
+        else:
+            env.occupancy.sync(object_poses, self.p.getAABB)
+        return env.occupancy.get_free(erode_size)
+
     def get_lang_goal(self):
         if len(self.lang_goals) == 0:
             return self.task_completed_desc
@@ -392,8 +470,9 @@ class Task():
 
     def get_target_sample_surface_points(self, model, scale, pose, num_points=50):
         import trimesh
-        mesh = trimesh.load_mesh(model)
-        points = trimesh.sample.volume_mesh(mesh, num_points * 3)
+        if model not in _MESHES:
+            _MESHES[model] = trimesh.load_mesh(model)
+        points = trimesh.sample.volume_mesh(_MESHES[model], num_points * 3)
         points = points[:num_points]
         points = points * np.array(scale)
         points = utils.apply(pose, points.T)
@@ -413,8 +492,8 @@ class Task():
         if not os.path.exists(full_template_path) or (self.check_require_obj(full_template_path) and 'template' not in full_template_path):
             return template
 
-        with open(full_template_path, 'r') as file:
-            fdata = file.read()
+        template_cache = urdf_cache.get_template_cache()
+        fdata = template_cache.read(full_template_path)
 
         for field in replace:
             # if  not hasattr(replace[field], '__len__'):
@@ -431,15 +510,9 @@ class Task():
                     replace[field] = utils.COLORS[replace[field]]
                 for to_replace_color in  code_string:
                     fdata = fdata.replace(f'{to_replace_color}', " ".join([str(x) for x in list(replace[field]) + [1]]))
-            
-        alphabet = string.ascii_lowercase + string.digits
-        rname = ''.join(random.choices(alphabet, k=16))
-        tmpdir = tempfile.gettempdir()
-        template_filename = os.path.split(template)[-1]
-        fname = os.path.join(tmpdir, f'{template_filename}.{rname}')
-        with open(fname, 'w') as file:
-            file.write(fdata)
-        return fname
+
+        # Identical fills share one file, so PyBullet sees the same URDF.
+        return template_cache.write(full_template_path, fdata)
 
     def get_random_size(self, min_x, max_x, min_y, max_y, min_z, max_z) -> Tuple:
         """Get random box size."""
@@ -450,38 +523,61 @@ class Task():
         return tuple(size)
 
     def get_box_object_points(self, obj):
-        obj_shape = p.getVisualShapeData(obj)
+        """Points on a 2cm grid inside the box spanned by the visual dimensions.
+        The 3xN array is shared between objects of the same dimensions and
+        must not be modified."""
+        obj_shape = self.p.getVisualShapeData(obj)
         obj_dim = obj_shape[0][3]
         obj_dim = tuple(d for d in obj_dim)
-        xv, yv, zv = np.meshgrid(
-            np.arange(-obj_dim[0] / 2, obj_dim[0] / 2, 0.02),
-            np.arange(-obj_dim[1] / 2, obj_dim[1] / 2, 0.02),
-            np.arange(-obj_dim[2] / 2, obj_dim[2] / 2, 0.02),
-            sparse=False, indexing='xy')
-        return np.vstack((xv.reshape(1, -1), yv.reshape(1, -1), zv.reshape(1, -1)))
+        key = ('box', obj_dim)
+        if key not in _OBJECT_POINTS:
+            xv, yv, zv = np.meshgrid(
+                np.arange(-obj_dim[0] / 2, obj_dim[0] / 2, 0.02),
+                np.arange(-obj_dim[1] / 2, obj_dim[1] / 2, 0.02),
+                np.arange(-obj_dim[2] / 2, obj_dim[2] / 2, 0.02),
+                sparse=False, indexing='xy')
+            points = np.vstack((xv.reshape(1, -1), yv.reshape(1, -1), zv.reshape(1, -1)))
+            points.setflags(write=False)
+            _OBJECT_POINTS[key] = points
+        return _OBJECT_POINTS[key]
 
     def get_sphere_object_points(self, obj):
         return self.get_box_object_points(obj)
 
     def get_mesh_object_points(self, obj):
-        mesh = p.getMeshData(obj)
-        mesh_points = np.array(mesh[1])
-        mesh_dim = np.vstack((mesh_points.min(axis=0), mesh_points.max(axis=0)))
-        xv, yv, zv = np.meshgrid(
-            np.arange(mesh_dim[0][0], mesh_dim[1][0], 0.02),
-            np.arange(mesh_dim[0][1], mesh_dim[1][1], 0.02),
-            np.arange(mesh_dim[0][2], mesh_dim[1][2], 0.02),
-            sparse=False, indexing='xy')
-        return np.vstack((xv.reshape(1, -1), yv.reshape(1, -1), zv.reshape(1, -1)))
+        """Points on a 2cm grid inside the bounding box of the object mesh.
+        The 3xN array is shared between objects with the same visual mesh file
+        and scale, and must not be modified."""
+        obj_shape = self.p.getVisualShapeData(obj)
+        _, _, geometry_type, obj_scale, mesh_file = obj_shape[0][:5]
+        key = ('mesh', geometry_type, mesh_file, tuple(obj_scale))
+        if not mesh_file or key not in _OBJECT_POINTS:
+            mesh = self.p.getMeshData(obj)
+            mesh_points = np.array(mesh[1])
+            mesh_dim = np.vstack((mesh_points.min(axis=0), mesh_points.max(axis=0)))
+            xv, yv, zv = np.meshgrid(
+                np.arange(mesh_dim[0][0], mesh_dim[1][0], 0.02),
+                np.arange(mesh_dim[0][1], mesh_dim[1][1], 0.02),
+                np.arange(mesh_dim[0][2], mesh_dim[1][2], 0.02),
+                sparse=False, indexing='xy')
+            points = np.vstack((xv.reshape(1, -1), yv.reshape(1, -1), zv.reshape(1, -1)))
+            points.setflags(write=False)
+            if not mesh_file:
+                return points
+            _OBJECT_POINTS[key] = points
+        return _OBJECT_POINTS[key]
 
     def color_random_brown(self, obj):
         shade = np.random.rand() + 0.5
         color = np.float32([shade * 156, shade * 117, shade * 95, 255]) / 255
-        p.changeVisualShape(obj, -1, rgbaColor=color)
+        self.p.changeVisualShape(obj, -1, rgbaColor=color)
 
     def set_assets_root(self, assets_root):
         self.assets_root = assets_root
 
+    def set_pybullet_client(self, pybullet_client):
+        self.p = pybullet_client
+
     def zip_obj_ids(self, obj_ids, symmetries):
         if type(obj_ids[0]) is tuple:
             return obj_ids
@@ -530,7 +626,7 @@ class Task():
             if block_color is not None:
                 if type(block_color) is str:
                     block_color = utils.COLORS[block_color]
-                p.changeVisualShape(obj_id, -1, rgbaColor=block_color + [1])
+                self.p.changeVisualShape(obj_id, -1, rgbaColor=block_color + [1])
 
             obj_ids.append(obj_id)
         return obj_ids
@@ -549,31 +645,31 @@ class Task():
         increment = (np.float32(corner1) - np.float32(corner0)) / n_parts
         position, _ = self.get_random_pose(env, (0.1, 0.1, 0.1))
         position = np.float32(position)
-        part_shape = p.createCollisionShape(p.GEOM_BOX, halfExtents=[radius] * 3)
-        part_visual = p.createVisualShape(p.GEOM_SPHERE, radius=radius * 1.5)
+        part_shape = self.p.createCollisionShape(self.p.GEOM_BOX, halfExtents=[radius] * 3)
+        part_visual = self.p.createVisualShape(self.p.GEOM_SPHERE, radius=radius * 1.5)
         parent_id = -1
         targets = []
         objects = []
 
         for i in range(n_parts):
             position[2] += np.linalg.norm(increment)
-            part_id = p.createMultiBody(0.1, part_shape, part_visual,
+            part_id = self.p.createMultiBody(0.1, part_shape, part_visual,
                                         basePosition=position)
             if parent_id > -1:
-                constraint_id = p.createConstraint(
+                constraint_id = self.p.createConstraint(
                     parentBodyUniqueId=parent_id,
                     parentLinkIndex=-1,
                     childBodyUniqueId=part_id,
                     childLinkIndex=-1,
-                    jointType=p.JOINT_POINT2POINT,
+                    jointType=self.p.JOINT_POINT2POINT,
                     jointAxis=(0, 0, 0),
                     parentFramePosition=(0, 0, np.linalg.norm(increment)),
                     childFramePosition=(0, 0, 0))
-                p.changeConstraint(constraint_id, maxForce=100)
+                self.p.changeConstraint(constraint_id, maxForce=100)
 
             if (i > 0) and (i < n_parts - 1):
                 color = utils.COLORS[color_name] + [1]
-                p.changeVisualShape(part_id, -1, rgbaColor=color)
+                self.p.changeVisualShape(part_id, -1, rgbaColor=color)
 
             env.obj_ids['rigid'].append(part_id)
             parent_id = part_id
@@ -635,7 +731,7 @@ class Task():
         workspace_empty = True
         if self.goals:
             for obj in self.goals[0][0]:
-                obj_pose = p.getBasePositionAndOrientation(obj[0])
+                obj_pose = self.p.getBasePositionAndOrientation(obj[0])
                 workspace_empty = workspace_empty and ((obj_pose[0][1] < -0.5) or
                                                        (obj_pose[0][1] > 0))
             if not self.steps:
@@ -647,12 +743,12 @@ class Task():
                 obj = self.steps[0]
                 theta = np.random.random() * 2 * np.pi
                 rotation = utils.eulerXYZ_to_quatXYZW((0, 0, theta))
-                p.resetBasePositionAndOrientation(obj, [0.5, -0.25, 0.1], rotation)
+                self.p.resetBasePositionAndOrientation(obj, [0.5, -0.25, 0.1], rotation)
                 self.steps.pop(0)
 
         # Wait until spawned box settles.
         for _ in range(480):
-            p.stepSimulation()
+            self.p.stepSimulation()
 
     def get_asset_full_path(self, path):
         return path
\ No newline at end of file
@@ -0,0 +1,205 @@
+"""Tests for the storage formats, sampling and streaming of cliport.dataset."""
+
+import os
+import tempfile
+import types
+from unittest import mock
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+from cliport import dataset
+from cliport.utils import image_codecs
+
+N_EPISODES = 2
+N_STEPS = 3
+
+
+def make_episode(rng, n_steps=N_STEPS, lang_goal='put the red block in the green bowl'):
+    """Episode of random RGB-D images of the three RealSense cameras."""
+    episode = []
+    for i in range(n_steps):
+        obs = {'color': rng.integers(0, 256, (3, 480, 640, 3), dtype=np.uint8),
+               'depth': np.float32(rng.uniform(0.5, 1.5, (3, 480, 640)))}
+        act = {'pose0': ((0.5, 0., 0.05), (0., 0., 0., 1.)),
+               'pose1': ((0.5, 0.1, 0.05), (0., 0., 0., 1.))}
+        info = {'lang_goal': lang_goal, 'step': i}
+        episode.append((obs, act if i < n_steps - 1 else None, float(i), info))
+    return episode
+
+
+def make_cfg(**kwargs):
+    return {'dataset': {'images': True, 'cache': False, **kwargs}}
+
+
+def write_dataset(path, cfg, seed=0, n_episodes=N_EPISODES, **kwargs):
+    rng = np.random.default_rng(seed)
+    ds = dataset.RavensDataset(path, cfg)
+    episodes = [make_episode(rng, **kwargs) for _ in range(n_episodes)]
+    for i, episode in enumerate(episodes):
+        ds.add(seed * 100 + i, episode)
+    return episodes
+
+
+class StorageTest(parameterized.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(tempfile.mkdtemp(), 'place-red-in-green-train')
+
+    @parameterized.named_parameters(
+        ('Pickle', {}, 0),
+        ('Mmap', {'format': 'mmap'}, 0),
+        ('Png', {'codecs': {'color': 'png', 'depth': 'zstd'}}, 0),
+        ('ZstdMm', {'codecs': {'color': 'zstd', 'depth': 'zstd-mm'}}, 0.5 / image_codecs.DEPTH_SCALE + 1e-6),
+    )
+    def test_round_trip(self, options, depth_atol):
+        episodes = write_dataset(self.path, make_cfg(**options))
+
+        ds = dataset.RavensDataset(self.path, make_cfg(**options))
+        self.assertLen(ds._index, N_EPISODES)
+        self.assertTrue(os.path.exists(os.path.join(self.path, dataset.INDEX_FNAME)))
+        for episode_id, expected in enumerate(episodes):
+            episode, seed = ds.load(episode_id)
+            self.assertEqual(seed, episode_id)
+            self.assertLen(episode, N_STEPS)
+            for (obs, act, reward, info), (exp_obs, exp_act, exp_reward, exp_info) in zip(episode, expected):
+                np.testing.assert_array_equal(np.asarray(obs['color']), exp_obs['color'])
+                np.testing.assert_allclose(np.asarray(obs['depth']), exp_obs['depth'], rtol=0, atol=depth_atol)
+                self.assertEqual(reward, exp_reward)
+                self.assertEqual(info, exp_info)
+                if exp_act is None:
+                    self.assertIsNone(act)
+                else:
+                    np.testing.assert_array_equal(act['pose0'][0], exp_act['pose0'][0])
+                    np.testing.assert_array_equal(act['pose1'][1], exp_act['pose1'][1])
+
+    def test_index_survives_reload(self):
+        write_dataset(self.path, make_cfg())
+        index = dataset.EpisodeIndex(self.path)
+        self.assertEqual(index.max_seed, N_EPISODES - 1)
+        self.assertEqual(index.get(1)['n_steps'], N_STEPS)
+
+        # Legacy datasets without index.json are scanned once.
+        os.remove(os.path.join(self.path, dataset.INDEX_FNAME))
+        rebuilt = dataset.EpisodeIndex(self.path)
+        self.assertEqual(rebuilt.episodes.keys(), index.episodes.keys())
+        self.assertEqual(rebuilt.get(1)['fname'], index.get(1)['fname'])
+
+    def test_heightmaps_match_raw_images(self):
+        cfg = make_cfg(heightmaps=True, raw_images=False)
+        episodes = write_dataset(self.path, cfg, n_episodes=1)
+
+        ds = dataset.RavensDataset(self.path, cfg)
+        (obs, _, _, _), = ds.load(0)[0][:1]
+        self.assertNotIn('color', obs)
+        expected = ds.get_image(episodes[0][0][0])
+        np.testing.assert_allclose(ds.get_image(obs), expected, atol=1e-4)
+
+
+class SamplingTest(absltest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        # Task a has twice as many samples as task b.
+        write_dataset(os.path.join(self.root, 'a-train'), make_cfg(), seed=0, n_episodes=2, n_steps=3)
+        write_dataset(os.path.join(self.root, 'b-train'), make_cfg(), seed=1, n_episodes=2, n_steps=2)
+
+    def test_len_per_sampling_mode(self):
+        path = os.path.join(self.root, 'a-train')
+        self.assertLen(dataset.RavensDataset(path, make_cfg(), n_demos=2), 2)
+        steps = dataset.RavensDataset(path, make_cfg(sampling='step'), n_demos=2)
+        self.assertLen(steps, 2 * (N_STEPS - 1))
+        self.assertEqual(sorted(steps.sample_steps), [(0, 0), (0, 1), (1, 0), (1, 1)])
+
+    def test_permutation_per_epoch(self):
+        ds = dataset.RavensMultiTaskDataset(self.root, make_cfg(sampling='step'), group=('a', 'b'),
+                                            mode='train', n_demos=2)
+        self.assertLen(ds, 6)
+        sampler = dataset.EpochPermutationSampler(ds, seed=0)
+        epoch0 = list(sampler)
+        self.assertEqual(sorted(epoch0), list(range(len(ds))))
+        self.assertEqual(list(sampler), epoch0)
+        sampler.set_epoch(1)
+        self.assertEqual(sorted(sampler), list(range(len(ds))))
+
+    def test_permutation_split_across_ranks(self):
+        ds = dataset.RavensMultiTaskDataset(self.root, make_cfg(sampling='step'), group=('a', 'b'),
+                                            mode='train', n_demos=2)
+        full = list(dataset.EpochPermutationSampler(ds, seed=0))
+        samplers = [dataset.EpochPermutationSampler(ds, seed=0, num_replicas=4, rank=rank) for rank in range(4)]
+        for sampler in samplers:
+            sampler.set_epoch(0)
+            self.assertLen(sampler, 2)
+        # 6 samples padded to 8 with the first 2 of the permutation.
+        shards = [list(sampler) for sampler in samplers]
+        self.assertEqual([index for step in zip(*shards) for index in step], full + full[:2])
+
+    def test_task_weights(self):
+        cfg = make_cfg(sampling='step', task_weights={'a': 1., 'b': 2.})
+        ds = dataset.RavensMultiTaskDataset(self.root, cfg, group=('a', 'b'), mode='train', n_demos=2)
+        b_indices = [i for i, (task, _, _) in enumerate(ds.sample_steps) if task == 'b']
+        sampler = dataset.EpochPermutationSampler(ds, seed=0)
+        for epoch in range(3):
+            sampler.set_epoch(epoch)
+            indices = list(sampler)
+            self.assertLen(indices, len(ds))
+            # Task b gets 2/3 of every epoch, split evenly over its 2 samples.
+            self.assertEqual([indices.count(i) for i in b_indices], [2, 2])
+
+    def test_lang_goal_ids(self):
+        ds = dataset.RavensDataset(os.path.join(self.root, 'a-train'), make_cfg(), n_demos=2)
+        self.assertIn('put the red block in the green bowl', ds.lang_goals)
+        sample, goal = ds[0]
+        self.assertEqual(ds.lang_goals[sample['lang_goal_id']], sample['lang_goal'])
+        np.testing.assert_array_equal(sample['lang_goal_tokens'], ds.get_lang_goal_tokens()[sample['lang_goal_id']])
+
+
+class StreamTest(absltest.TestCase):
+
+    def test_items_per_worker(self):
+        root = tempfile.mkdtemp()
+        write_dataset(os.path.join(root, 'a-train'), make_cfg(heightmaps=True, raw_images=False), seed=0,
+                      n_episodes=2, n_steps=3)
+        write_dataset(os.path.join(root, 'b-train'), make_cfg(heightmaps=True, raw_images=False), seed=1,
+                      n_episodes=1, n_steps=2)
+        out_path = os.path.join(root, 'shards', 'ab-train')
+        # One episode per shard.
+        shards = dataset.write_shards(root, ['a', 'b'], 'train', out_path, make_cfg(), shard_size_mb=0)
+        self.assertLen(shards, 3)
+
+        ds = dataset.RavensStreamDataset(out_path, make_cfg(), num_workers=2)
+        n_samples = 2 * (3 - 1) + 1 * (2 - 1)
+        self.assertEqual(len(dataset.RavensStreamDataset(out_path, make_cfg())), n_samples)
+        n_items = []
+        for worker_id in range(2):
+            worker_info = types.SimpleNamespace(id=worker_id, num_workers=2, seed=worker_id)
+            with mock.patch.object(dataset, 'get_worker_info', return_value=worker_info):
+                n_items.append(len(list(ds)))
+        self.assertEqual(n_items, [shards[0]['n_samples'] + shards[2]['n_samples'], shards[1]['n_samples']])
+        self.assertEqual(len(ds), sum(n_items))
+
+
+class ManifestTest(absltest.TestCase):
+
+    def test_detects_corrupted_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'place-red-in-green-train')
+        write_dataset(path, make_cfg())
+        manifest = dataset.write_manifest(path)
+        self.assertEqual(manifest['n_episodes'], N_EPISODES)
+        self.assertEqual(dataset.verify_manifest(path), [])
+        dataset.check_manifest(path, N_EPISODES, verify=True)
+
+        fname = manifest['episodes']['1']['fname']
+        with open(os.path.join(path, 'reward', fname), 'ab') as f:
+            f.write(b'\0')
+        self.assertEqual(dataset.verify_manifest(path), [(1, 'reward')])
+        with self.assertRaisesRegex(ValueError, 'reward/1'):
+            dataset.check_manifest(path, N_EPISODES, verify=True)
+        with self.assertWarns(UserWarning):
+            dataset.check_manifest(path, N_EPISODES + 1)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,82 @@
+"""Tests for cliport.utils.episode_cache."""
+
+import os
+import pickle
+import tempfile
+from unittest import mock
+
+from absl.testing import absltest
+import numpy as np
+from cliport.utils import episode_cache
+
+
+class SharedEpisodeCacheTest(absltest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.data_dir = tempfile.mkdtemp()
+        self.cache = episode_cache.SharedEpisodeCache(4000, cache_dir=tempfile.mkdtemp())
+
+    def _write(self, fname, data):
+        path = os.path.join(self.data_dir, fname)
+        with open(path, 'wb') as f:
+            pickle.dump(data, f)
+        return path
+
+    def test_regenerated_file_misses(self):
+        path = self._write('000000-1.pkl', [1, 2, 3])
+        self.cache.put(path, [1, 2, 3])
+        self.assertEqual(self.cache.get(path), [1, 2, 3])
+
+        os.utime(path, ns=(0, 0))
+        self.assertIsNone(self.cache.get(path))
+
+    def test_version_replaces_file_stat(self):
+        path = self._write('000000-1.pkl', [1, 2, 3])
+        self.cache.put(path, [1, 2, 3], version='1')
+        os.utime(path, ns=(0, 0))
+        self.assertEqual(self.cache.get(path, version='1'), [1, 2, 3])
+        self.assertIsNone(self.cache.get(path, version='2'))
+
+    def test_budget_and_cleanup(self):
+        paths = [self._write(f'{i:06d}-1.pkl', i) for i in range(5)]
+        for i, path in enumerate(paths):
+            # Entries of 928 bytes, put one second apart for a fixed LRU order.
+            self.cache.put(path, np.zeros(100, dtype=np.float64))
+            os.utime(f'{self.cache._entry_path(path)}.npy', (i, i))
+        self.assertIsNone(self.cache.get(paths[0]))
+        self.assertIsNotNone(self.cache.get(paths[-1]))
+        sizes = [entry.stat().st_size for entry in os.scandir(self.cache.cache_dir)
+                 if entry.name.endswith('.npy')]
+        self.assertLessEqual(sum(sizes), self.cache.max_bytes)
+        self.assertEqual(self.cache._read_size(), sum(sizes))
+
+        self.cache.cleanup()
+        self.assertFalse(os.path.exists(self.cache.cache_dir))
+
+
+class MakeEpisodeCacheTest(absltest.TestCase):
+
+    def test_budget_within_free_space(self):
+        free_bytes = 4 * episode_cache.MIN_SHARED_BYTES
+        with mock.patch.object(episode_cache, 'get_free_bytes', return_value=free_bytes):
+            cache = episode_cache.make_episode_cache(8 * 1024 ** 3, cache_dir=tempfile.mkdtemp())
+        self.assertIsInstance(cache, episode_cache.SharedEpisodeCache)
+        self.assertEqual(cache.max_bytes, free_bytes * episode_cache.SHARED_FRACTION)
+        cache.cleanup()
+
+    def test_falls_back_to_process_cache(self):
+        with mock.patch.object(episode_cache, 'get_free_bytes', return_value=1024 ** 2):
+            cache = episode_cache.make_episode_cache(4000, cache_dir=tempfile.mkdtemp())
+        self.assertIsInstance(cache, episode_cache.ProcessEpisodeCache)
+
+        # Entries of 800 bytes.
+        for i in range(6):
+            cache.put(f'{i:06d}-1.pkl', np.zeros(100, dtype=np.float64), version='1')
+        self.assertIsNone(cache.get('000000-1.pkl', version='1'))
+        self.assertIsNotNone(cache.get('000005-1.pkl', version='1'))
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,42 @@
+"""Tests for resetting environments from a scene snapshot."""
+
+import random
+
+from absl.testing import absltest
+import numpy as np
+from cliport import tasks
+from cliport.environments import environment
+
+ASSETS_PATH = 'cliport/environments/assets/'
+
+
+def _reset(env, seed):
+    np.random.seed(seed)
+    random.seed(seed)
+    env.seed(seed)
+    return env.reset()
+
+
+class FastResetTest(absltest.TestCase):
+
+    def test_matches_full_reset(self):
+        env = environment.Environment(ASSETS_PATH, task=tasks.BlockInsertion())
+        fast_env = environment.Environment(ASSETS_PATH, task=tasks.BlockInsertion(), fast_reset=True)
+
+        for seed in (0, 2, 4):
+            obs = _reset(env, seed)
+            fast_obs = _reset(fast_env, seed)
+            np.testing.assert_allclose(fast_obs['depth'][0], obs['depth'][0], atol=1e-4)
+            self.assertEqual(len(fast_env.obj_ids['fixed']) + len(fast_env.obj_ids['rigid']),
+                             fast_env.p.getNumBodies() - len(fast_env.scene_bodies))
+
+            # Leave task bodies and a grasp behind for the next reset.
+            agent = fast_env.task.oracle(fast_env)
+            fast_env.step(agent.act(fast_obs, fast_env.info))
+
+        env.close()
+        fast_env.close()
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,61 @@
+"""Tests for cliport.models.core.lang_goals."""
+
+from absl.testing import absltest
+import torch
+from torch import nn
+from cliport.models.core import lang_goals
+from cliport.models.core.clip import tokenize
+
+
+class FakeCLIP(nn.Module):
+    """Text encoder with the interface of the CLIP model that counts encoded goals."""
+
+    def __init__(self):
+        super().__init__()
+        self.token_embedding = nn.Embedding(49408, 4)
+        self.n_encoded = 0
+
+    def encode_text_with_embeddings(self, tokens):
+        self.n_encoded += len(tokens)
+        text_emb = self.token_embedding(tokens)
+        return text_emb.sum(1), text_emb
+
+
+class CLIPTextCacheTest(absltest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clip = FakeCLIP()
+        self.vocab = ['pick the red block', 'put the blocks in a zone', 'task completed.']
+        self.cache = lang_goals.CLIPTextCache(max_size=2)
+        self.cache.set_vocabulary(tokenize(self.vocab))
+
+    def test_lookup_by_id_matches_strings(self):
+        texts = ['task completed.', 'pick the red block', 'task completed.']
+        batch = lang_goals.LangGoals(texts, ids=torch.tensor([2, 0, 2]))
+        feat, emb, tokens = self.cache.encode(self.clip, batch)
+        self.assertEqual(self.clip.n_encoded, len(self.vocab))
+
+        ref_feat, ref_emb, ref_tokens = self.cache.encode(self.clip, texts)
+        torch.testing.assert_close(feat, ref_feat)
+        torch.testing.assert_close(emb, ref_emb)
+        torch.testing.assert_close(tokens, ref_tokens)
+
+        # The vocabulary is encoded only once.
+        self.clip.n_encoded = 0
+        self.cache.encode(self.clip, batch)
+        self.assertEqual(self.clip.n_encoded, 0)
+
+    def test_unknown_goals_use_bounded_lru(self):
+        batch = lang_goals.LangGoals(['a', 'b'], ids=torch.tensor([-1, 0]))
+        self.cache.encode(self.clip, batch)
+        self.assertEqual(self.clip.n_encoded, 2)
+        self.cache.encode(self.clip, 'c')
+        self.assertLen(self.cache.texts, 2)
+        self.assertNotIn((torch.device('cpu'), 'a'), self.cache.texts)
+        self.assertIn((torch.device('cpu'), 'b'), self.cache.texts)
+        self.assertIsInstance(batch, list)
+
+
+if __name__ == '__main__':
+    absltest.main()
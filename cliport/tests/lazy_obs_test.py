@@ -0,0 +1,54 @@
+"""Tests for lazily rendered observations."""
+
+import pickle
+
+from absl.testing import absltest
+import numpy as np
+from cliport import tasks
+from cliport.environments import environment
+
+ASSETS_PATH = 'cliport/environments/assets/'
+
+
+class LazyObservationTest(absltest.TestCase):
+
+    def test_matches_eager_rendering(self):
+        env = environment.Environment(ASSETS_PATH, task=tasks.BlockInsertion(), lazy_obs=True)
+        env.seed(0)
+        obs = env.reset()
+        self.assertIsInstance(obs, environment.LazyObservation)
+
+        color, depth = obs.camera(1)
+        self.assertIsNone(obs.images[0])
+        np.testing.assert_array_equal(obs['depth'][1], depth)
+        eager = env.render_cameras(env.agent_cams)
+        np.testing.assert_array_equal(obs['color'][0], eager['color'][0])
+        np.testing.assert_array_equal(pickle.loads(pickle.dumps(obs))['color'][1], color)
+
+        # Images of an observation cannot be read after stepping.
+        obs = env.step()[0]
+        env.step()
+        with self.assertRaises(RuntimeError):
+            obs['color']
+        env.close()
+
+    def test_no_rendering(self):
+        env = environment.Environment(ASSETS_PATH, task=tasks.BlockInsertion(), render_obs=False)
+        env.seed(0)
+        obs = env.reset()
+        self.assertEqual(obs, {'color': (), 'depth': ()})
+        _, _, _, info = env.step(env.task.oracle(env).act(obs, env.info))
+        self.assertIn('lang_goal', info)
+        env.close()
+
+    def test_camera_selection(self):
+        env = environment.Environment(ASSETS_PATH, task=tasks.BlockInsertion(), obs_cams=[0])
+        env.seed(0)
+        obs = env.reset()
+        self.assertLen(obs['color'], 1)
+        self.assertLen(env.observation_space['color'], 1)
+        env.close()
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,66 @@
+"""Tests for cliport.utils.occupancy."""
+
+from absl.testing import absltest
+import numpy as np
+
+from cliport.utils.occupancy import OccupancyMap
+
+BOUNDS = np.array([[0.25, 0.75], [-0.5, 0.5], [0, 0.3]])
+PIXEL_SIZE = 0.003125
+IDENTITY = (0, 0, 0, 1)
+
+
+class OccupancyMapTest(absltest.TestCase):
+
+    def _seeded_map(self):
+        occupancy = OccupancyMap(BOUNDS, PIXEL_SIZE)
+        obj_mask = np.zeros(occupancy.shape, dtype=np.int32)
+        obj_mask[10:20, 30:40] = 5
+        obj_mask[100:110, 50:60] = 1  # Not tracked, e.g. the robot.
+        occupancy.seed(obj_mask, {5: ((0.35, -0.45, 0.02), IDENTITY)})
+        return occupancy
+
+    def test_seed_marks_tracked_objects_only(self):
+        occupancy = self._seeded_map()
+        self.assertEqual(occupancy.shape, (320, 160))
+        free = occupancy.get_free(1)
+        self.assertFalse(np.any(free[10:20, 30:40]))
+        self.assertTrue(np.all(free[100:110, 50:60]))
+        self.assertFalse(np.any(free[0]))
+
+    def test_add_and_remove_aabb_footprint(self):
+        occupancy = self._seeded_map()
+        free = occupancy.get_free(3)
+        aabb = ((0.5, 0., 0.), (0.52, 0.01, 0.05))
+        occupancy.add(7, ((0.51, 0.005, 0.025), IDENTITY), aabb)
+        self.assertIsNot(occupancy.get_free(3), free)
+        rows, cols = occupancy.footprints[7]
+        self.assertEqual((rows.start, rows.stop), (160, 164))
+        self.assertEqual((cols.start, cols.stop), (80, 87))
+        self.assertTrue(np.all(occupancy.counts[160:164, 80:87] == 1))
+
+        occupancy.remove(7)
+        np.testing.assert_array_equal(occupancy.get_free(3), free)
+
+    def test_sync_updates_moved_and_removed_objects(self):
+        occupancy = self._seeded_map()
+        aabbs = {5: ((0.6, 0.2, 0.), (0.61, 0.21, 0.05)), 8: ((0.3, 0.3, 0.), (0.31, 0.31, 0.05))}
+        occupancy.sync({5: ((0.605, 0.205, 0.02), IDENTITY), 8: ((0.305, 0.305, 0.02), IDENTITY)},
+                       aabbs.get)
+        self.assertEqual(np.sum(occupancy.counts[10:20, 30:40]), 0)
+        self.assertTrue(np.all(occupancy.counts[224:228, 112:116] == 1))
+        self.assertIn(8, occupancy.footprints)
+
+        occupancy.sync({8: ((0.305, 0.305, 0.02), IDENTITY)}, aabbs.get)
+        self.assertNotIn(5, occupancy.footprints)
+        self.assertEqual(np.sum(occupancy.counts[224:228, 112:116]), 0)
+
+    def test_out_of_bounds_aabb_is_empty(self):
+        occupancy = self._seeded_map()
+        counts = occupancy.counts.copy()
+        occupancy.add(9, ((2., 2., 0.), IDENTITY), ((1.9, 1.9, 0.), (2.1, 2.1, 0.1)))
+        np.testing.assert_array_equal(occupancy.counts, counts)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,67 @@
+"""Tests for cliport.utils.poses."""
+
+from absl.testing import absltest
+import numpy as np
+
+from cliport.utils import poses
+from cliport.utils import utils
+
+
+def _random_poses(rng, n):
+    rotations = rng.uniform(-np.pi, np.pi, (n, 3))
+    # Include gimbal lock, where euler angles are not unique.
+    rotations[:n // 10, 0] = np.pi / 2
+    return rng.randn(n, 3), poses.euler_to_quat(rotations), rotations
+
+
+class PosesTest(absltest.TestCase):
+
+    def assertSameRotation(self, q0, q1):
+        # q and -q are the same rotation.
+        dots = np.abs(np.sum(np.asarray(q0) * np.asarray(q1), axis=-1))
+        np.testing.assert_allclose(dots, 1., atol=1e-6)
+
+    def test_euler_quat_conversions_match_utils(self):
+        _, quaternions, rotations = _random_poses(np.random.RandomState(0), 200)
+        expected = [utils.eulerXYZ_to_quatXYZW(rotation) for rotation in rotations]
+        np.testing.assert_allclose(quaternions, expected, atol=1e-12)
+
+        expected = [utils.quatXYZW_to_eulerXYZ(q) for q in quaternions]
+        np.testing.assert_allclose(poses.quat_to_euler(quaternions), expected, atol=1e-9)
+        np.testing.assert_allclose(poses.quat_to_yaw(quaternions), np.array(expected)[:, 2], atol=1e-9)
+
+    def test_multiply_invert_apply_match_pybullet(self):
+        rng = np.random.RandomState(1)
+        pos0, quat0, _ = _random_poses(rng, 100)
+        pos1, quat1, _ = _random_poses(rng, 100)
+
+        pos, quat = poses.multiply(pos0, quat0, pos1, quat1)
+        for i in range(100):
+            expected = utils.multiply((pos0[i], quat0[i]), (pos1[i], quat1[i]))
+            np.testing.assert_allclose(pos[i], expected[0], atol=1e-5)
+            self.assertSameRotation(quat[i], expected[1])
+
+        pos, quat = poses.invert(pos0, quat0)
+        for i in range(100):
+            expected = utils.invert((pos0[i], quat0[i]))
+            np.testing.assert_allclose(pos[i], expected[0], atol=1e-5)
+            self.assertSameRotation(quat[i], expected[1])
+
+        points = rng.randn(50, 3)
+        expected = np.array(utils.apply((pos0[0], quat0[0]), points.T)).T
+        np.testing.assert_allclose(poses.apply(pos0[0], quat0[0], points), expected, atol=1e-5)
+
+    def test_yaw_distance(self):
+        np.testing.assert_allclose(poses.yaw_distance(0.1, 0.1 + np.pi, np.pi), 0., atol=1e-12)
+        np.testing.assert_allclose(poses.yaw_distance(0.1, 0.3, 2 * np.pi), 0.2)
+        np.testing.assert_allclose(poses.yaw_distance(0.1, 6.2, 2 * np.pi), 2 * np.pi - 6.1)
+        np.testing.assert_allclose(poses.yaw_distance(0.1, 3.0, 0), 0.)
+
+    def test_as_poses_adds_default_orientation(self):
+        positions, quaternions = poses.as_poses([(0.1, 0.2, 0.3), ((0.4, 0.5, 0.6), (0, 0, 1, 0))])
+        np.testing.assert_allclose(positions, [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]])
+        np.testing.assert_allclose(quaternions, [[0, 0, 0, 1], [0, 0, 1, 0]])
+
+
+if __name__ == '__main__':
+    absltest.main()
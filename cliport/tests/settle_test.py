@@ -0,0 +1,51 @@
+"""Tests for step-budgeted settling and motion."""
+
+import random
+
+from absl.testing import absltest
+import numpy as np
+from cliport import tasks
+from cliport.environments import environment
+
+ASSETS_PATH = 'cliport/environments/assets/'
+
+
+def _rollout(env, seed, n_steps=2):
+    np.random.seed(seed)
+    random.seed(seed)
+    env.seed(seed)
+    obs = env.reset()
+    agent = env.task.oracle(env)
+    infos = []
+    for _ in range(n_steps):
+        obs, _, done, info = env.step(agent.act(obs, env.info))
+        infos.append(info)
+        if done:
+            break
+    return infos
+
+
+class SettleTest(absltest.TestCase):
+
+    def test_rollouts_are_deterministic(self):
+        env = environment.Environment(ASSETS_PATH, task=tasks.BlockInsertion(), render_obs=False)
+        infos0 = _rollout(env, 0)
+        infos1 = _rollout(env, 0)
+        for info0, info1 in zip(infos0, infos1):
+            self.assertGreater(info0['sim_steps'], 0)
+            self.assertEqual(info0['sim_steps'], info1['sim_steps'])
+            for obj_id in env.obj_ids['rigid']:
+                np.testing.assert_array_equal(info0[obj_id][0], info1[obj_id][0])
+        env.close()
+
+    def test_step_budgets(self):
+        env = environment.Environment(ASSETS_PATH, task=tasks.BlockInsertion(), render_obs=False,
+                                      settle_steps=0, movej_steps=1)
+        _rollout(env, 0, n_steps=0)
+        self.assertTrue(env.movej(env.homej + 0.5))
+        self.assertEqual(env.step()[3]['sim_steps'], 0)
+        env.close()
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -1,9 +1,13 @@
 """Integration tests for dvnets tasks."""
 
+import pkgutil
+
 from absl.testing import absltest
 from absl.testing import parameterized
+import numpy as np
 from cliport import tasks
 from cliport.environments import environment
+from cliport.utils import utils
 
 ASSETS_PATH = 'cliport/environments/assets/'
 
@@ -142,5 +146,105 @@ class TaskTest(parameterized.TestCase):
         self._run_oracle_in_env(env)
 
 
+class TrueImageTest(parameterized.TestCase):
+
+    @parameterized.named_parameters(
+        ('AlignBoxCorner', tasks.AlignBoxCorner()),
+        ('PackingBoxes', tasks.PackingBoxes()),
+        ('PlaceRedInGreen', tasks.PlaceRedInGreen()),
+        ('StackBlockPyramid', tasks.StackBlockPyramid()),
+        ('SweepingPiles', tasks.SweepingPiles()),
+    )
+    def test_orthographic_matches_reference(self, task):
+        env = environment.Environment(ASSETS_PATH, record_cfg={'save_video': False, 'blender_render': False})
+        env.seed(0)
+        env.set_task(task)
+        env.reset()
+        cmap, hmap, mask = task.get_true_image_orthographic(env)
+        ref_cmap, ref_hmap, ref_mask = task.get_true_image(env)
+
+        self.assertEqual(cmap.shape, ref_cmap.shape)
+        self.assertEqual(hmap.shape, ref_hmap.shape)
+        self.assertEqual(mask.shape, ref_mask.shape)
+
+        # Cells on object edges are sampled, and shaded, differently by the two cameras.
+        self.assertGreater(np.mean(mask == ref_mask), 0.98)
+        self.assertGreater(np.mean(np.abs(hmap - ref_hmap) < 0.005), 0.98)
+        self.assertGreater(np.mean(np.all(np.abs(np.int32(cmap) - ref_cmap) <= 8, axis=-1)), 0.95)
+
+    @parameterized.named_parameters(
+        ('TinyRenderer', False),
+        ('OpenGL', True),
+    )
+    def test_orthographic_heights(self, opengl):
+        env = environment.Environment(ASSETS_PATH, record_cfg={'save_video': False, 'blender_render': False})
+        if opengl:
+            egl = pkgutil.get_loader('eglRenderer')
+            if egl is None or env.p.loadPlugin(egl.get_filename(), '_eglRendererPlugin') < 0:
+                self.skipTest('EGL renderer not available')
+            env.opengl_renderer = True
+        env.seed(0)
+        task = tasks.StackBlockPyramid()
+        env.set_task(task)
+        env.reset()
+        _, hmap, mask = task.get_true_image_orthographic(env)
+        obs = env.render_cameras(env.agent_cams)
+        _, fused_hmap = utils.get_fused_heightmap(obs, env.agent_cams, task.bounds, task.pix_size)
+
+        # The blocks are 4 cm high. The heightmap reconstructed from the
+        # RealSense cameras is within a few millimeters of the true heights.
+        for obj_id in env.obj_ids['rigid']:
+            obj_mask = mask == obj_id
+            self.assertGreater(np.sum(obj_mask), 0)
+            np.testing.assert_allclose(np.median(hmap[obj_mask]), 0.04, atol=1e-3)
+            np.testing.assert_allclose(np.median(hmap[obj_mask]), np.median(fused_hmap[obj_mask]), atol=3e-3)
+        self.assertEqual(np.max(hmap[mask == 0]), 0)
+        env.close()
+
+
+class ZoneRewardTest(parameterized.TestCase):
+
+    @parameterized.named_parameters(
+        ('PackingBoxes', tasks.PackingBoxes()),
+        ('SeparatingPiles', tasks.SeparatingPiles()),
+        ('SweepingPiles', tasks.SweepingPiles()),
+    )
+    def test_zone_points_match_reference(self, task):
+        env = environment.Environment(ASSETS_PATH, record_cfg={'save_video': False, 'blender_render': False})
+        env.seed(0)
+        env.set_task(task)
+        env.reset()
+        objs, _, _, _, _, metric, zones, _ = task.goals[0]
+        self.assertEqual(metric, 'zone')
+
+        # Move objects around the zone so that some points are inside.
+        rng = np.random.RandomState(0)
+        zone_pose, zone_size = zones[0]
+        for obj_id, _ in objs[::2]:
+            position = np.array(zone_pose[0]) + rng.uniform(-0.6, 0.6, 3) * np.array(zone_size)
+            env.p.resetBasePositionAndOrientation(obj_id, position, env.p.getQuaternionFromEuler((0, 0, rng.uniform(0, np.pi))))
+
+        zone_pts, total_pts = task.count_zone_points(objs, zones)
+        ref_zone_pts, ref_total_pts = task.count_zone_points_reference(objs, zones)
+        self.assertGreater(zone_pts, 0)
+        self.assertEqual(zone_pts, ref_zone_pts)
+        self.assertEqual(total_pts, ref_total_pts)
+
+    def test_object_points_are_shared_across_episodes(self):
+        env = environment.Environment(ASSETS_PATH, record_cfg={'save_video': False, 'blender_render': False})
+        env.seed(0)
+        task = tasks.SweepingPiles()
+        env.set_task(task)
+        env.reset()
+        (obj0, _), (obj1, _) = task.goals[0][0][:2]
+        pts = task.get_box_object_points(obj0)
+        self.assertIs(task.get_box_object_points(obj1), pts)
+        self.assertFalse(pts.flags.writeable)
+
+        env.reset()
+        obj_id, _ = task.goals[0][0][0]
+        self.assertIs(task.get_box_object_points(obj_id), pts)
+
+
 if __name__ == '__main__':
     absltest.main()
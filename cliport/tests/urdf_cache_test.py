@@ -0,0 +1,39 @@
+"""Tests for cliport.utils.urdf_cache."""
+
+import os
+import tempfile
+
+from absl.testing import absltest
+from cliport.utils import urdf_cache
+
+
+class TemplateCacheTest(absltest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.template_path = os.path.join(tempfile.mkdtemp(), 'box-template.urdf')
+        with open(self.template_path, 'w') as file:
+            file.write('<box size="DIM0 DIM1 DIM2"/>')
+        self.cache = urdf_cache.TemplateCache(max_files=2, cache_dir=tempfile.mkdtemp())
+
+    def test_same_content_same_file(self):
+        fdata = self.cache.read(self.template_path).replace('DIM0', '0.1')
+        fname = self.cache.write(self.template_path, fdata)
+        self.assertEqual(self.cache.write(self.template_path, fdata), fname)
+        self.assertTrue(os.path.basename(fname).startswith('box-template.urdf.'))
+        with open(fname) as file:
+            self.assertEqual(file.read(), fdata)
+        self.assertNotEqual(self.cache.write(self.template_path, fdata + ' '), fname)
+
+    def test_bounded_and_cleaned_up(self):
+        fnames = [self.cache.write(self.template_path, str(i)) for i in range(3)]
+        self.assertFalse(os.path.exists(fnames[0]))
+        self.assertTrue(os.path.exists(fnames[2]))
+        self.assertLen(os.listdir(self.cache.cache_dir), 2)
+
+        self.cache.cleanup()
+        self.assertFalse(os.path.exists(self.cache.cache_dir))
+
+
+if __name__ == '__main__':
+    absltest.main()
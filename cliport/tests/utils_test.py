@@ -0,0 +1,116 @@
+"""Tests for cliport.utils.utils."""
+
+from absl.testing import absltest
+import numpy as np
+import pybullet as p
+import torch
+
+from cliport.tasks import cameras
+from cliport.utils import utils
+
+BOUNDS = np.array([[0.25, 0.75], [-0.5, 0.5], [0, 0.28]])
+PIXEL_SIZE = 0.003125
+
+
+class FusedHeightmapTest(absltest.TestCase):
+
+    def _random_obs(self, seed):
+        rng = np.random.RandomState(seed)
+        configs = cameras.RealSenseD415.CONFIG
+        color = rng.randint(0, 256, (len(configs), 480, 640, 3)).astype(np.uint8)
+        depth = rng.uniform(0.3, 1.2, (len(configs), 480, 640)).astype(np.float32)
+        return {'color': color, 'depth': depth}, configs
+
+    def test_fused_heightmap_matches_reference(self):
+        for seed in range(3):
+            obs, configs = self._random_obs(seed)
+            cmap, hmap = utils.get_fused_heightmap(obs, configs, BOUNDS, PIXEL_SIZE)
+            ref_cmap, ref_hmap = utils.get_fused_heightmap_reference(obs, configs, BOUNDS, PIXEL_SIZE)
+
+            self.assertEqual(cmap.shape, ref_cmap.shape)
+            self.assertEqual(cmap.dtype, ref_cmap.dtype)
+            self.assertEqual(hmap.shape, ref_hmap.shape)
+            np.testing.assert_allclose(hmap, ref_hmap, atol=1e-5)
+
+            # Points of equal height in a cell may pick a different color.
+            differs = np.any(np.abs(np.int32(cmap) - ref_cmap) > 1, axis=-1)
+            self.assertLess(np.mean(differs), 1e-3)
+
+    def test_batched_fused_heightmap_matches_numpy(self):
+        observations = [self._random_obs(seed)[0] for seed in range(3)]
+        configs = cameras.RealSenseD415.CONFIG
+        batch = {key: np.stack([obs[key] for obs in observations]) for key in ('color', 'depth')}
+        cmaps, hmaps = utils.get_fused_heightmap_batch(batch, configs, BOUNDS, PIXEL_SIZE)
+        self.assertEqual(cmaps.dtype, torch.uint8)
+        self.assertEqual(hmaps.dtype, torch.float32)
+
+        for obs, cmap, hmap in zip(observations, cmaps, hmaps):
+            ref_cmap, ref_hmap = utils.get_fused_heightmap(obs, configs, BOUNDS, PIXEL_SIZE)
+            np.testing.assert_array_equal(cmap.numpy(), ref_cmap)
+            np.testing.assert_array_equal(hmap.numpy(), ref_hmap)
+
+
+class CameraRaysTest(absltest.TestCase):
+
+    def test_world_points_match_transformed_pointcloud(self):
+        rng = np.random.RandomState(0)
+        for config in cameras.RealSenseD415.CONFIG + cameras.Oracle.CONFIG:
+            depth = rng.uniform(0.3, 1.2, config['image_size']).astype(np.float32)
+            intrinsics = np.array(config['intrinsics']).reshape(3, 3)
+            transform = np.eye(4)
+            transform[:3, :3] = np.array(p.getMatrixFromQuaternion(config['rotation'])).reshape(3, 3)
+            transform[:3, 3] = config['position']
+            expected = utils.transform_pointcloud(utils.get_pointcloud(depth, intrinsics), transform)
+
+            points = utils.get_world_points(depth, config)
+            self.assertEqual(points.shape, (3, depth.size))
+            self.assertEqual(points.dtype, np.float32)
+            np.testing.assert_allclose(points.T.reshape(expected.shape), expected, rtol=1e-5, atol=1e-4)
+
+    def test_rays_are_cached_per_config(self):
+        config = cameras.RealSenseD415.CONFIG[0]
+        rays, origin = utils.get_camera_rays(config, config['image_size'])
+        self.assertIs(utils.get_camera_rays(dict(config), config['image_size'])[0], rays)
+        self.assertIsNot(utils.get_camera_rays(cameras.RealSenseD415.CONFIG[1], config['image_size'])[0], rays)
+        self.assertFalse(rays.flags.writeable)
+
+
+class SampleDistributionTest(absltest.TestCase):
+
+    def test_samples_match_dense_sampling(self):
+        rng = np.random.RandomState(0)
+        for _ in range(20):
+            prob = np.float32(rng.uniform(size=(320, 160)) > 0.99) * rng.uniform(size=(320, 160))
+            np.random.seed(1)
+            pix = utils.sample_distribution(prob)
+            np.random.seed(1)
+            flat_prob = prob.flatten() / np.sum(prob)
+            ind = np.random.choice(np.arange(len(flat_prob)), 1, p=flat_prob, replace=False)
+            np.testing.assert_array_equal(pix, np.unravel_index(ind[0], prob.shape))
+
+
+class PixelConversionTest(absltest.TestCase):
+
+    def test_batch_matches_scalar_conversions(self):
+        rng = np.random.RandomState(0)
+        hmap = rng.uniform(0, 0.2, (320, 160)).astype(np.float32)
+        pixels = np.stack([rng.randint(0, 320, 100), rng.randint(0, 160, 100)], axis=1)
+
+        xyz = utils.pix_to_xyz_batch(pixels, hmap, BOUNDS, PIXEL_SIZE)
+        self.assertEqual(xyz.shape, (100, 3))
+        for pixel, position in zip(pixels, xyz):
+            u, v = pixel
+            expected = (BOUNDS[0, 0] + v * PIXEL_SIZE, BOUNDS[1, 0] + u * PIXEL_SIZE, BOUNDS[2, 0] + hmap[u, v])
+            np.testing.assert_array_equal(position, expected)
+            np.testing.assert_array_equal(utils.pix_to_xyz(pixel, hmap, BOUNDS, PIXEL_SIZE), expected)
+        np.testing.assert_array_equal(utils.pix_to_xyz_batch(pixels, None, BOUNDS, PIXEL_SIZE)[:, 2], 0)
+
+        pix = utils.xyz_to_pix_batch(xyz, BOUNDS, PIXEL_SIZE)
+        np.testing.assert_array_equal(pix, pixels)
+        np.testing.assert_array_equal(utils.xyz_to_pix_batch(xyz[:, :2], BOUNDS, PIXEL_SIZE), pixels)
+        self.assertEqual(utils.xyz_to_pix(tuple(xyz[0]), BOUNDS, PIXEL_SIZE), tuple(pixels[0]))
+        self.assertIsInstance(utils.xyz_to_pix(xyz[0], BOUNDS, PIXEL_SIZE)[0], int)
+
+
+if __name__ == '__main__':
+    absltest.main()
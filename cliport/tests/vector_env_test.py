@@ -0,0 +1,64 @@
+"""Integration tests for multiple environments."""
+
+import random
+
+from absl.testing import absltest
+import numpy as np
+from cliport import tasks
+from cliport.environments import environment
+from cliport.environments import vector_env
+
+ASSETS_PATH = 'cliport/environments/assets/'
+
+
+def _reset(env, seed):
+    np.random.seed(seed)
+    random.seed(seed)
+    env.seed(seed)
+    return env.reset()
+
+
+class VectorEnvTest(absltest.TestCase):
+
+    def test_environments_share_process(self):
+        env0 = environment.Environment(ASSETS_PATH, task=tasks.BlockInsertion())
+        env1 = environment.Environment(ASSETS_PATH, task=tasks.PlaceRedInGreen())
+        self.assertNotEqual(env0.p._client, env1.p._client)
+        obs0 = _reset(env0, 0)
+        _reset(env1, 1)
+
+        # Stepping the second environment leaves the first one untouched.
+        agent = env1.task.oracle(env1)
+        env1.step(agent.act(None, env1.info))
+        obs, _, _, _ = env0.step()
+        np.testing.assert_array_equal(obs['color'][0], obs0['color'][0])
+        env0.close()
+        env1.close()
+
+    def test_matches_single_environment(self):
+        env = environment.Environment(ASSETS_PATH, task=tasks.BlockInsertion())
+        expected = [_reset(env, seed) for seed in (0, 2)]
+        env.close()
+
+        venv = vector_env.VectorEnv(2, 'block-insertion', assets_root=ASSETS_PATH)
+        obs, infos = venv.reset([0, 2])
+        self.assertLen(infos, 2)
+        for i in range(2):
+            np.testing.assert_array_equal(obs['depth'][0][i], expected[i]['depth'][0])
+
+        obs, rewards, dones, infos = venv.step(venv.oracle_act())
+        self.assertEqual(obs['color'][0].shape[0], 2)
+        self.assertEqual(rewards.shape, (2,))
+        self.assertEqual(dones.shape, (2,))
+
+        # Errors in a worker are raised in the parent, which can go on.
+        with self.assertRaisesRegex(RuntimeError, 'Unknown command'):
+            venv._send('jump', [None, None])
+        with self.assertRaisesRegex(RuntimeError, 'AttributeError'):
+            venv.call('jump')
+        self.assertLen(venv.call('get_task_name'), 2)
+        venv.close()
+
+
+if __name__ == '__main__':
+    absltest.main()
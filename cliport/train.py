@@ -5,7 +5,7 @@ from pathlib import Path
 
 import torch
 from cliport import agents
-from cliport.dataset import RavensDataset, RavensMultiTaskDataset, RavenMultiTaskDatasetBalance
+from cliport.dataset import RavensDataset, RavensMultiTaskDataset, RavenMultiTaskDatasetBalance, RavensStreamDataset, EpochPermutationSampler
 
 import hydra
 from pytorch_lightning import Trainer
@@ -61,6 +61,11 @@ def main(cfg):
         # scale training time depending on the tasks to ensure coverage.
         max_epochs = cfg['train']['training_step_scale'] #  // cfg['train']['batch_size']
 
+    # Step sampling shards its epoch permutation across ranks itself (see
+    # EpochPermutationSampler), so Lightning must keep the sampler. Validation
+    # then runs on the whole val set on every rank.
+    step_sampling = 'sampling' in cfg['dataset'] and cfg['dataset']['sampling'] == 'step'
+
     trainer = Trainer(
         accelerator='gpu',
         devices=cfg['train']['gpu'],
@@ -72,6 +77,7 @@ def main(cfg):
         # resume_from_checkpoint=last_checkpoint,
         sync_batchnorm=True,
         log_every_n_steps=30,        
+        use_distributed_sampler=not step_sampling,
     )
 
     print(f"max epochs: {max_epochs}!")
@@ -98,10 +104,16 @@ def main(cfg):
             
     # Datasets
     dataset_type = cfg['dataset']['type']
+    num_workers = cfg['dataset']['num_workers'] if 'num_workers' in cfg['dataset'] else 1
     if 'multi' in dataset_type:
         train_ds = RavensMultiTaskDataset(data_dir, cfg, group=task, mode='train', 
                     n_demos=n_demos, augment=True)
         val_ds = RavensMultiTaskDataset(data_dir, cfg, group=task, mode='val', n_demos=n_val, augment=False)
+    elif 'stream' in dataset_type:
+        # Shards written by dataset.write_shards to {data_dir}/shards/{model_task}-train.
+        train_ds = RavensStreamDataset(os.path.join(data_dir, 'shards', '{}-train'.format(cfg['train']['model_task'])), cfg, augment=True,
+                                       num_workers=num_workers)
+        val_ds = RavensMultiTaskDataset(data_dir, cfg, group=task, mode='val', n_demos=n_val, augment=False)
     elif 'weighted' in dataset_type:
         train_ds = RavenMultiTaskDatasetBalance(data_dir, cfg, group=task, mode='train', n_demos=n_demos, augment=True)
         val_ds = RavenMultiTaskDatasetBalance(data_dir, cfg, group=task, mode='val', n_demos=n_val, augment=False)
@@ -109,13 +121,23 @@ def main(cfg):
         train_ds = RavensDataset(os.path.join(data_dir, '{}-train'.format(task)), cfg, n_demos=n_demos, augment=True)
         val_ds = RavensDataset(os.path.join(data_dir, '{}-val'.format(task)), cfg, n_demos=n_val, augment=False)
 
+    # One goal vocabulary for both datasets, so that goal ids mean the same in
+    # training and validation batches.
+    lang_goals = sorted(set(train_ds.lang_goals) | set(val_ds.lang_goals))
+    train_ds.set_vocabulary(lang_goals)
+    val_ds.set_vocabulary(lang_goals)
+
     # Initialize agent
-    train_loader = DataLoader(train_ds, shuffle=True,
+    # Step sampling shuffles with a deterministic permutation per epoch, split
+    # across ranks under distributed training. Lightning calls set_epoch.
+    sampler = EpochPermutationSampler(train_ds) if train_ds.sampling == 'step' else None
+    # Streaming datasets shuffle with their own buffer.
+    train_loader = DataLoader(train_ds, shuffle=sampler is None and train_ds.sampling != 'stream', sampler=sampler,
                     pin_memory=True,
                     batch_size=cfg['train']['batch_size'],
-                    num_workers=1 )
+                    num_workers=num_workers)
     test_loader = DataLoader(val_ds, shuffle=False,
-                num_workers=1,
+                num_workers=num_workers,
                 batch_size=cfg['train']['batch_size'],
                 pin_memory=True)
 
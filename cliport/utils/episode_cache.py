@@ -0,0 +1,275 @@
+"""Byte-bounded episode cache shared across processes."""
+
+import atexit
+import os
+import fcntl
+import hashlib
+import pickle
+import shutil
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+# Fraction of the budget to evict down to once the cache is full, so that the
+# directory is not scanned again on every following put.
+EVICT_TO = 0.9
+
+# Max fraction of the free space of the cache filesystem the shared cache uses.
+# On tmpfs this is RAM, so the rest is left to the processes of the run.
+SHARED_FRACTION = 0.5
+
+# Below this budget the shared cache is not worth it and each process keeps its
+# own in-memory cache.
+MIN_SHARED_BYTES = 256 * 1024 ** 2
+
+
+def get_default_cache_dir():
+    """Cache directory on tmpfs (/dev/shm) if available, so entries live in RAM."""
+    root = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(root, f'cliport_episode_cache_{os.getuid()}')
+
+
+def get_free_bytes(path):
+    """Free space of the filesystem holding path, or of its closest existing parent."""
+    while not os.path.isdir(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    stat = os.statvfs(path)
+    return stat.f_bavail * stat.f_frsize
+
+
+def make_episode_cache(max_bytes, cache_dir=None):
+    """Shared episode cache of at most max_bytes, within the free space of its filesystem.
+
+    Falls back to a `ProcessEpisodeCache` if there is not enough free space
+    (e.g. a small /dev/shm in a container) or the cache directory is not writable.
+    """
+    cache_dir = cache_dir if cache_dir else get_default_cache_dir()
+    try:
+        shared_bytes = min(int(max_bytes), int(get_free_bytes(cache_dir) * SHARED_FRACTION))
+        if shared_bytes >= MIN_SHARED_BYTES:
+            return SharedEpisodeCache(shared_bytes, cache_dir)
+        print(f"Only {shared_bytes / 1024 ** 2:.0f} MB free for the episode cache in {cache_dir}. "
+              f"Using a cache per process instead.")
+    except OSError as e:
+        print(f"Could not create episode cache in {cache_dir}: {e}. Using a cache per process instead.")
+    return ProcessEpisodeCache(max_bytes)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedEpisodeCache:
+    """LRU cache of decoded episode fields in shared memory.
+
+    Every entry is a file in a tmpfs directory, so all processes of a run
+    (DataLoader workers, train and val datasets, multi-task datasets) hit the
+    same entries instead of each holding a private copy. Arrays are stored as
+    .npy and memory-mapped on read, so hits do not copy the data. Other values
+    (actions, rewards, infos) are pickled.
+
+    Entries are keyed by the path of the file they were loaded from and a
+    version of its dataset, the modification time of the dataset index, so a
+    regenerated dataset is never served from stale entries. Without a version,
+    the modification time and size of the file itself are used. The directory is private to the process that created the cache
+    and its children, and is removed when that process exits. Directories of
+    runs that died without cleaning up are removed by the next run.
+
+    The total size of the cache is bounded by `max_bytes`. A running total is
+    kept next to the entries. Once a put would cross the budget, the least
+    recently used entries (reads refresh the modification time) are evicted.
+    """
+
+    def __init__(self, max_bytes, cache_dir=None):
+        self.max_bytes = int(max_bytes)
+        root_dir = cache_dir if cache_dir else get_default_cache_dir()
+        self._remove_stale_runs(root_dir)
+        self._owner_pid = os.getpid()
+        self.cache_dir = os.path.join(root_dir, f'run_{self._owner_pid}')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock_path = os.path.join(self.cache_dir, '.lock')
+        self._size_path = os.path.join(self.cache_dir, '.size')
+        self._warned = False
+        atexit.register(self.cleanup)
+
+    @staticmethod
+    def _remove_stale_runs(root_dir):
+        if not os.path.isdir(root_dir):
+            return
+        for entry in os.scandir(root_dir):
+            run_pid = entry.name[len('run_'):]
+            if entry.name.startswith('run_') and run_pid.isdigit() and not _pid_alive(int(run_pid)):
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def _entry_path(self, source_path, version=None):
+        if version is None:
+            stat = os.stat(source_path)
+            version = f'{stat.st_mtime_ns}/{stat.st_size}'
+        key = f'{os.path.abspath(source_path)}/{version}'
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, source_path, version=None):
+        """Return the cached contents of a dataset file, or None on a miss."""
+        try:
+            entry_path = self._entry_path(source_path, version)
+            if os.path.exists(f'{entry_path}.npy'):
+                data = np.load(f'{entry_path}.npy', mmap_mode='r')
+                os.utime(f'{entry_path}.npy')
+                return data
+            if os.path.exists(f'{entry_path}.pkl'):
+                with open(f'{entry_path}.pkl', 'rb') as f:
+                    data = pickle.load(f)
+                os.utime(f'{entry_path}.pkl')
+                return data
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            # Entry was evicted by another process while reading it.
+            pass
+        return None
+
+    def put(self, source_path, data, version=None):
+        """Add the contents of a dataset file, evicting old entries to stay within budget."""
+        try:
+            entry_path = self._entry_path(source_path, version)
+        except OSError:
+            return
+        if isinstance(data, np.ndarray):
+            entry_path, nbytes = f'{entry_path}.npy', data.nbytes
+        else:
+            data = pickle.dumps(data)
+            entry_path, nbytes = f'{entry_path}.pkl', len(data)
+
+        # Never let a single entry take more than a quarter of the budget.
+        if nbytes > self.max_bytes // 4:
+            return
+
+        tmp_path = f'{entry_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                if isinstance(data, np.ndarray):
+                    np.save(f, data)
+                else:
+                    f.write(data)
+            nbytes = os.path.getsize(tmp_path)
+            with open(self._lock_path, 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    if os.path.exists(entry_path):
+                        # Another worker added it first.
+                        os.remove(tmp_path)
+                        return
+                    total_bytes = self._read_size() + nbytes
+                    if total_bytes > self.max_bytes:
+                        total_bytes = self._evict(int(self.max_bytes * EVICT_TO) - nbytes) + nbytes
+                    os.replace(tmp_path, entry_path)
+                    self._write_size(total_bytes)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        except OSError as e:
+            if not self._warned:
+                print(f"Could not write to episode cache {self.cache_dir}, "
+                      f"further errors are not reported: {e}")
+                self._warned = True
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _read_size(self):
+        try:
+            with open(self._size_path, 'r') as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_size(self, total_bytes):
+        with open(self._size_path, 'w') as f:
+            f.write(str(total_bytes))
+
+    def _evict(self, max_bytes):
+        """Remove least recently used entries until the cache holds at most max_bytes.
+
+        Returns the number of bytes left in the cache.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.npy') or entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum([size for _, size, _ in entries])
+        for _, size, entry_path in sorted(entries):
+            if total_bytes <= max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+        return total_bytes
+
+    def clear(self):
+        """Remove all entries."""
+        try:
+            with open(self._lock_path, 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._write_size(self._evict(0))
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        except OSError:
+            pass
+
+    def cleanup(self):
+        """Remove the cache directory. Child processes leave it to the creator."""
+        if os.getpid() == self._owner_pid:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+class ProcessEpisodeCache:
+    """LRU cache of episode fields in the memory of a single process.
+
+    Fallback of `SharedEpisodeCache` with the same interface. Every dataloader
+    worker holds its own copy of the entries, bounded by `max_bytes`. Entries
+    are keyed by path and version only, the files are not checked.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self.entries = OrderedDict()  # (path, version) -> (data, nbytes)
+        self.nbytes = 0
+
+    def get(self, source_path, version=None):
+        """Return the cached contents of a dataset file, or None on a miss."""
+        key = (source_path, version)
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key][0]
+
+    def put(self, source_path, data, version=None):
+        """Add the contents of a dataset file, evicting old entries to stay within budget."""
+        key = (source_path, version)
+        nbytes = data.nbytes if isinstance(data, np.ndarray) else len(pickle.dumps(data))
+        if key in self.entries or nbytes > self.max_bytes // 4:
+            return
+        self.entries[key] = (data, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted_bytes) = self.entries.popitem(last=False)
+            self.nbytes -= evicted_bytes
+
+    def clear(self):
+        """Remove all entries."""
+        self.entries.clear()
+        self.nbytes = 0
+
+    def cleanup(self):
+        pass
@@ -0,0 +1,138 @@
+"""Codecs for the color and depth images stored in datasets.
+
+Images of an episode have shape (n_steps, n_cameras, H, W[, C]). Every camera
+image of every step is encoded separately, so `__getitem__` only pays for
+decoding the steps it samples instead of the whole episode.
+
+Codecs:
+  raw: images are stored as-is (no encoding).
+  png: lossless PNG. uint8 and uint16 images only (e.g. color).
+  zstd: lossless zstd of the raw bytes, any dtype. Requires `zstandard`.
+  png-mm, zstd-mm: depth in metres quantized to uint16 millimetres, then
+    compressed with PNG or zstd. Lossy (1mm resolution, up to 65.535m).
+"""
+
+import cv2
+import numpy as np
+
+CODECS = ('raw', 'png', 'zstd', 'png-mm', 'zstd-mm')
+DEPTH_SCALE = 1000.  # metres -> millimetres
+ZSTD_LEVEL = 3
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("The 'zstd' image codecs require the zstandard package: pip install zstandard")
+    return zstandard
+
+
+def _encode_png(img):
+    ok, buf = cv2.imencode('.png', img)
+    if not ok:
+        raise ValueError(f"Could not PNG-encode image of shape {img.shape} and dtype {img.dtype}")
+    return buf.tobytes()
+
+
+def _decode_png(buf, dtype, shape):
+    img = cv2.imdecode(np.frombuffer(buf, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    return img.reshape(shape)
+
+
+def _encode_zstd(img):
+    return _zstd().ZstdCompressor(level=ZSTD_LEVEL).compress(np.ascontiguousarray(img).tobytes())
+
+
+def _decode_zstd(buf, dtype, shape):
+    data = _zstd().ZstdDecompressor().decompress(buf)
+    return np.frombuffer(data, dtype=dtype).reshape(shape)
+
+
+_COMPRESSORS = {
+    'png': (_encode_png, _decode_png),
+    'zstd': (_encode_zstd, _decode_zstd),
+}
+
+
+def check_codec(codec, dtype):
+    """Raise a ValueError if images of `dtype` cannot be stored with `codec`."""
+    dtype = np.dtype(dtype)
+    if codec not in CODECS:
+        raise ValueError(f"Invalid image codec: {codec}. Valid options: {CODECS}")
+    if codec == 'png' and dtype not in (np.uint8, np.uint16):
+        raise ValueError(f"The png codec only supports uint8 and uint16 images, got {dtype}. Use 'png-mm' for depth.")
+    if codec.endswith('-mm') and dtype.kind != 'f':
+        raise ValueError(f"The {codec} codec quantizes float depth images, got {dtype}.")
+
+
+def encode(images, codec):
+    """Encode the images of an episode, shape (n_steps, n_cameras, ...)."""
+    images = np.asarray(images)
+    check_codec(codec, images.dtype)
+    if codec == 'raw':
+        return images
+    return EncodedImages(images, codec)
+
+
+class EncodedImages:
+    """Compressed images of an episode, indexed by step like the raw array.
+
+    `encoded[i]` returns the images of step i, which are only decoded when
+    they are iterated over or converted to an array.
+    """
+
+    def __init__(self, images, codec):
+        self.codec = codec
+        self.dtype = images.dtype
+        self.shape = images.shape
+
+        compressor = codec[:-len('-mm')] if codec.endswith('-mm') else codec
+        encode_fn, _ = _COMPRESSORS[compressor]
+        if codec.endswith('-mm'):
+            images = np.uint16(np.clip(np.round(images * DEPTH_SCALE), 0, np.iinfo(np.uint16).max))
+        self.data = [[encode_fn(img) for img in step] for step in images]
+
+    @property
+    def nbytes(self):
+        return sum([len(buf) for step in self.data for buf in step])
+
+    def decode(self, step, camera):
+        compressor = self.codec[:-len('-mm')] if self.codec.endswith('-mm') else self.codec
+        _, decode_fn = _COMPRESSORS[compressor]
+        if self.codec.endswith('-mm'):
+            img = decode_fn(self.data[step][camera], np.uint16, self.shape[2:])
+            return np.float32(img) / np.float32(DEPTH_SCALE)
+        return decode_fn(self.data[step][camera], self.dtype, self.shape[2:])
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, step):
+        if step < 0:
+            step += len(self.data)
+        return EncodedStep(self, step)
+
+
+class EncodedStep:
+    """Images of all cameras at a single step, decoded on access."""
+
+    def __init__(self, images, step):
+        self._images = images
+        self._step = step
+        self.shape = images.shape[1:]
+        self.dtype = images.dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, camera):
+        return self._images.decode(self._step, camera)
+
+    def __iter__(self):
+        for camera in range(len(self)):
+            yield self[camera]
+
+    def __array__(self, dtype=None, copy=None):
+        images = np.stack(list(self))
+        return images if dtype is None else images.astype(dtype)
@@ -0,0 +1,110 @@
+"""Incremental top-down occupancy map of the objects in the workspace."""
+
+import cv2
+import numpy as np
+
+
+class OccupancyMap:
+    """Occupancy grid aligned with the task heightmaps, for sampling free poses.
+
+    `Task.get_random_pose` used to render the oracle camera and rebuild the
+    free-space mask for every object it places. The map is instead seeded with
+    the segmentation mask of a single render, then objects added afterwards
+    only mark the cells under their axis-aligned bounding box (AABB). Objects
+    that move are re-projected from their AABB and objects that disappear are
+    cleared, see `sync`.
+
+    Every object keeps its own footprint, and cells count the objects covering
+    them, so footprints can be removed again. Eroded free-space masks are
+    cached per erosion size until the map changes.
+    """
+
+    def __init__(self, bounds, pixel_size):
+        self.bounds = bounds
+        self.pixel_size = pixel_size
+        width = int(np.round((bounds[0, 1] - bounds[0, 0]) / pixel_size))
+        height = int(np.round((bounds[1, 1] - bounds[1, 0]) / pixel_size))
+        self.shape = (height, width)
+        self.reset()
+
+    def reset(self):
+        """Forget all objects, e.g. when the scene is reset."""
+        self.counts = None
+        self.footprints = {}
+        self.poses = {}
+        self.version = 0
+        self._free = {}
+
+    @property
+    def seeded(self):
+        return self.counts is not None
+
+    def seed(self, obj_mask, poses):
+        """Initialize the map from a rendered segmentation mask.
+
+        Args:
+          obj_mask: HxW int array of object ids, e.g. from `Task.get_true_image`.
+          poses: dict of the current (position, rotation) of the objects to
+            track. Pixels of other ids (plane, robot) are free.
+        """
+        self.reset()
+        self.counts = np.zeros(self.shape, dtype=np.int32)
+        for obj_id, pose in poses.items():
+            self._set(obj_id, np.nonzero(obj_mask == obj_id), pose)
+
+    def add(self, obj_id, pose, aabb):
+        """Mark the cells under the AABB ((min xyz), (max xyz)) of an object."""
+        (x0, y0, _), (x1, y1, _) = aabb
+        height, width = self.shape
+        c0, c1 = [int(np.floor((x - self.bounds[0, 0]) / self.pixel_size)) for x in (x0, x1)]
+        r0, r1 = [int(np.floor((y - self.bounds[1, 0]) / self.pixel_size)) for y in (y0, y1)]
+        rows = slice(np.clip(r0, 0, height), np.clip(r1 + 1, 0, height))
+        cols = slice(np.clip(c0, 0, width), np.clip(c1 + 1, 0, width))
+        self._set(obj_id, (rows, cols), pose)
+
+    def remove(self, obj_id):
+        if obj_id in self.footprints:
+            self.counts[self.footprints.pop(obj_id)] -= 1
+            self.poses.pop(obj_id)
+            self._changed()
+
+    def sync(self, poses, get_aabb, atol=1e-4):
+        """Update the map to the current objects.
+
+        Args:
+          poses: dict of the current (position, rotation) of all objects.
+          get_aabb: function returning the AABB of an object id, e.g. `p.getAABB`.
+          atol: tolerance on position and rotation below which an object is
+            considered not moved.
+        """
+        for obj_id in [obj_id for obj_id in self.footprints if obj_id not in poses]:
+            self.remove(obj_id)
+        for obj_id, pose in poses.items():
+            last = self.poses.get(obj_id)
+            if last is None or not (np.allclose(pose[0], last[0], atol=atol) and
+                                    np.allclose(pose[1], last[1], atol=atol)):
+                self.add(obj_id, pose, get_aabb(obj_id))
+
+    def get_free(self, erode_size):
+        """Free-space mask eroded by an erode_size x erode_size kernel.
+
+        Cells on the border of the workspace are never free. The returned mask
+        is cached and must not be modified.
+        """
+        if erode_size not in self._free:
+            free = np.uint8(self.counts == 0)
+            free[0, :], free[:, 0], free[-1, :], free[:, -1] = 0, 0, 0, 0
+            self._free[erode_size] = cv2.erode(free, np.ones((erode_size, erode_size), np.uint8))
+        return self._free[erode_size]
+
+    def _set(self, obj_id, footprint, pose):
+        if obj_id in self.footprints:
+            self.counts[self.footprints[obj_id]] -= 1
+        self.counts[footprint] += 1
+        self.footprints[obj_id] = footprint
+        self.poses[obj_id] = (tuple(pose[0]), tuple(pose[1]))
+        self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._free = {}
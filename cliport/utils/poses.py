@@ -0,0 +1,141 @@
+"""Vectorized rigid transform (SE(3)) math on arrays of poses.
+
+Batched NumPy counterparts of `utils.invert`, `utils.multiply`, `utils.apply`,
+`utils.eulerXYZ_to_quatXYZW` and `utils.quatXYZW_to_eulerXYZ`, which go
+through PyBullet or transforms3d one pose at a time.
+
+Positions have shape (..., 3) and quaternions (..., 4) in xyzw order like
+PyBullet. Leading dimensions are broadcast, so a single pose can be composed
+with N poses. Euler angles use the same convention as `utils`: a rotation
+about z, then x, then y in the static frame (transforms3d's 'szxy' axes).
+"""
+
+import numpy as np
+
+# Threshold of transforms3d's mat2euler below which the rotation is in gimbal lock.
+_GIMBAL_EPS = np.finfo(np.float64).eps * 4.0
+
+
+def as_poses(poses):
+    """Split a list of (position, quaternion) poses into (N, 3) and (N, 4) arrays.
+
+    Poses given as a position only get the identity rotation, like targets in
+    `Task.goals`.
+    """
+    positions, quaternions = [], []
+    for pose in poses:
+        if len(pose) == 3 and not hasattr(pose[0], '__len__'):
+            pose = (pose, (0, 0, 0, 1))
+        positions.append(pose[0])
+        quaternions.append(pose[1])
+    return (np.array(positions, dtype=np.float64).reshape(-1, 3),
+            np.array(quaternions, dtype=np.float64).reshape(-1, 4))
+
+
+def quat_multiply(q0, q1):
+    """Hamilton product q0 * q1 of xyzw quaternions."""
+    x0, y0, z0, w0 = np.moveaxis(np.asarray(q0, dtype=np.float64), -1, 0)
+    x1, y1, z1, w1 = np.moveaxis(np.asarray(q1, dtype=np.float64), -1, 0)
+    return np.stack([w0 * x1 + x0 * w1 + y0 * z1 - z0 * y1,
+                     w0 * y1 - x0 * z1 + y0 * w1 + z0 * x1,
+                     w0 * z1 + x0 * y1 - y0 * x1 + z0 * w1,
+                     w0 * w1 - x0 * x1 - y0 * y1 - z0 * z1], axis=-1)
+
+
+def quat_conjugate(q):
+    """Conjugate of xyzw quaternions, the inverse rotation of unit quaternions."""
+    return np.asarray(q, dtype=np.float64) * np.array([-1., -1., -1., 1.])
+
+
+def quat_to_matrix(q):
+    """Rotation matrices (..., 3, 3) of xyzw quaternions, normalized first."""
+    q = np.asarray(q, dtype=np.float64)
+    x, y, z, w = np.moveaxis(q, -1, 0)
+    norm = np.sum(q * q, axis=-1)
+    s = np.where(norm > 0, 2. / np.where(norm > 0, norm, 1.), 0.)
+    xx, yy, zz = s * x * x, s * y * y, s * z * z
+    xy, xz, yz = s * x * y, s * x * z, s * y * z
+    wx, wy, wz = s * w * x, s * w * y, s * w * z
+    return np.stack([np.stack([1. - (yy + zz), xy - wz, xz + wy], axis=-1),
+                     np.stack([xy + wz, 1. - (xx + zz), yz - wx], axis=-1),
+                     np.stack([xz - wy, yz + wx, 1. - (xx + yy)], axis=-1)], axis=-2)
+
+
+def quat_rotate(q, v):
+    """Rotate vectors v (..., 3) by unit xyzw quaternions q (..., 4)."""
+    q = np.asarray(q, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    u, w = q[Ellipsis, :3], q[Ellipsis, 3:]
+    t = 2. * np.cross(u, v)
+    return v + w * t + np.cross(u, t)
+
+
+def multiply(position0, quaternion0, position1, quaternion1):
+    """Compose poses: pose0 * pose1, like `p.multiplyTransforms`.
+
+    Quaternions may differ from PyBullet's in sign, which is the same rotation.
+    """
+    position = np.asarray(position0, dtype=np.float64) + quat_rotate(quaternion0, position1)
+    return position, quat_multiply(quaternion0, quaternion1)
+
+
+def invert(position, quaternion):
+    """Inverse of poses, like `p.invertTransform`."""
+    inverse = quat_conjugate(quaternion)
+    return -quat_rotate(inverse, position), inverse
+
+
+def apply(position, quaternion, points):
+    """Transform points (..., 3) by poses, like `utils.apply` with points as rows."""
+    return quat_rotate(quaternion, points) + np.asarray(position, dtype=np.float64)
+
+
+def euler_to_quat(rotation):
+    """Convert (..., 3) xyz euler angles to (..., 4) xyzw quaternions.
+
+    Batched `utils.eulerXYZ_to_quatXYZW`.
+    """
+    rotation = np.asarray(rotation, dtype=np.float64)
+    x, y, z = np.moveaxis(rotation, -1, 0) / 2.
+    ci, si = np.cos(z), np.sin(z)
+    cj, sj = np.cos(x), np.sin(x)
+    ck, sk = np.cos(y), np.sin(y)
+    cc, cs, sc, ss = ci * ck, ci * sk, si * ck, si * sk
+    return np.stack([cj * ss + sj * cc,
+                     cj * cs - sj * sc,
+                     cj * sc - sj * cs,
+                     cj * cc + sj * ss], axis=-1)
+
+
+def quat_to_euler(quaternion):
+    """Convert (..., 4) xyzw quaternions to (..., 3) xyz euler angles.
+
+    Batched `utils.quatXYZW_to_eulerXYZ`, including its handling of gimbal lock.
+    """
+    m = quat_to_matrix(quaternion)
+    cy = np.sqrt(m[Ellipsis, 2, 2] ** 2 + m[Ellipsis, 0, 2] ** 2)
+    locked = cy <= _GIMBAL_EPS
+    x = np.arctan2(-m[Ellipsis, 1, 2], cy)
+    y = np.where(locked, 0., np.arctan2(m[Ellipsis, 0, 2], m[Ellipsis, 2, 2]))
+    z = np.where(locked, np.arctan2(-m[Ellipsis, 0, 1], m[Ellipsis, 0, 0]),
+                 np.arctan2(m[Ellipsis, 1, 0], m[Ellipsis, 1, 1]))
+    return np.stack([x, y, z], axis=-1)
+
+
+def quat_to_yaw(quaternion):
+    """Rotation about z of xyzw quaternions, `quat_to_euler(quaternion)[..., 2]`."""
+    return quat_to_euler(quaternion)[Ellipsis, 2]
+
+
+def yaw_distance(yaw0, yaw1, symmetry):
+    """Absolute difference of yaw angles modulo the rotational symmetry of an object.
+
+    Objects with symmetry <= 0 are treated as fully symmetric (distance 0), like
+    `Task.is_match`.
+    """
+    symmetry = np.asarray(symmetry, dtype=np.float64)
+    symmetric = symmetry > 0
+    period = np.where(symmetric, symmetry, 1.)
+    diff = np.abs(np.asarray(yaw0) - np.asarray(yaw1)) % period
+    diff = np.where(diff > period / 2, period - diff, diff)
+    return np.where(symmetric, diff, 0.)
@@ -0,0 +1,83 @@
+"""Content-addressed cache of filled URDF templates."""
+
+import atexit
+import collections
+import hashlib
+import os
+import random
+import shutil
+import string
+import tempfile
+
+
+class TemplateCache:
+    """Filled URDF templates written once per distinct content.
+
+    Filled files are named after a hash of their content, so filling a template
+    with the same values returns the same file. PyBullet then sees the same
+    path for the same object, and with file caching enabled it parses the
+    referenced meshes once. Template sources are read from disk once.
+
+    Files live in a private directory that is removed when the process exits.
+    At most `max_files` filled files are kept; the least recently used are
+    deleted first. Bodies already loaded from a deleted file are unaffected.
+    """
+
+    def __init__(self, max_files=2048, cache_dir=None):
+        self.max_files = max_files
+        self.cache_dir = cache_dir if cache_dir else tempfile.mkdtemp(prefix='cliport_urdf_')
+        self._owner_pid = os.getpid()
+        self._sources = {}
+        self._files = collections.OrderedDict()
+        atexit.register(self.cleanup)
+
+    def read(self, template_path):
+        """Return the text of a template file, read on first use."""
+        if template_path not in self._sources:
+            with open(template_path, 'r') as file:
+                self._sources[template_path] = file.read()
+        return self._sources[template_path]
+
+    def write(self, template_path, fdata):
+        """Return the path of a file holding fdata, written if not cached yet."""
+        # Filled files used to get random names. Keep drawing them, so that the
+        # python random state and thus seeded scenes stay the same.
+        random.choices(string.ascii_lowercase + string.digits, k=16)
+
+        digest = hashlib.sha1(fdata.encode()).hexdigest()[:16]
+        if digest in self._files:
+            self._files.move_to_end(digest)
+            return self._files[digest]
+
+        template_filename = os.path.split(template_path)[-1]
+        fname = os.path.join(self.cache_dir, f'{template_filename}.{digest}')
+        tmp_fname = f'{fname}.tmp'
+        with open(tmp_fname, 'w') as file:
+            file.write(fdata)
+        os.replace(tmp_fname, fname)
+        self._files[digest] = fname
+
+        while len(self._files) > self.max_files:
+            _, old_fname = self._files.popitem(last=False)
+            try:
+                os.remove(old_fname)
+            except OSError:
+                pass
+        return fname
+
+    def cleanup(self):
+        """Remove the cache directory. Forked children leave it to the parent."""
+        if os.getpid() == self._owner_pid:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self._files.clear()
+
+
+_template_cache = None
+
+
+def get_template_cache():
+    """Template cache of the current process."""
+    global _template_cache
+    if _template_cache is None or _template_cache._owner_pid != os.getpid():
+        _template_cache = TemplateCache()
+    return _template_cache
@@ -79,11 +79,8 @@ def get_pointcloud(depth, intrinsics):
       points: HxWx3 float array of 3D points in camera coordinates.
     """
     height, width = depth.shape
-    xlin = np.linspace(0, width - 1, width)
-    ylin = np.linspace(0, height - 1, height)
-    px, py = np.meshgrid(xlin, ylin)
-    px = (px - intrinsics[0, 2]) * (depth / intrinsics[0, 0])
-    py = (py - intrinsics[1, 2]) * (depth / intrinsics[1, 1])
+    px = (np.arange(width) - intrinsics[0, 2]) * (depth / intrinsics[0, 0])
+    py = (np.arange(height)[:, None] - intrinsics[1, 2]) * (depth / intrinsics[1, 1])
     points = np.float32([px, py, depth]).transpose(1, 2, 0)
     return points
 
@@ -98,11 +95,61 @@ def transform_pointcloud(points, transform):
     Returns:
       points: HxWx3 float array of transformed 3D points.
     """
-    padding = ((0, 0), (0, 0), (0, 1))
-    homogen_points = np.pad(points.copy(), padding,
-                            'constant', constant_values=1)
-    for i in range(3):
-        points[Ellipsis, i] = np.sum(transform[i, :] * homogen_points, axis=-1)
+    points[Ellipsis, :] = points @ transform[:3, :3].T + transform[:3, 3]
+    return points
+
+
+# Ray tables of the cameras seen so far, keyed by camera config and image size.
+_CAMERA_RAYS = {}
+
+
+def get_camera_rays(config, image_size):
+    """Get the world-frame ray of every pixel of a static camera.
+
+    Rays are scaled to unit length along the optical axis, so the world point
+    of a pixel with perspective depth d is `d * ray + origin`. Tables are
+    computed once per camera config and cached.
+
+    Args:
+      config: camera config with intrinsics, position and rotation, see
+        `cameras.RealSenseD415.CONFIG`.
+      image_size: (H, W) of the depth images.
+
+    Returns:
+      rays: 3xN float32 array (rows: X,Y,Z) of the N=H*W pixels in row-major order.
+      origin: 3x1 float32 array of the camera position.
+    """
+    key = (tuple(np.ravel(config['intrinsics'])), tuple(config['position']),
+           tuple(config['rotation']), tuple(image_size))
+    if key not in _CAMERA_RAYS:
+        height, width = image_size
+        intrinsics = np.array(config['intrinsics']).reshape(3, 3)
+        px, py = np.meshgrid(np.arange(width), np.arange(height))
+        rays = np.stack([(px.ravel() - intrinsics[0, 2]) / intrinsics[0, 0],
+                         (py.ravel() - intrinsics[1, 2]) / intrinsics[1, 1],
+                         np.ones(height * width)])
+        rotation = np.array(p.getMatrixFromQuaternion(config['rotation'])).reshape(3, 3)
+        rays = np.float32(rotation @ rays)
+        origin = np.float32(config['position']).reshape(3, 1)
+        rays.setflags(write=False)
+        origin.setflags(write=False)
+        _CAMERA_RAYS[key] = rays, origin
+    return _CAMERA_RAYS[key]
+
+
+def get_world_points(depth, config):
+    """Get 3D points in world coordinates from a perspective depth image.
+
+    Args:
+      depth: HxW float array of perspective depth in meters.
+      config: camera config the depth image was rendered with.
+
+    Returns:
+      points: 3xN float32 array (rows: X,Y,Z) of the N=H*W pixels in row-major order.
+    """
+    rays, origin = get_camera_rays(config, np.shape(depth))
+    points = rays * np.float32(depth).reshape(1, -1)
+    points += origin
     return points
 
 
@@ -110,37 +157,179 @@ def reconstruct_heightmaps(color, depth, configs, bounds, pixel_size):
     """Reconstruct top-down heightmap views from multiple 3D pointclouds."""
     heightmaps, colormaps = [], []
     for color, depth, config in zip(color, depth, configs):
-        intrinsics = np.array(config['intrinsics']).reshape(3, 3)
-        xyz = get_pointcloud(depth, intrinsics)
-        position = np.array(config['position']).reshape(3, 1)
-        rotation = p.getMatrixFromQuaternion(config['rotation'])
-        rotation = np.array(rotation).reshape(3, 3)
-        transform = np.eye(4)
-        transform[:3, :] = np.hstack((rotation, position))
-        xyz = transform_pointcloud(xyz, transform)
+        xyz = get_world_points(depth, config).T
+        color = np.asarray(color).reshape(xyz.shape[0], -1)
         heightmap, colormap = get_heightmap(xyz, color, bounds, pixel_size)
         heightmaps.append(heightmap)
         colormaps.append(colormap)
     return heightmaps, colormaps
 
 
+def reconstruct_fused_heightmap(color, depth, configs, bounds, pixel_size):
+    """Reconstruct the fused top-down heightmap of multiple views in one pass.
+
+    Gives the same maps as fusing the per-view maps of `reconstruct_heightmaps`
+    (mean color over the views that see a cell, max height), but processes the
+    in-bounds points of all views at once and replaces the per-view z-sort with
+    a scatter-max: heights are scatter-maxed per view and cell, and the color of
+    the highest point of each view and cell is scattered into small per-view
+    buffers that are reduced into the final maps.
+
+    Returns:
+      cmap: HxWx3 uint8 fused colormap.
+      hmap: HxW float32 fused heightmap.
+    """
+    width = int(np.round((bounds[0, 1] - bounds[0, 0]) / pixel_size))
+    height = int(np.round((bounds[1, 1] - bounds[1, 0]) / pixel_size))
+    n_cells = width * height
+
+    # Points of each view as rows of x, y and z, which keeps every step below
+    # contiguous. Points outside of the predefined bounds are filtered out
+    # per view, before the (much smaller) valid points are concatenated.
+    keys, z, colors = [], [], []
+    for view, (view_color, view_depth, config) in enumerate(zip(color, depth, configs)):
+        points = get_world_points(view_depth, config)
+        valid = (points[0] >= bounds[0, 0]) & (points[0] < bounds[0, 1])
+        for i in range(1, 3):
+            valid &= (points[i] >= bounds[i, 0]) & (points[i] < bounds[i, 1])
+        points = points[:, valid]
+
+        px = np.int32(np.floor((points[0] - bounds[0, 0]) / pixel_size))
+        py = np.int32(np.floor((points[1] - bounds[1, 0]) / pixel_size))
+        px = np.clip(px, 0, width - 1)
+        py = np.clip(py, 0, height - 1)
+        keys.append(view * n_cells + py * width + px)
+        z.append(np.float32(points[2] - bounds[2, 0]))
+        colors.append(np.asarray(view_color).reshape(valid.shape[0], -1)[valid])
+    n_views = len(keys)
+    keys, z, colors = np.concatenate(keys), np.concatenate(z), np.concatenate(colors)
+
+    # Height of the highest point of each view and cell.
+    view_hmaps = np.zeros(n_views * n_cells, dtype=np.float32)
+    np.maximum.at(view_hmaps, keys, z)
+
+    # Color of the highest point of each view and cell.
+    top = z == view_hmaps[keys]
+    view_cmaps = np.zeros((n_views * n_cells, colors.shape[-1]), dtype=np.uint8)
+    view_cmaps[keys[top]] = colors[top]
+
+    # Fuse maps from different views.
+    view_cmaps = view_cmaps.reshape(n_views, n_cells, -1)
+    repeat = np.maximum(np.sum(np.any(view_cmaps > 0, axis=2), axis=0), 1)
+    cmap = np.sum(view_cmaps, axis=0, dtype=np.float32) / np.float32(repeat[:, None])
+    cmap = np.uint8(np.round(cmap)).reshape(height, width, -1)
+    hmap = view_hmaps.reshape(n_views, n_cells).max(axis=0).reshape(height, width)
+    return cmap, hmap
+
+
+def _float32_ceil(value):
+    """Smallest float32 >= value, so float32 x >= value iff x >= _float32_ceil(value)."""
+    rounded = np.float32(value)
+    return float(np.nextafter(rounded, np.float32(np.inf)) if rounded < value else rounded)
+
+
+def reconstruct_fused_heightmap_batch(color, depth, configs, bounds, pixel_size):
+    """Torch version of `reconstruct_fused_heightmap` for a batch of observations.
+
+    Runs the same scatter-max on CPU (or GPU) tensors for the B observations
+    at once, so that it uses torch's intra-op parallelism. Ties between points
+    of equal height are broken like the NumPy version (the last point wins),
+    which gives the same maps.
+
+    Args:
+      color: BxVxHxWxC uint8 array or tensor of the V camera images.
+      depth: BxVxHxW float array or tensor of perspective depth in meters.
+      configs: the V camera configs.
+
+    Returns:
+      cmap: BxH'xW'xC uint8 tensor of fused colormaps.
+      hmap: BxH'xW' float32 tensor of fused heightmaps.
+    """
+    color, depth = torch.as_tensor(color), torch.as_tensor(depth, dtype=torch.float32)
+    device = depth.device
+    width = int(np.round((bounds[0, 1] - bounds[0, 0]) / pixel_size))
+    height = int(np.round((bounds[1, 1] - bounds[1, 0]) / pixel_size))
+    n_cells = width * height
+    batch_size, n_views = depth.shape[:2]
+
+    rays, origins = zip(*[get_camera_rays(config, depth.shape[2:]) for config in configs])
+    rays = torch.tensor(np.stack(rays).transpose(1, 0, 2), device=device)[:, None]
+    origins = torch.tensor(np.stack(origins).transpose(1, 0, 2), device=device)[:, None]
+    n_points = rays.shape[-1]
+    points = depth.reshape(1, batch_size, n_views, n_points) * rays + origins
+
+    # Filter out 3D points that are outside of the predefined bounds. The
+    # float64 bounds are rounded up to float32 to compare like NumPy does.
+    valid = None
+    for i in range(3):
+        lo, hi = [_float32_ceil(bound) for bound in bounds[i]]
+        in_bounds = (points[i] >= lo) & (points[i] < hi)
+        valid = in_bounds if valid is None else valid & in_bounds
+    valid = torch.nonzero(valid.reshape(-1)).squeeze(1)
+    x, y, z = [points[i].reshape(-1)[valid].double() for i in range(3)]
+
+    px = torch.floor((x - bounds[0, 0]) / pixel_size).long().clamp(0, width - 1)
+    py = torch.floor((y - bounds[1, 0]) / pixel_size).long().clamp(0, height - 1)
+    z = (z - bounds[2, 0]).float()
+    keys = torch.div(valid, n_points, rounding_mode='floor') * n_cells + py * width + px
+    colors = color.reshape(-1, color.shape[-1])[valid]
+
+    # Height of the highest point of each view and cell.
+    view_hmaps = torch.zeros(batch_size * n_views * n_cells, dtype=torch.float32, device=device)
+    view_hmaps.scatter_reduce_(0, keys, z, reduce='amax')
+
+    # Color of the last of the highest points of each view and cell.
+    top = z == view_hmaps[keys]
+    winner = torch.full_like(view_hmaps, -1, dtype=torch.long)
+    winner.scatter_reduce_(0, keys[top], torch.nonzero(top).squeeze(1), reduce='amax')
+    seen = winner >= 0
+    view_cmaps = torch.zeros((batch_size * n_views * n_cells, colors.shape[-1]), dtype=torch.uint8, device=device)
+    view_cmaps[seen] = colors[winner[seen]]
+
+    # Fuse maps from different views.
+    view_cmaps = view_cmaps.reshape(batch_size, n_views, n_cells, -1)
+    repeat = torch.any(view_cmaps > 0, dim=3).sum(dim=1).clamp(min=1)
+    cmap = view_cmaps.sum(dim=1, dtype=torch.float32) / repeat[Ellipsis, None].float()
+    cmap = torch.round(cmap).to(torch.uint8).reshape(batch_size, height, width, -1)
+    hmap = view_hmaps.reshape(batch_size, n_views, n_cells).amax(dim=1).reshape(batch_size, height, width)
+    return cmap, hmap
+
+
 def pix_to_xyz(pixel, height, bounds, pixel_size, skip_height=False):
     """Convert from pixel location on heightmap to 3D position."""
-    u, v = pixel
-    x = bounds[0, 0] + v * pixel_size
-    y = bounds[1, 0] + u * pixel_size
-    if not skip_height:
-        z = bounds[2, 0] + height[u, v]
-    else:
-        z = 0.0
+    x, y, z = pix_to_xyz_batch([pixel], height, bounds, pixel_size, skip_height)[0]
     return (x, y, z)
 
 
 def xyz_to_pix(position, bounds, pixel_size):
     """Convert from 3D position to pixel location on heightmap."""
-    u = int(np.round((position[1] - bounds[1, 0]) / pixel_size))
-    v = int(np.round((position[0] - bounds[0, 0]) / pixel_size))
-    return (u, v)
+    u, v = xyz_to_pix_batch([position[:2]], bounds, pixel_size)[0]
+    return (int(u), int(v))
+
+
+def pix_to_xyz_batch(pixels, height, bounds, pixel_size, skip_height=False):
+    """Convert (N, 2) pixel locations on heightmap to (N, 3) 3D positions.
+
+    Heights are looked up in the heightmap unless it is None or skip_height is
+    set, then z is 0.
+    """
+    pixels = np.asarray(pixels).reshape(-1, 2)
+    u, v = pixels[:, 0], pixels[:, 1]
+    xyz = np.zeros((len(pixels), 3), dtype=np.float64)
+    xyz[:, 0] = bounds[0, 0] + v * pixel_size
+    xyz[:, 1] = bounds[1, 0] + u * pixel_size
+    if height is not None and not skip_height:
+        xyz[:, 2] = bounds[2, 0] + np.float64(np.asarray(height)[u, v])
+    return xyz
+
+
+def xyz_to_pix_batch(positions, bounds, pixel_size):
+    """Convert (N, 2) or (N, 3) 3D positions to (N, 2) int pixel locations on heightmap."""
+    positions = np.asarray(positions, dtype=np.float64)
+    positions = positions.reshape(-1, positions.shape[-1])
+    u = np.round((positions[:, 1] - bounds[1, 0]) / pixel_size)
+    v = np.round((positions[:, 0] - bounds[0, 0]) / pixel_size)
+    return np.int64(np.stack([u, v], axis=1))
 
 
 def unproject_vectorized(uv_coordinates, depth_values,
@@ -211,8 +400,10 @@ def unproject_depth_vectorized(im_depth, depth_dist,
 def sample_distribution(prob, n_samples=1):
     """Sample data point from a custom distribution."""
     flat_prob = prob.flatten() / np.sum(prob)
-    rand_ind = np.random.choice(
-        np.arange(len(flat_prob)), n_samples, p=flat_prob, replace=False)
+    # Sample among non-zero entries only, which draws the same samples.
+    support = np.flatnonzero(flat_prob)
+    rand_ind = support[np.random.choice(
+        len(support), n_samples, p=flat_prob[support], replace=False)]
     rand_ind_coords = np.array(np.unravel_index(rand_ind, prob.shape)).T
     return np.int32(rand_ind_coords.squeeze())
 
@@ -398,6 +589,16 @@ def deprocess(img):
 
 def get_fused_heightmap(obs, configs, bounds, pix_size):
     """Reconstruct orthographic heightmaps with segmentation masks."""
+    return reconstruct_fused_heightmap(obs['color'], obs['depth'], configs, bounds, pix_size)
+
+
+def get_fused_heightmap_batch(obs, configs, bounds, pix_size):
+    """Batched `get_fused_heightmap`: obs holds BxVxHxW[xC] color and depth."""
+    return reconstruct_fused_heightmap_batch(obs['color'], obs['depth'], configs, bounds, pix_size)
+
+
+def get_fused_heightmap_reference(obs, configs, bounds, pix_size):
+    """Per-view implementation of `get_fused_heightmap`, kept for tests and benchmarks."""
     heightmaps, colormaps = reconstruct_heightmaps(
         obs['color'], obs['depth'], configs, bounds, pix_size)
     colormaps = np.float32(colormaps)
@@ -496,40 +697,54 @@ def q_mult(q1, q2):
     z = w1 * z2 + z1 * w2 + x1 * y2 - y1 * x2
     return (w, x, y, z)
 
-def perturb(input_image, pixels, theta_sigma=60, add_noise=False):
-    """Data augmentation on images."""
-    image_size = input_image.shape[:2]
+def sample_perturb_params(pixels, image_size, theta_sigma=60, n_candidates=16):
+    """Sample a random rigid transform that keeps all pixels in the image.
 
-    # Compute random rigid transform.
+    Vectorized version of rejection sampling: `n_candidates` transforms are
+    drawn and checked at once, and the first valid one is used.
+
+    Returns:
+      transform_params: [theta, trans_x, trans_y, pivot_x, pivot_y].
+      new_pixels: transformed pixels.
+      new_rounded_pixels: transformed pixels rounded to integers.
+    """
+    image_size = tuple(image_size)
+    pixels = np.float32(pixels).reshape(-1, 2)
+    pivot = np.float32([image_size[1] / 2, image_size[0] / 2])
+    trans_sigma = np.min(image_size) / 6
     while True:
-        theta, trans, pivot = get_random_image_transform_params(image_size, theta_sigma=theta_sigma)
-        transform = get_image_transform(theta, trans, pivot)
-        transform_params = theta, trans, pivot
+        theta = np.random.normal(0, np.deg2rad(theta_sigma), size=n_candidates)
+        trans = np.random.normal(0, trans_sigma, size=(n_candidates, 2))  # [x, y]
 
-        # Ensure pixels remain in the image after transform.
-        is_valid = True
-        new_pixels = []
-        new_rounded_pixels = []
-        for pixel in pixels:
-            pixel = np.float32([pixel[1], pixel[0], 1.]).reshape(3, 1)
+        # Rotate (x, y) = (col, row) around pivot and translate, for every candidate.
+        cos, sin = np.cos(theta)[:, None], np.sin(theta)[:, None]
+        x, y = pixels[None, :, 1] - pivot[0], pixels[None, :, 0] - pivot[1]
+        new_x = cos * x - sin * y + pivot[0] + trans[:, 0:1]
+        new_y = sin * x + cos * y + pivot[1] + trans[:, 1:2]
+        new_pixels = np.stack((new_y, new_x), axis=-1)  # (n_candidates, n_pixels, [row, col])
+        new_rounded_pixels = np.int32(np.round(new_pixels))
 
-            rounded_pixel = np.int32(np.round(transform @ pixel))[:2].squeeze()
-            rounded_pixel = np.flip(rounded_pixel)
+        # Ensure pixels remain in the image after transform.
+        size = np.array(image_size)
+        is_valid = np.all((new_pixels >= 0) & (new_pixels < size) &
+                          (new_rounded_pixels >= 0) & (new_rounded_pixels < size), axis=(1, 2))
+        if np.any(is_valid):
+            i = np.argmax(is_valid)
+            break
 
-            pixel = (transform @ pixel)[:2].squeeze()
-            pixel = np.flip(pixel)
+    transform_params = np.array([theta[i], trans[i, 0], trans[i, 1], pivot[0], pivot[1]])
+    return transform_params, list(new_pixels[i]), list(new_rounded_pixels[i])
 
-            in_fov_rounded = rounded_pixel[0] < image_size[0] and rounded_pixel[
-                1] < image_size[1]
-            in_fov = pixel[0] < image_size[0] and pixel[1] < image_size[1]
 
-            is_valid = is_valid and np.all(rounded_pixel >= 0) and np.all(
-                pixel >= 0) and in_fov_rounded and in_fov
+def perturb(input_image, pixels, theta_sigma=60, add_noise=False):
+    """Data augmentation on images."""
+    image_size = input_image.shape[:2]
 
-            new_pixels.append(pixel)
-            new_rounded_pixels.append(rounded_pixel)
-        if is_valid:
-            break
+    # Compute random rigid transform.
+    transform_params, new_pixels, new_rounded_pixels = sample_perturb_params(
+        pixels, image_size, theta_sigma=theta_sigma)
+    theta, trans, pivot = transform_params[0], transform_params[1:3], transform_params[3:5]
+    transform = get_image_transform(theta, trans, pivot)
 
     # Apply rigid transform to image and pixel labels.
     input_image = cv2.warpAffine(
@@ -548,9 +763,6 @@ def perturb(input_image, pixels, theta_sigma=60, add_noise=False):
         depth += np.float32(np.random.normal(0, 0.003, image_size + (3,)))
 
     input_image = np.concatenate((color, depth), axis=2)
-
-    # length of 5
-    transform_params = np.array([theta, trans[0], trans[1], pivot[0], pivot[1]])
     return input_image, new_pixels, new_rounded_pixels, transform_params
 
 
@@ -569,6 +781,35 @@ def apply_perturbation(input_image, transform_params):
     return input_image
 
 
+def batch_apply_perturbation(images, transform_params):
+    """Torch version of `apply_perturbation` for a batch of images.
+
+    Args:
+      images: (B, H, W, C) tensor.
+      transform_params: (B, 5) tensor of [theta, trans_x, trans_y, pivot_x, pivot_y]
+        as returned by `perturb` and `sample_perturb_params`.
+
+    Returns:
+      (B, H, W, C) float tensor, warped like `cv2.warpAffine` with bilinear
+      interpolation and zero padding.
+    """
+    _, h, w, _ = images.shape
+    transform_params = transform_params.to(images.device, torch.float32)
+    theta, trans, pivot = transform_params[:, 0], transform_params[:, 1:3], transform_params[:, 3:5]
+    cos, sin = torch.cos(theta), torch.sin(theta)
+
+    # Same as get_image_transform: rotate around pivot, then translate.
+    M = torch.stack((
+        torch.stack((cos, -sin, trans[:, 0] + pivot[:, 0] - cos * pivot[:, 0] + sin * pivot[:, 1]), dim=1),
+        torch.stack((sin, cos, trans[:, 1] + pivot[:, 1] - sin * pivot[:, 0] - cos * pivot[:, 1]), dim=1),
+    ), dim=1)
+
+    images = images.float().permute(0, 3, 1, 2)
+    images = kornia.geometry.transform.warp_affine(images, M, dsize=(h, w), mode='bilinear',
+                                                   padding_mode='zeros', align_corners=True)
+    return images.permute(0, 2, 3, 1)
+
+
 class ImageRotator:
     """Rotate for n rotations."""
     # Reference: https://kornia.readthedocs.io/en/latest/tutorials/warp_affine.html?highlight=rotate
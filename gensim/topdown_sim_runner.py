@@ -40,6 +40,10 @@ class TopDownSimulationRunner:
         self.env_pass_rate = 0
         self.curr_trials = 0
 
+        # The environment of the current task. Only one is alive at a time, so
+        # that it holds client 0, which generated tasks use through `p`.
+        self.env = None
+
         self.prompt_folder = f"prompts/{cfg['prompt_folder']}"
         self.chat_log = memory.chat_log
         self.task_asset_logs = []
@@ -112,8 +116,10 @@ class TopDownSimulationRunner:
                 disp=self.cfg['disp'],
                 shared_memory=self.cfg['shared_memory'],
                 hz=480,
-                record_cfg=self.cfg['record']
+                record_cfg=self.cfg['record'],
+                render_obs=False  # the runtime test only needs rewards
             )
+        self.env = env
 
         task = eval(self.curr_task_name)()
         task.mode = self.cfg['mode']
@@ -171,8 +177,9 @@ class TopDownSimulationRunner:
         seed = 123
         self.curr_trials += 1
 
-        if p.isConnected():
-            p.disconnect()
+        if self.env is not None:
+            self.env.close()
+            self.env = None
 
         if not self.task_creation_pass:
             print("task creation failure => count as syntax exceptions.")
@@ -0,0 +1,99 @@
+"""Compare disk size and decoding throughput of the dataset image codecs.
+
+Usage:
+  python scripts/benchmark_dataset_codecs.py --data_dir data --task stack-block-pyramid --mode train
+"""
+
+import os
+import time
+import pickle
+import argparse
+import tempfile
+
+import numpy as np
+
+from cliport.dataset import RavensDataset
+from cliport.utils import image_codecs
+
+
+def load_raw_episodes(path, n_episodes):
+    cfg = {'dataset': {'images': True, 'cache': False}}
+    ds = RavensDataset(path, cfg, n_demos=0, augment=False)
+    episodes = []
+    for episode_id in range(min(n_episodes, ds.n_episodes)):
+        episode, _ = ds.load(episode_id, images=True, cache=False)
+        color = np.uint8([np.asarray(obs['color']) for obs, _, _, _ in episode])
+        depth = np.float32([np.asarray(obs['depth']) for obs, _, _, _ in episode])
+        episodes.append((color, depth))
+    return episodes
+
+
+def benchmark(images, codec, tmp_dir):
+    """Returns (bytes on disk, encode s, load+decode all steps s, load+decode 2 steps s, max abs error)."""
+    nbytes, encode_time, full_time, sample_time, max_error = 0, 0., 0., 0., 0.
+    for episode_id, raw in enumerate(images):
+        fname = os.path.join(tmp_dir, f'{episode_id:06d}-{codec}.pkl')
+
+        start = time.time()
+        encoded = image_codecs.encode(raw, codec)
+        with open(fname, 'wb') as f:
+            pickle.dump(encoded, f)
+        encode_time += time.time() - start
+        nbytes += os.path.getsize(fname)
+
+        # Full episode, e.g. for eval or precomputing heightmaps.
+        start = time.time()
+        with open(fname, 'rb') as f:
+            encoded = pickle.load(f)
+        decoded = np.stack([np.asarray(encoded[i]) for i in range(len(encoded))])
+        full_time += time.time() - start
+        max_error = max(max_error, float(np.max(np.abs(np.float32(decoded) - np.float32(raw)))))
+
+        # What `RavensDataset.__getitem__` does: a random step and the goal.
+        start = time.time()
+        with open(fname, 'rb') as f:
+            encoded = pickle.load(f)
+        i = np.random.randint(max(len(encoded) - 1, 1))
+        np.asarray(encoded[i]), np.asarray(encoded[-1])
+        sample_time += time.time() - start
+        os.remove(fname)
+    return nbytes, encode_time, full_time, sample_time, max_error
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data_dir', type=str, default='data')
+    parser.add_argument('--task', type=str, default='stack-block-pyramid')
+    parser.add_argument('--mode', type=str, default='train')
+    parser.add_argument('--n_episodes', type=int, default=10)
+    parser.add_argument('--color_codecs', type=str, nargs='+', default=['raw', 'png', 'zstd'])
+    parser.add_argument('--depth_codecs', type=str, nargs='+', default=['raw', 'zstd', 'png-mm', 'zstd-mm'])
+    args = parser.parse_args()
+
+    path = os.path.join(args.data_dir, f'{args.task}-{args.mode}')
+    episodes = load_raw_episodes(path, args.n_episodes)
+    if not episodes:
+        raise ValueError(f"No episodes with raw images found in {path}")
+    n_steps = sum([len(color) for color, _ in episodes])
+    print(f"{path}: {len(episodes)} episodes, {n_steps} steps")
+
+    print(f"{'field':<6} {'codec':<8} {'MB':>9} {'ratio':>6} {'encode/s':>9} "
+          f"{'decode steps/s':>15} {'samples/s':>10} {'max err':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for field, codecs in (('color', args.color_codecs), ('depth', args.depth_codecs)):
+            images = [color if field == 'color' else depth for color, depth in episodes]
+            raw_nbytes = None
+            for codec in codecs:
+                try:
+                    nbytes, encode_time, full_time, sample_time, max_error = benchmark(images, codec, tmp_dir)
+                except (ImportError, ValueError) as e:
+                    print(f"{field:<6} {codec:<8} skipped: {e}")
+                    continue
+                raw_nbytes = raw_nbytes if raw_nbytes else nbytes
+                print(f"{field:<6} {codec:<8} {nbytes / 1024 ** 2:>9.1f} {raw_nbytes / nbytes:>6.1f} "
+                      f"{n_steps / encode_time:>9.1f} {n_steps / full_time:>15.1f} "
+                      f"{len(images) / sample_time:>10.1f} {max_error:>8.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Compare the single-pass and batched fused heightmaps with the per-view reference path.
+
+Usage:
+  python scripts/benchmark_heightmaps.py --task place-red-in-green --n_obs 10
+"""
+
+import time
+import argparse
+
+import numpy as np
+import torch
+
+from cliport import tasks
+from cliport.dataset import BOUNDS, CAMERA_CONFIG, PIXEL_SIZE
+from cliport.environments.environment import Environment
+from cliport.utils import utils
+
+
+def collect_observations(task_name, n_obs, assets_root):
+    env = Environment(assets_root, disp=False, hz=480, record_cfg={'save_video': False, 'blender_render': False})
+    task = tasks.names[task_name]()
+    task.mode = 'train'
+    env.set_task(task)
+    agent = task.oracle(env)
+
+    observations, seed = [], 0
+    while len(observations) < n_obs:
+        env.seed(seed)
+        obs, info = env.reset(), env.info
+        observations.append(obs)
+        for _ in range(task.max_steps):
+            if len(observations) >= n_obs:
+                break
+            obs, _, done, info = env.step(agent.act(obs, info))
+            observations.append(obs)
+            if done:
+                break
+        seed += 2
+    return observations
+
+
+def benchmark(fn, observations, n_repeats):
+    start = time.time()
+    for _ in range(n_repeats):
+        results = [fn(obs, CAMERA_CONFIG, BOUNDS, PIXEL_SIZE) for obs in observations]
+    return (time.time() - start) / (n_repeats * len(observations)), results
+
+
+def benchmark_batch(observations, n_repeats):
+    batch = {key: np.stack([obs[key] for obs in observations]) for key in ('color', 'depth')}
+    start = time.time()
+    for _ in range(n_repeats):
+        cmaps, hmaps = utils.get_fused_heightmap_batch(batch, CAMERA_CONFIG, BOUNDS, PIXEL_SIZE)
+    return (time.time() - start) / (n_repeats * len(observations)), list(zip(cmaps.numpy(), hmaps.numpy()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--task', type=str, default='place-red-in-green')
+    parser.add_argument('--n_obs', type=int, default=10)
+    parser.add_argument('--n_repeats', type=int, default=3)
+    parser.add_argument('--assets_root', type=str, default='cliport/environments/assets/')
+    args = parser.parse_args()
+
+    observations = collect_observations(args.task, args.n_obs, args.assets_root)
+    ref_time, ref_results = benchmark(utils.get_fused_heightmap_reference, observations, args.n_repeats)
+    new_time, new_results = benchmark(utils.get_fused_heightmap, observations, args.n_repeats)
+    batch_time, batch_results = benchmark_batch(observations, args.n_repeats)
+
+    hmap_err = max([np.max(np.abs(ref[1] - new[1])) for ref, new in zip(ref_results, new_results)])
+    cmap_err = max([np.max(np.abs(np.int32(ref[0]) - new[0])) for ref, new in zip(ref_results, new_results)])
+    cmap_diff = np.mean([np.mean(np.any(ref[0] != new[0], axis=-1)) for ref, new in zip(ref_results, new_results)])
+    print(f"{len(observations)} observations of {args.task}")
+    print(f"reference:   {ref_time * 1000:.1f} ms/obs")
+    print(f"single-pass: {new_time * 1000:.1f} ms/obs ({ref_time / new_time:.1f}x)")
+    print(f"max hmap error: {hmap_err:.6f} m, max cmap error: {cmap_err}, "
+          f"cmap pixels differing: {cmap_diff * 100:.3f}% (ties between points of equal height)")
+    batch_equal = all([np.array_equal(new[0], batch[0]) and np.array_equal(new[1], batch[1])
+                       for new, batch in zip(new_results, batch_results)])
+    print(f"batched:     {batch_time * 1000:.1f} ms/obs ({ref_time / batch_time:.1f}x, "
+          f"{torch.get_num_threads()} threads, same maps as single-pass: {batch_equal})")
+
+
+if __name__ == '__main__':
+    main()